@@ -30,13 +30,23 @@ pwr|pwrck|tpd|tsuho)
 	echo "potstill char $num_addr $num_bits --vdd $vdd --temp $temp $char ${@:6} \$args" >> run.sh
 	;;
 esac
+echo "status=\$?" >> run.sh
 
+# Merge the setup and hold times, which may be characterized by separate
+# invocations of run.sh with --setup and --hold, e.g. by potstill schedule.
 if [ $char = tsuho ]; then
-	echo "cat setup.csv hold.csv > results.csv" >> run.sh
+	echo "if [ -e setup.csv ] && [ -e hold.csv ]; then cat setup.csv hold.csv > results.csv; fi" >> run.sh
 fi
 
-echo "status=\$?" >> run.sh
-echo "echo \$status > exitcode" >> run.sh
-echo "echo \"\$(date +%s.%N) - \$start\" | bc > duration" >> run.sh
+# Record the exit code and duration, unless only the setup or the hold times
+# have been characterized. In that case the scheduler records them once both
+# are done, such that a batch interrupted in between is not taken as complete.
+echo "case \" \$* \" in" >> run.sh
+echo "*\" --setup \"*|*\" --hold \"*) ;;" >> run.sh
+echo "*)" >> run.sh
+echo "	echo \$status > exitcode" >> run.sh
+echo "	echo \"\$(date +%s.%N) - \$start\" | bc > duration" >> run.sh
+echo "	;;" >> run.sh
+echo "esac" >> run.sh
 echo "exit \$status" >> run.sh
 chmod +x run.sh
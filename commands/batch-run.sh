@@ -3,11 +3,12 @@
 # Execute all "run.sh" scripts in an entire directory tree.
 
 function print_usage {
-	echo "usage: potstill batch-run [-hafm] [-p PREFIX] [-n NAME] [-P NUM_PROCS]" >&2
+	echo "usage: potstill batch-run [-hafm] [-p PREFIX] [-n NAME] [-P NUM_PROCS] [-O NUM_SESSIONS]" >&2
 }
 
 # Parse the command line arguments.
 NUM_PROCS=1
+NUM_OCEAN=0
 ALL=false
 FAILED=false
 MISSING=false
@@ -29,6 +30,8 @@ while [ $# -gt 0 ]; do
 			echo "  -m, --missing          execute runs that have not yet been run" >&2
 			echo "  -n, --name NAME        name of the file to run [\"run.sh\"]" >&2
 			echo "  -P, --procs NUM_PROCS  number of parallel jobs to launch" >&2
+			echo "  -O, --ocean NUM_SESSIONS" >&2
+			echo "                         share NUM_SESSIONS persistent OCEAN sessions among the jobs" >&2
 			echo >&2
 			echo "If -a is not set, this command executes each line in stdin as a separate job." >&2
 			exit 1
@@ -60,6 +63,14 @@ while [ $# -gt 0 ]; do
 			NUM_PROCS=$2
 			shift 2
 			;;
+		-O|--ocean)
+			if [ $# -lt 2 ]; then
+				echo "expected number of OCEAN sessions after $key" >&2
+				exit 1
+			fi
+			NUM_OCEAN=$2
+			shift 2
+			;;
 		*) break ;;
 	esac
 done
@@ -89,6 +100,23 @@ list_runfiles() {
 	fi
 }
 
+# Start a server that keeps OCEAN sessions alive for the duration of the batch.
+# The jobs find it through the POTSTILL_OCEAN_SOCKET environment variable.
+if [ $NUM_OCEAN -gt 0 ]; then
+	OCEAN_DIR=$(mktemp -d)
+	export POTSTILL_OCEAN_SOCKET="$OCEAN_DIR/ocean.sock"
+	potstill ocean-server -n $NUM_OCEAN "$POTSTILL_OCEAN_SOCKET" &
+	OCEAN_PID=$!
+	trap 'kill $OCEAN_PID 2>/dev/null; wait $OCEAN_PID; rm -rf "$OCEAN_DIR"' EXIT
+	while [ ! -S "$POTSTILL_OCEAN_SOCKET" ]; do
+		if ! kill -0 $OCEAN_PID 2>/dev/null; then
+			echo "OCEAN server failed to start" >&2
+			exit 1
+		fi
+		sleep 0.1
+	done
+fi
+
 # Execute the commands.
 echo "Starting batch run"
 start=$(date +%s.%N)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script compares the welltap placement in potstill.layout against the
+# iterative placement it replaced, in terms of number of welltaps and runtime,
+# for a range of macro widths.
+
+import sys, os, argparse, timeit
+import potstill.tech
+from bisect import bisect
+from potstill.macro import Macro
+from potstill.layout import place_welltaps, max_welltap_spacing
+
+
+# Parse the command line arguments.
+parser = argparse.ArgumentParser(prog="potstill bench-welltaps", description="Benchmark the welltap placement against the iterative placement.")
+parser.add_argument("NADDR", type=int, help="number of address lines")
+parser.add_argument("--min-bits", type=int, default=4, help="smallest number of bits to evaluate")
+parser.add_argument("--max-bits", type=int, default=512, help="largest number of bits to evaluate")
+parser.add_argument("-n", "--number", type=int, default=10, help="number of repetitions per measurement")
+args = parser.parse_args()
+
+
+# The iterative welltap placement formerly used in Layout.__init__. It starts
+# with a conservative estimate for the number of welltaps, distributes them
+# evenly, and adds one welltap at a time until the cadence is met.
+def iterative_welltaps(colpos, width, welltap_width, welltap_cadence):
+	num_welltaps = int(width/(welltap_cadence - welltap_width)) + 2
+	max_spacing = None
+	welltap_placement = None
+	while welltap_placement is None or max_spacing > welltap_cadence:
+		approx_welltap_positions = [
+			width * i / (num_welltaps-1) for i in range(num_welltaps)
+		]
+		welltap_indices = [
+			max(0, min(len(colpos), bisect(colpos, x)))
+			for x in approx_welltap_positions
+		]
+		welltap_placement = [
+			(i, colpos[i] if i < len(colpos) else width)
+			for i in welltap_indices
+		]
+		max_spacing = max_welltap_spacing(welltap_placement, welltap_width)
+		num_welltaps += 1
+	return welltap_placement
+
+
+# Calculate the column positions the same way Layout does before inserting the
+# welltaps: the lower bits are mirrored and thus positioned at their right edge,
+# followed by the address decoder and the upper bits.
+macro = Macro(args.NADDR, args.min_bits)
+config = potstill.tech.load(macro.techdir).config
+G = config["track"]
+bit_width = config["widths"]["bitarray"]*G
+addrdec_width = config["widths"]["addrdec"][macro.num_words]*G
+welltap_width = float(config["cells"]["welltap"]["width"])
+welltap_cadence = float(config["cells"]["welltap"]["cadence"])
+
+def column_positions(num_bits):
+	num_bits_left = int(num_bits/2)
+	num_bits_right = num_bits - num_bits_left
+	colpos = [(i+1)*bit_width for i in range(num_bits_left)]
+	x = num_bits_left*bit_width
+	colpos.append(x)
+	x += addrdec_width
+	colpos += [x + i*bit_width for i in range(num_bits_right)]
+	return (colpos, x + num_bits_right*bit_width)
+
+
+# Evaluate both placements for every width.
+print("%8s %10s %10s %12s %12s %8s" % ("num_bits", "iterative", "direct", "t_iter [us]", "t_direct [us]", "speedup"))
+total_iter = 0
+total_direct = 0
+for num_bits in range(args.min_bits, args.max_bits+1):
+	(colpos, width) = column_positions(num_bits)
+	wt_args = (colpos, width, welltap_width, welltap_cadence)
+	a = iterative_welltaps(*wt_args)
+	b = place_welltaps(*wt_args)
+	assert(max_welltap_spacing(b, welltap_width) <= welltap_cadence)
+	t_iter = timeit.timeit(lambda: iterative_welltaps(*wt_args), number=args.number) / args.number
+	t_direct = timeit.timeit(lambda: place_welltaps(*wt_args), number=args.number) / args.number
+	total_iter += t_iter
+	total_direct += t_direct
+	print("%8d %10d %10d %12.1f %12.1f %7.1fx" % (num_bits, len(a), len(b), t_iter*1e6, t_direct*1e6, t_iter/t_direct))
+
+print("total: iterative %.3gms, direct %.3gms" % (total_iter*1e3, total_direct*1e3))
@@ -18,11 +18,16 @@ parser.add_argument("--ocean", action="store_true", help="write OCEAN input file
 parser.add_argument("--use-netlist", action="store_true", help="do not create a new netlist")
 parser.add_argument("--use-nodeset", action="store_true", help="do not create a new nodeset")
 parser.add_argument("--cut", type=str, help="name of the circuit under test")
+argparse_init_contents(parser)
+argparse_init_analyzer(parser)
+argparse_init_cache(parser)
 args = parser.parse_args()
 
 
 # Create the input files.
 macro = argparse_get_macro(args)
+contents = argparse_get_contents(args, macro)
+simcache = argparse_get_cache(args)
 inp = Input(macro, args.TSLEW, cut_name=args.cut)
 
 if args.spectre:
@@ -33,5 +38,5 @@ if args.ocean:
 	sys.exit(0)
 
 # Execute the run.
-run = Run(inp, dont_netlist=args.use_netlist, dont_nodeset=args.use_nodeset)
+run = Run(inp, dont_netlist=args.use_netlist, dont_nodeset=args.use_nodeset, contents=contents, analyzer=args.analyzer, psf_format=args.psf_format, cache=simcache)
 run.run()
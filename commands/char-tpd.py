@@ -16,11 +16,18 @@ parser.add_argument("TSLEW", type=float, help="input transition time [s]")
 parser.add_argument("CLOAD", type=float, help="output load capacitance [F]")
 parser.add_argument("--spectre", action="store_true", help="write SPECTRE input file to stdout")
 parser.add_argument("--ocean", action="store_true", help="write OCEAN input file to stdout")
+parser.add_argument("--reduced", action="store_true", help="simulate a reduced netlist with only the first bit column at full detail")
+parser.add_argument("--calibrate", action="store_true", help="run with the full and the reduced netlist and report the error of the latter")
+argparse_init_contents(parser)
+argparse_init_analyzer(parser)
+argparse_init_cache(parser)
 args = parser.parse_args()
 
 
 # Create the input files.
 macro = argparse_get_macro(args)
+contents = argparse_get_contents(args, macro)
+simcache = argparse_get_cache(args)
 inp = Input(macro, args.TSLEW, args.CLOAD)
 
 if args.spectre:
@@ -31,5 +38,8 @@ if args.ocean:
 	sys.exit(0)
 
 # Execute the run.
-run = Run(inp)
+if args.calibrate:
+	CalibrationRun(lambda reduced: Run(inp, reduced=reduced, contents=contents, analyzer=args.analyzer, psf_format=args.psf_format, cache=simcache)).run()
+	sys.exit(0)
+run = Run(inp, reduced=args.reduced, contents=contents, analyzer=args.analyzer, psf_format=args.psf_format, cache=simcache)
 run.run()
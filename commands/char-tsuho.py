@@ -17,14 +17,21 @@ parser.add_argument("TSLEWPIN", type=float, help="input transition time [s]")
 parser.add_argument("--setup", action="store_true", help="only run setup time analysis")
 parser.add_argument("--hold", action="store_true", help="only run hold time analysis")
 parser.add_argument("--spectre", action="store_true", help="write SPECTRE input file to stdout")
-parser.add_argument("--analyze", metavar="PSFASCII", type=str, help="analyze results")
+parser.add_argument("--analyze", metavar="PSF", type=str, help="analyze results in the PSF ASCII or binary PSF format")
+parser.add_argument("--psf-format", type=str, choices=["psfascii", "psfbin"], default="psfascii", help="format of the SPECTRE results [default: psfascii]")
+parser.add_argument("--reduced", action="store_true", help="simulate a reduced netlist with only the first bit column at full detail")
+parser.add_argument("--calibrate", action="store_true", help="run with the full and the reduced netlist and report the error of the latter")
+parser.add_argument("--search", type=str, choices=["secant", "uniform"], default="secant", help="place the stops of the next simulation at the secant estimate of the Tpd curve, or evenly [default: secant]")
+parser.add_argument("--max-steps", type=int, default=8, help="number of stops per simulation while a secant estimate falls outside its search window, and to finish in one simulation [default: 8]")
+argparse_init_cache(parser)
 args = parser.parse_args()
 
 
 # Create the input files.
 macro = argparse_get_macro(args)
-setup_run = SetupRun(macro, args.TSLEWCK, args.TSLEWPIN)
-hold_run  = HoldRun(macro, args.TSLEWCK, args.TSLEWPIN)
+simcache = argparse_get_cache(args)
+setup_run = SetupRun(macro, args.TSLEWCK, args.TSLEWPIN, reduced=args.reduced, psf_format=args.psf_format, cache=simcache, search=args.search, max_steps=args.max_steps)
+hold_run  = HoldRun(macro, args.TSLEWCK, args.TSLEWPIN, reduced=args.reduced, psf_format=args.psf_format, cache=simcache, search=args.search, max_steps=args.max_steps)
 
 if args.setup:
 	inp = SetupInput(macro, args.TSLEWCK, args.TSLEWPIN)
@@ -34,7 +41,7 @@ elif args.hold:
 	run = hold_run
 else:
 	inp = None
-	run = SetupHoldRun(macro, args.TSLEWCK, args.TSLEWPIN)
+	run = SetupHoldRun(macro, args.TSLEWCK, args.TSLEWPIN, reduced=args.reduced, psf_format=args.psf_format, cache=simcache, search=args.search, max_steps=args.max_steps)
 
 if args.spectre:
 	if inp is None:
@@ -50,4 +57,9 @@ if args.analyze is not None:
 	print(inp.analyze(args.analyze))
 	sys.exit(0)
 
+if args.calibrate:
+	run_type = type(run)
+	CalibrationRun(lambda reduced: run_type(macro, args.TSLEWCK, args.TSLEWPIN, reduced=reduced, psf_format=args.psf_format, cache=simcache, search=args.search, max_steps=args.max_steps), ("setup.csv", "hold.csv")).run()
+	sys.exit(0)
+
 run.run()
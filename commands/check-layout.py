@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script checks the layout of one or more memory macros for overlapping
+# cells, gaps between columns, cells placed off the grid, and wiring outside the
+# macro or not on any cell.
+
+import sys, os, argparse, itertools, time
+from potstill.macro import Macro, default_name
+from potstill.layout import Layout
+from potstill.check import check_layout
+
+
+# Parses a list of sizes such as "5", "4,32,128", or "2-7".
+def sizes(arg):
+	values = list()
+	for part in arg.split(","):
+		if "-" in part:
+			(a, b) = part.split("-")
+			values += range(int(a), int(b)+1)
+		else:
+			values.append(int(part))
+	return values
+
+
+# Parse the command line arguments.
+parser = argparse.ArgumentParser(prog="potstill check-layout", description="Check the layout of memory macros for overlaps, gaps, off-grid placement, and dangling wiring.")
+parser.add_argument("NADDR", type=sizes, help="number of address lines, e.g. 5, 2-7, or 4,6")
+parser.add_argument("NBITS", type=sizes, help="number of bits per word, e.g. 32, 4-512, or 4,32,128")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
+parser.add_argument("-g", "--grid", type=float, help="placement grid [m]")
+parser.add_argument("-q", "--quiet", action="store_true", help="only print a summary line per macro")
+args = parser.parse_args()
+
+
+# Check every combination of address and data width.
+num_failed = 0
+for (num_addr, num_bits) in itertools.product(args.NADDR, args.NBITS):
+	name = default_name(2**num_addr, num_bits, args.banks, args.fold)
+	start = time.time()
+	try:
+		macro = Macro(num_addr, num_bits, num_banks=args.banks, words_per_row=args.fold)
+		name = macro.name
+		layout = Layout(macro)
+		violations = check_layout(layout, grid=args.grid)
+	except Exception as e:
+		sys.stdout.write("%s: layout failed: %s\n" % (name, e))
+		num_failed += 1
+		continue
+	duration = time.time() - start
+
+	if not args.quiet:
+		for v in violations:
+			sys.stdout.write("%s: %s\n" % (macro.name, v))
+	sys.stdout.write("%s: %d violations, %d cells checked in %.3gs\n" % (
+		macro.name, len(violations), layout.insts.num_placed(), duration
+	))
+	if len(violations) > 0:
+		num_failed += 1
+
+sys.exit(1 if num_failed > 0 else 0)
@@ -5,7 +5,7 @@
 
 import sys, os, argparse
 from potstill.macro import Macro
-from potstill.layout import Layout
+from potstill.layout import load_layout
 from potstill.output.gds import make_gds, make_phalanx_input
 
 
@@ -13,14 +13,16 @@ from potstill.output.gds import make_gds, make_phalanx_input
 parser = argparse.ArgumentParser(prog="potstill make-gds", description="Generate the GDS layout data of a memory macro.")
 parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits per word")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into; banked layouts are a placement-only preview")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
 parser.add_argument("-o", "--output", metavar="GDSFILE", type=str, help="name of the output GDS file")
 parser.add_argument("-p", "--phalanx", action="store_true", help="write Phalanx input file to stdout")
 args = parser.parse_args()
 
 
 # Calculate the layout.
-macro = Macro(args.NADDR, args.NBITS)
-layout = Layout(macro)
+macro = Macro(args.NADDR, args.NBITS, num_banks=args.banks, words_per_row=args.fold)
+layout = load_layout(macro)
 filename = args.output or (macro.name+".gds")
 
 
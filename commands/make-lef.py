@@ -5,7 +5,7 @@
 
 import sys, os, argparse, itertools
 from potstill.macro import Macro
-from potstill.layout import Layout
+from potstill.layout import load_layout
 from potstill.output.lef import make_lef
 
 
@@ -13,10 +13,12 @@ from potstill.output.lef import make_lef
 parser = argparse.ArgumentParser(prog="potstill make-lef", description="Generate the LEF view of a memory macro.")
 parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into; banked layouts are a placement-only preview")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
 args = parser.parse_args()
 
 
 # Generate the layout for the macro.
-macro = Macro(args.NADDR, args.NBITS)
-layout = Layout(macro)
+macro = Macro(args.NADDR, args.NBITS, num_banks=args.banks, words_per_row=args.fold)
+layout = load_layout(macro)
 sys.stdout.write(make_lef(layout))
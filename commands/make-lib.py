@@ -3,7 +3,7 @@
 import sys, os, argparse, itertools
 from potstill.macro import Macro
 from potstill.timing import Timing
-from potstill.layout import Layout
+from potstill.layout import load_layout
 from potstill.output.lib import make_lib
 
 
@@ -13,11 +13,13 @@ parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits per word")
 parser.add_argument("VDD", type=float, help="supply voltage [V]", nargs="?")
 parser.add_argument("TEMP", type=float, help="junction temperature [°C]", nargs="?")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into; banked layouts are a placement-only preview")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
 args = parser.parse_args()
 
 
 # Generate and output the LIB file.
-macro = Macro(args.NADDR, args.NBITS)
+macro = Macro(args.NADDR, args.NBITS, num_banks=args.banks, words_per_row=args.fold)
 timing = Timing(macro)
-layout = Layout(macro)
+layout = load_layout(macro)
 sys.stdout.write(make_lib(timing, layout))
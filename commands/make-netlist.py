@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
 # Copyright (c) 2016 Fabian Schuiki
 #
-# This script generates the netlist for a memory macro.
+# This script generates the netlist for a memory macro, in SPICE syntax, native
+# Spectre syntax, or as structural Verilog.
 
 import sys, argparse
-from potstill import netlist
+from potstill import netlist, circuit
+
+
+WRITERS = {
+	"spice": circuit.write_spice,
+	"spectre": circuit.write_spectre,
+	"verilog": circuit.write_verilog,
+}
 
 
 # Parse the command line arguments.
 parser = argparse.ArgumentParser(prog="potstill make-netlist", description="Generate the netlist for a memory macro.")
 parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
+parser.add_argument("--predecode", action="store_true", help="predecode groups of address bits in the address decoder")
+parser.add_argument("--radix", type=int, default=2, choices=[2,4], help="number of inputs of the read mux stages")
+parser.add_argument("--format", type=str, default="spice", choices=sorted(WRITERS), help="syntax of the netlist [default: spice]")
 args = parser.parse_args()
 
 
-# Generate the layout for the macro.
-sys.stdout.write(netlist.generate(args.NADDR, args.NBITS))
+# Generate the netlist for the macro.
+WRITERS[args.format](netlist.build(args.NADDR, args.NBITS, args.banks, args.fold, predecode=args.predecode, radix=args.radix), sys.stdout)
@@ -12,8 +12,19 @@ parser = argparse.ArgumentParser(prog="potstill make-nodeset", description="Gene
 parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits")
 parser.add_argument("-p", "--prefix", type=str, default="X", help="prefix of the instantiated circuit")
+parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
+parser.add_argument("--vdd", type=float, default=1.2, help="supply voltage [V]")
+contents_group = parser.add_mutually_exclusive_group()
+contents_group.add_argument("--readmemh", metavar="FILE", type=str, help="initialize the memory with the hexadecimal words in FILE")
+contents_group.add_argument("--readmemb", metavar="FILE", type=str, help="initialize the memory with the binary words in FILE")
 args = parser.parse_args()
 
 
 # Generate the layout for the macro.
-sys.stdout.write(nodeset.generate(args.prefix, args.NADDR, args.NBITS))
+contents = None
+if args.readmemh is not None:
+	contents = nodeset.read_contents(args.readmemh, 2**args.NADDR, args.NBITS, 16)
+elif args.readmemb is not None:
+	contents = nodeset.read_contents(args.readmemb, 2**args.NADDR, args.NBITS, 2)
+nodeset.write(sys.stdout, args.prefix, args.NADDR, args.NBITS, args.banks, args.fold, contents=contents, vdd=args.vdd)
@@ -2,13 +2,15 @@
 # Copyright (c) 2016 Fabian Schuiki
 #
 # This script produces all output files for a memory macro of given
-# size.
+# size. Banking, the predecoded address decoder, and the radix-4 read mux have
+# no matching layout yet, so they are only offered by make-netlist and the
+# characterization commands.
 
 import sys, os, argparse
 from potstill import netlist, nodeset
 from potstill.macro import Macro
-from potstill.layout import Layout
-from potstill.timing import Timing
+from potstill.layout import load_layout
+from potstill.timing import Timing, estimate_tpd
 from potstill.output.lib import make_lib
 from potstill.output.lef import make_lef
 from potstill.output.model import make_vhdl
@@ -19,6 +21,7 @@ from potstill.output.gds import make_gds
 parser = argparse.ArgumentParser(prog="potstill make", description="Generate a memory macro.")
 parser.add_argument("NADDR", type=int, help="number of address lines")
 parser.add_argument("NBITS", type=int, help="number of bits")
+parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
 parser.add_argument("-o", "--outname", metavar="OUT", type=str, help="name of the output files")
 parser.add_argument("--nodeset-prefix", type=str, default="X", help="prefix of the circuit in the nodeset file")
 args = parser.parse_args()
@@ -26,12 +29,38 @@ args = parser.parse_args()
 
 # Generate the layout and timings for the macro.
 macro = [
-	Macro(args.NADDR, args.NBITS, vdd=1.2, temp=25),
-	Macro(args.NADDR, args.NBITS, vdd=1.08, temp=125),
-	Macro(args.NADDR, args.NBITS, vdd=1.32, temp=0),
+	Macro(args.NADDR, args.NBITS, vdd=1.2, temp=25, words_per_row=args.fold),
+	Macro(args.NADDR, args.NBITS, vdd=1.08, temp=125, words_per_row=args.fold),
+	Macro(args.NADDR, args.NBITS, vdd=1.32, temp=0, words_per_row=args.fold),
 ]
 sys.stderr.write("# Calculating layout\n")
-layout = Layout(macro[0])
+layout = load_layout(macro[0])
+
+# Report the area and estimated propagation delay of each number of words per
+# row, such that the trade-off of folding the macro can be assessed. The delay
+# is extrapolated from the characterized plain macros by estimate_tpd; run
+# char-tpd with --fold to obtain the simulated delay of the chosen macro.
+if args.fold > 1:
+	sys.stderr.write("# Folding trade-off\n")
+	sys.stderr.write("#   %4s %5s %10s %10s %11s %6s %8s\n" % ("fold", "rows", "width[um]", "height[um]", "area[um2]", "aspect", "~Tpd[ps]"))
+	for fold in [1, 2, 4, 8]:
+		try:
+			m = Macro(args.NADDR, args.NBITS, vdd=1.2, temp=25, words_per_row=fold)
+			l = load_layout(m)
+		except (ValueError, KeyError):
+			continue
+		tpd = estimate_tpd(m)
+		sys.stderr.write("# %s %4d %5d %10.2f %10.2f %11.1f %6.2f %8s\n" % (
+			"*" if fold == args.fold else " ",
+			fold,
+			l.num_rows,
+			l.size.x*1e6,
+			l.size.y*1e6,
+			l.size.x*l.size.y*1e12,
+			l.size.y/l.size.x,
+			("%.1f" % (tpd*1e12)) if tpd is not None else "-"
+		))
+
 sys.stderr.write("# Calculating timing\n")
 timings = [Timing(m) for m in macro]
 prefix = args.outname or macro[0].name
@@ -57,11 +86,11 @@ for timing in timings:
 
 # Generate netlist file.
 with open_outfile(".cir") as f:
-	f.write(netlist.generate(args.NADDR, args.NBITS))
+	netlist.writeMacro(f, macro[0])
 
 # Generate nodeset file.
 with open_outfile(".ns") as f:
-	f.write(nodeset.generate(args.nodeset_prefix, args.NADDR, args.NBITS))
+	nodeset.writeMacro(f, args.nodeset_prefix, macro[0])
 
 # Generate the simulation model.
 with open_outfile(".vhd") as f:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script keeps a pool of OCEAN sessions alive and serves it on a unix
+# socket, see potstill.char.ocean. Characterizations submit their OCEAN scripts
+# to the server if the POTSTILL_OCEAN_SOCKET environment variable is set to the
+# socket, rather than starting a new OCEAN process for each script.
+
+import sys, os, stat, shlex, signal, argparse
+from potstill.char import ocean
+
+
+# Parse command line arguments.
+parser = argparse.ArgumentParser(prog="potstill ocean-server", description="Serve a pool of persistent OCEAN sessions on a unix socket.")
+parser.add_argument("SOCKET", type=str, help="path of the unix socket to listen on")
+parser.add_argument("-n", "--sessions", type=int, default=1, help="number of OCEAN sessions to keep alive [default: 1]")
+parser.add_argument("--command", type=str, help="OCEAN command to run [default: $"+ocean.COMMAND_ENV+" or \""+ocean.DEFAULT_COMMAND+"\"]")
+parser.add_argument("-t", "--timeout", type=float, help="seconds after which a session executing a script is killed and restarted [default: no timeout]")
+args = parser.parse_args()
+
+if args.sessions < 1:
+	sys.stderr.write("number of sessions must be at least 1\n")
+	sys.exit(1)
+if args.timeout is not None and args.timeout <= 0:
+	sys.stderr.write("timeout must be positive\n")
+	sys.exit(1)
+
+
+# Remove a stale socket left behind by a previous server.
+if os.path.exists(args.SOCKET):
+	if not stat.S_ISSOCK(os.stat(args.SOCKET).st_mode):
+		sys.stderr.write("%s exists and is not a socket\n" % args.SOCKET)
+		sys.exit(1)
+	os.unlink(args.SOCKET)
+
+
+# Serve the pool until interrupted or terminated.
+def terminate(signum, frame):
+	raise KeyboardInterrupt()
+signal.signal(signal.SIGTERM, terminate)
+
+pool = ocean.Pool(args.sessions, shlex.split(args.command) if args.command is not None else None, timeout=args.timeout)
+server = ocean.Server(args.SOCKET, pool)
+sys.stderr.write("Serving %d OCEAN sessions on %s\n" % (args.sessions, args.SOCKET))
+try:
+	server.serve_forever()
+except KeyboardInterrupt:
+	pass
+finally:
+	server.server_close()
+	pool.close()
+	os.unlink(args.SOCKET)
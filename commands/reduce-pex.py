@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script reduces the RC networks of a parasitic extraction netlist, such
+# that post-layout simulations run faster. See potstill.pex for details. The
+# default time constant keeps the D2M delay error of typical nets within a few
+# percent; use --report to check the error of a larger time constant.
+
+import sys, os, argparse
+from potstill import pex
+
+
+# Parse command line arguments.
+parser = argparse.ArgumentParser(prog="potstill reduce-pex", description="Reduce the RC networks of a parasitic extraction netlist.")
+parser.add_argument("NETLIST", type=str, help="parasitic extraction netlist [*.pxi]")
+parser.add_argument("-o", "--output", type=str, help="name of the reduced netlist [default: stdout]")
+parser.add_argument("-t", "--tau", type=float, default=2e-15, help="time constant below which nodes are eliminated [s] [default: 2e-15]")
+parser.add_argument("--max-degree", type=int, default=8, help="maximum number of neighbours of an eliminated node")
+parser.add_argument("-k", "--keep", metavar="NET", type=str, action="append", default=[], help="net to leave unreduced, e.g. because it is probed")
+parser.add_argument("--report", action="store_true", help="report the Elmore and D2M delay error of the reduction")
+parser.add_argument("--report-max-nodes", metavar="N", type=int, default=400, help="largest net whose delay error is reported [default: 400]")
+args = parser.parse_args()
+
+
+# Reduce the netlist.
+with open(args.NETLIST) as fin:
+	if args.output is not None:
+		with open(args.output, "w") as fout:
+			stats = pex.reduce_netlist(fin, fout, args.tau, args.max_degree, set(args.keep), args.report, args.report_max_nodes)
+	else:
+		stats = pex.reduce_netlist(fin, sys.stdout, args.tau, args.max_degree, set(args.keep), args.report, args.report_max_nodes)
+
+
+# Report the effect of the reduction.
+sys.stderr.write("# %d nets, %d reduced\n" % (stats.num_nets, stats.num_reduced))
+sys.stderr.write("# nodes: %d -> %d\n" % (stats.nodes_before, stats.nodes_after))
+sys.stderr.write("# elements: %d -> %d\n" % (stats.elements_before, stats.elements_after))
+if args.report:
+	for (metric, errors) in [("Elmore", stats.elmore_errors), ("D2M", stats.d2m_errors)]:
+		if len(errors) == 0:
+			sys.stderr.write("# %s delay error: no nets to compare\n" % metric)
+			continue
+		worst = max(errors)
+		sys.stderr.write("# %s delay error: mean %.3g%%, max %.3g%% (%s at %s)\n" % (
+			metric,
+			sum(e for (e,_,_) in errors) / len(errors) * 100,
+			worst[0]*100, worst[1], worst[2]
+		))
+	if len(stats.not_compared) > 0:
+		largest = max(stats.not_compared)
+		sys.stderr.write("# delay error not reported for %d nets that are too large or not connected, e.g. %s with %d nodes\n" % (
+			len(stats.not_compared), largest[1], largest[0]
+		))
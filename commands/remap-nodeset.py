@@ -1,83 +1,50 @@
 #!/usr/bin/env python3
 # Copyright (c) 2016 Fabian Schuiki
 #
-# This script maps a nodeset file associated with a netlist before parasitic
-# extraction to the nodes after parasitic extraction.
+# This script maps nodeset files associated with a netlist before parasitic
+# extraction to the nodes after parasitic extraction. The extracted netlist is
+# indexed once, see potstill.pxi, such that any number of nodesets, e.g. one per
+# corner or data pattern, can be remapped against the same index.
 
-import sys, os, re, argparse
+import sys, os, argparse
+from potstill import pxi
 
 
 # Parse command line arguments.
 parser = argparse.ArgumentParser(prog="potstill remap-nodeset", description="Map the nodeset of a netlist to its post parasitic extraction equivalent.")
-parser.add_argument("NODESET", type=str, help="nodeset file to remap")
+parser.add_argument("NODESET", type=str, nargs="+", help="nodeset file to remap")
 parser.add_argument("NETLIST", type=str, help="parasitic extraction netlist [*.pxi]")
 parser.add_argument("-p", "--prefix", type=str, help="subckt prefix used in the nodeset file", default="X")
+parser.add_argument("-o", "--outdir", type=str, help="directory to write the remapped nodesets to, instead of stdout")
+parser.add_argument("--index", type=str, help="index file of the netlist [default: NETLIST"+pxi.INDEX_SUFFIX+"]")
+parser.add_argument("--no-store-index", action="store_true", help="do not store the index of the netlist")
 args = parser.parse_args()
 
-
-# Load the nodeset file and convert it into a lookup table.
-nodesets = dict()
-with open(args.NODESET) as f:
-	for line in f:
-
-		# Skip empty lines.
-		line = line.strip()
-		if len(line) == 0:
-			continue
-
-		# Extract the nodeset path and value.
-		(name,value) = line.split()
-		if not name.startswith(args.prefix+"."):
-			continue
-		name = name[len(args.prefix)+1:].replace(".", "/").upper()
-		nodesets[name] = value
-
-
-# Generator that joins lines starting with a "+" with the preceding line. Also
-# strips away comments and empty lines as a side-effect.
-def collapse_plus_lines(it):
-	line = None
-	for l in it:
-		l = l.split("*")[0].strip() # strip comments
-		if len(l) == 0:
-			continue
-		if l.startswith("+"):
-			line += l[1:]
-		else:
-			if line is not None:
-				yield line
-			line = l
-	if line is not None:
-		yield line
-
-
-# Read the netlist and spawn the nodesets for each subckt that corresponds to a
-# net.
-unhandled_nodesets = set(nodesets.keys())
-net_regex = re.compile('(.*?%(.*?))\s')
-with open(args.NETLIST) as f:
-	for line in collapse_plus_lines(f):
-
-		# Look for subcircuit instantiations that replace nets.
-		match = net_regex.match(line)
-		if match is None:
-			continue
-		name = match.group(1)
-		net = match.group(2)
-
-		# Find any potential nodesets for this net subcircuit and apply the
-		# nodeset to all terminals.
-		try:
-			value = nodesets[net]
-		except KeyError as e:
-			continue
-
-		for terminal in line.split()[1:-1]:
-			sys.stdout.write("%s.%s\t%s\n" % (args.prefix, terminal, value))
-		unhandled_nodesets.remove(net)
-
-
-for uhn in unhandled_nodesets:
-	sys.stderr.write("# unmapped nodeset %s" % uhn)
-
-sys.exit(1 if len(unhandled_nodesets) > 0 else 0)
+if len(args.NODESET) > 1 and args.outdir is None:
+	sys.stderr.write("specify an output directory with -o when remapping multiple nodesets\n")
+	sys.exit(1)
+
+
+# Load or build the index of the extracted netlist.
+index = pxi.load_index(args.NETLIST, args.index, store=not args.no_store_index)
+
+
+# Remap each nodeset.
+num_unmapped = 0
+for path in args.NODESET:
+	nodesets = pxi.read_nodeset(path, args.prefix)
+	if args.outdir is None:
+		unmapped = pxi.remap(sys.stdout, index, nodesets, args.prefix)
+	else:
+		outpath = os.path.join(args.outdir, os.path.basename(path))
+		if os.path.exists(outpath) and os.path.samefile(outpath, path):
+			sys.stderr.write("refusing to overwrite %s with its remapped nodeset\n" % path)
+			sys.exit(1)
+		os.makedirs(args.outdir, exist_ok=True)
+		with open(outpath, "w") as f:
+			unmapped = pxi.remap(f, index, nodesets, args.prefix)
+	for net in unmapped:
+		sys.stderr.write("# unmapped nodeset %s in %s\n" % (net, path))
+	num_unmapped += len(unmapped)
+
+sys.exit(1 if num_unmapped > 0 else 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script executes the characterization runs of a batch in parallel, see
+# potstill.schedule. It selects runs like batch-run, but orders them by their
+# predicted cost and runs the setup and hold time analyses of a tsuho run as
+# separate, dependent jobs. Like batch-run, it can share a pool of persistent
+# OCEAN sessions among the jobs, see potstill.char.ocean.
+
+import sys, os, time, shutil, tempfile, threading, argparse
+from potstill import schedule
+from potstill.char import ocean
+
+
+# Parse command line arguments.
+parser = argparse.ArgumentParser(prog="potstill schedule", description="Execute multiple characterizations in a batch, the most expensive first. If -a is not set, each line in stdin is the path of a run file to execute.")
+parser.add_argument("-a", "--all", action="store_true", help="execute all runs")
+parser.add_argument("-f", "--failed", action="store_true", help="execute failed runs")
+parser.add_argument("-m", "--missing", action="store_true", help="execute runs that have not yet been run")
+parser.add_argument("-p", "--prefix", type=str, help="only execute runs whose path contains PREFIX/NAME")
+parser.add_argument("-n", "--name", type=str, default="run.sh", help="name of the file to run [default: run.sh]")
+parser.add_argument("-P", "--procs", type=int, default=1, help="number of parallel jobs to launch [default: 1]")
+parser.add_argument("--licenses", type=int, help="number of SPECTRE licenses available to the jobs [default: unlimited]")
+parser.add_argument("-O", "--ocean", metavar="NUM_SESSIONS", type=int, default=0, help="share NUM_SESSIONS persistent OCEAN sessions among the jobs")
+parser.add_argument("--dry-run", action="store_true", help="list the jobs in the order they would be started, with their predicted cost")
+args = parser.parse_args()
+
+if args.procs < 1 or (args.licenses is not None and args.licenses < 1):
+	sys.stderr.write("number of processes and licenses must be at least 1\n")
+	sys.exit(1)
+if args.ocean < 0:
+	sys.stderr.write("number of OCEAN sessions must not be negative\n")
+	sys.exit(1)
+
+
+# Select the runs to execute.
+if args.all:
+	runfiles = list()
+	for (dirpath, dirnames, filenames) in os.walk("."):
+		dirnames.sort()
+		if dirpath != "." and args.name in filenames:
+			runfiles.append(os.path.join(dirpath, args.name))
+else:
+	runfiles = [line.strip() for line in sys.stdin if len(line.strip()) > 0]
+
+if args.prefix is not None:
+	runfiles = [f for f in runfiles if args.prefix+"/"+args.name in f]
+
+if args.failed or args.missing:
+	def selected(runfile):
+		ecfile = os.path.join(os.path.dirname(runfile), "exitcode")
+		if not os.path.exists(ecfile):
+			return args.missing
+		with open(ecfile) as f:
+			return args.failed and f.read().strip() != "0"
+	runfiles = [f for f in runfiles if selected(f)]
+
+
+# Schedule the jobs.
+jobs = schedule.make_jobs(runfiles)
+if args.dry_run:
+	for job in schedule.schedule_order(jobs):
+		print("%10.1f  %s" % (job.cost, job.name))
+	sys.exit(0)
+
+# Serve a pool of OCEAN sessions for the duration of the batch. The jobs find
+# it through the POTSTILL_OCEAN_SOCKET environment variable.
+server = None
+if args.ocean > 0:
+	ocean_dir = tempfile.mkdtemp()
+	os.environ[ocean.SOCKET_ENV] = os.path.join(ocean_dir, "ocean.sock")
+	pool = ocean.Pool(args.ocean)
+	server = ocean.Server(os.environ[ocean.SOCKET_ENV], pool)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+
+print("Starting batch run")
+sched = schedule.Scheduler(jobs, args.procs, args.licenses)
+start = time.time()
+try:
+	num_failed = sched.run()
+finally:
+	if server is not None:
+		server.shutdown()
+		server.server_close()
+		pool.close()
+		shutil.rmtree(ocean_dir)
+print("Finished batch run (after %.1f s)" % (time.time() - start))
+sys.exit(1 if num_failed > 0 else 0)
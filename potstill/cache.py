@@ -0,0 +1,91 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a content-addressed on-disk cache for results that are
+# expensive to compute but only depend on a few input files, such as the layout
+# of a macro. Entries are stored as pickles in a cache directory that is shared
+# among all potstill processes. The directory defaults to ~/.cache/potstill and
+# can be changed through the POTSTILL_CACHE environment variable. Setting the
+# variable to an empty string disables the cache.
+
+import sys, os, pickle, hashlib, tempfile
+
+
+def cache_dir():
+	path = os.environ.get("POTSTILL_CACHE")
+	if path is None:
+		path = os.path.join(os.path.expanduser("~"), ".cache", "potstill")
+	return path or None
+
+
+# Calculates the SHA1 digest of the contents of a file.
+def file_digest(path):
+	h = hashlib.sha1()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1<<16), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+# Calculates a cache key from a sequence of values. Values are converted to
+# strings, so they should have an unambiguous string representation.
+def make_key(*values):
+	h = hashlib.sha1()
+	for v in values:
+		h.update(str(v).encode("utf-8"))
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+def entry_path(kind, key):
+	base = cache_dir()
+	if base is None:
+		return None
+	return os.path.join(base, kind, key[:2], key+".pickle")
+
+
+# Loads an entry from the cache. Returns None if the cache is disabled, the
+# entry does not exist, or it cannot be read.
+def load(kind, key):
+	path = entry_path(kind, key)
+	if path is None:
+		return None
+	try:
+		with open(path, "rb") as f:
+			return pickle.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		sys.stderr.write("Ignoring unreadable cache entry %s: %s\n" % (path, e))
+		return None
+
+
+# Pickles obj to path. The pickle is written to a temporary file in the same
+# directory first and then moved into place, such that concurrent processes and
+# threads never observe a partially written file. The temporary file is removed
+# if writing fails.
+def dump_atomic(path, obj):
+	(fd, tmp) = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path) or ".")
+	try:
+		with os.fdopen(fd, "wb") as f:
+			pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp, path)
+		tmp = None
+	finally:
+		if tmp is not None:
+			try:
+				os.unlink(tmp)
+			except OSError:
+				pass
+
+
+# Stores an entry in the cache, see dump_atomic. Failure to write the cache is
+# not an error.
+def store(kind, key, obj):
+	path = entry_path(kind, key)
+	if path is None:
+		return
+	try:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		dump_atomic(path, obj)
+	except (OSError, pickle.PicklingError, TypeError, AttributeError, RecursionError) as e:
+		sys.stderr.write("Unable to write cache entry %s: %s\n" % (path, e))
@@ -4,6 +4,7 @@ from collections import OrderedDict
 import potstill.macro
 import potstill.netlist
 import potstill.nodeset
+import potstill.char.ocean
 
 
 BASE = os.path.dirname(__file__)+"/../.."
@@ -57,7 +58,7 @@ class SimulationRun(Run):
 	def generateInputs(self):
 		# Netlist
 		with open(self.workpath(self.input.netlistName), "w") as f:
-			f.write(potstill.netlist.generateMacro(self.input.macro))
+			potstill.netlist.writeMacro(f, self.input.macro)
 
 		# Nodeset
 		with open(self.workpath(self.input.nodesetName), "w") as f:
@@ -74,7 +75,10 @@ class SimulationRun(Run):
 		subprocess.check_call(["cds_mmsim", "spectre", self.spectreInputName, "+escchars", "+log", "spectre.out", "-format", "psfxl", "-raw", self.input.spectreOutputName, "++aps"], cwd=self.workdir)
 
 	def runOcean(self):
-		with subprocess.Popen(["cds_ic6", "ocean", "-log", "CDS.log", "-nograph"], stdin=subprocess.PIPE, universal_newlines=True, cwd=self.workdir) as ocean:
+		if potstill.char.ocean.server_address() is not None:
+			potstill.char.ocean.submit(self.oceanInputName, self.workdir or ".")
+			return
+		with subprocess.Popen(potstill.char.ocean.default_command() + ["-log", "CDS.log"], stdin=subprocess.PIPE, universal_newlines=True, cwd=self.workdir) as ocean:
 			ocean.stdin.write("load(\"%s\")\n" % self.oceanInputName)
 			ocean.stdin.write("exit\n")
 			ocean.stdin.flush()
@@ -139,8 +143,13 @@ class SweepSimulationRun(SweepRun):
 		for run in self.runs:
 			run.runSpectre()
 
+	# Executes the OCEAN scripts of all runs in one session, or concurrently on
+	# the session server if one is available.
 	def runOcean(self):
-		with subprocess.Popen(["cds_ic6", "ocean", "-log", "CDS.log", "-nograph"], stdin=subprocess.PIPE, universal_newlines=True, cwd=self.workdir) as ocean:
+		if potstill.char.ocean.server_address() is not None:
+			potstill.char.ocean.submit_all([(run.oceanInputName, run.workdir) for run in self.runs])
+			return
+		with subprocess.Popen(potstill.char.ocean.default_command() + ["-log", "CDS.log"], stdin=subprocess.PIPE, universal_newlines=True, cwd=self.workdir) as ocean:
 			for run in self.runs:
 				ocean.stdin.write("cd(\"%s\")\n" % (os.getcwd()+"/"+run.workdir))
 				ocean.stdin.write("load(\"%s\")\n" % run.oceanInputName)
@@ -0,0 +1,111 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a content-addressed cache of simulation results. A SPECTRE
+# run is identified by a hash of its input file, of all files the input pulls in
+# through include statements and readns options (the netlist, the nodeset, the
+# preamble and the model libraries), and of the SPECTRE command line. If a run
+# with the same key has been executed before, the results extracted from it are
+# restored from the cache instead of simulating again. The PSF output may be
+# cached as well, but it is large and therefore only stored on request.
+#
+# An entry is a directory named after the key, holding a copy of the cached
+# files and optionally the PSF directory. Entries are written to a temporary
+# directory first and renamed into place, such that concurrent runs sharing the
+# cache never see incomplete entries. The simulator version is not part of the
+# key; clear the cache after updating SPECTRE.
+
+import sys, os, re, hashlib, shutil, tempfile
+
+
+CACHE_ENV = "POTSTILL_SIMCACHE"
+DEPENDENCY = re.compile(r'^\s*\.?(?:ahdl_include|include|inc|lib)\s+["\']?([^"\'\s]+)|\breadns\s*=\s*"?([^"\s]+)', re.IGNORECASE | re.MULTILINE)
+
+
+def default_root():
+	return os.environ.get(CACHE_ENV) or None
+
+
+class Cache(object):
+	def __init__(self, root, keep_psf=False):
+		super(Cache, self).__init__()
+		self.root = root
+		self.keep_psf = keep_psf
+		self.digests = dict()
+
+	# Returns the digest of a file and the files it depends on, as a list of
+	# paths relative to the file. Digests are remembered as long as the file
+	# is not modified, such that the model libraries are only read once.
+	def digest_file(self, path):
+		if not os.path.isfile(path):
+			return (None, [])
+		st = os.stat(path)
+		stamp = (st.st_mtime_ns, st.st_size)
+		if path in self.digests and self.digests[path][0] == stamp:
+			return self.digests[path][1:]
+		with open(path, "rb") as f:
+			data = f.read()
+		deps = [a or b for (a, b) in DEPENDENCY.findall(data.decode(errors="replace"))]
+		result = (hashlib.sha256(data).hexdigest(), deps)
+		self.digests[path] = (stamp,) + result
+		return result
+
+	# Calculates the key of a SPECTRE run of filename with the command line
+	# cmd. Additional strings that affect the cached results, e.g. the
+	# analysis performed on the PSF, may be passed as extra.
+	def key(self, filename, cmd, *extra):
+		h = hashlib.sha256()
+		for x in list(cmd) + list(extra):
+			h.update(str(x).encode() + b"\0")
+		seen = set()
+		pending = [filename]
+		while len(pending) > 0:
+			path = os.path.normpath(pending.pop(0))
+			if path in seen:
+				continue
+			seen.add(path)
+			(digest, deps) = self.digest_file(path)
+			h.update(("%s %s\n" % (path, digest or "missing")).encode())
+			base = os.path.dirname(path)
+			pending += [os.path.join(base, d) for d in deps]
+		return h.hexdigest()
+
+	def entry(self, key):
+		return os.path.join(self.root, key[:2], key[2:])
+
+	# Restores the cached files of a run to the current directory, and the PSF
+	# directory to psf if it has been cached. Returns whether the run has been
+	# found in the cache.
+	def restore(self, key, files=(), psf=None):
+		entry = self.entry(key)
+		if not all(os.path.isfile(os.path.join(entry, "files", os.path.basename(f))) for f in files):
+			return False
+		sys.stderr.write("Restoring cached results %s\n" % key[:16])
+		for f in files:
+			shutil.copyfile(os.path.join(entry, "files", os.path.basename(f)), f)
+		if psf is not None and os.path.isdir(os.path.join(entry, "psf")):
+			if os.path.isdir(psf):
+				shutil.rmtree(psf)
+			shutil.copytree(os.path.join(entry, "psf"), psf)
+		return True
+
+	# Stores the given files of a run, and the PSF directory psf if the cache
+	# keeps PSF output. Files that do not exist are skipped.
+	def store(self, key, files=(), psf=None):
+		entry = self.entry(key)
+		if os.path.isdir(entry):
+			return
+		os.makedirs(os.path.dirname(entry), exist_ok=True)
+		tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(entry))
+		try:
+			os.mkdir(os.path.join(tmp, "files"))
+			for f in files:
+				if os.path.isfile(f):
+					shutil.copyfile(f, os.path.join(tmp, "files", os.path.basename(f)))
+			if self.keep_psf and psf is not None and os.path.isdir(psf):
+				shutil.copytree(psf, os.path.join(tmp, "psf"))
+			os.rename(tmp, entry)
+		except OSError as e:
+			# Another run may have stored the same entry in the meantime.
+			if not os.path.isdir(entry):
+				sys.stderr.write("Unable to store results in cache: %s\n" % e)
+			shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,61 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements the measurements the characterizations perform on the
+# simulated waveforms, such that the results can be calculated without running
+# OCEAN. The functions mirror the OCEAN functions of the same name. A wave is a
+# (time, values) pair of arrays as returned by potstill.psf.read.
+
+from bisect import bisect_left, bisect_right
+from potstill import psf
+
+
+EDGES = {"rising": 1, "falling": -1, "either": 0}
+
+
+# Reads the waves with the given names from a PSF file. Returns a dictionary of
+# the waves, or raises a ValueError if any of them has not been saved.
+def load(psf_file, names):
+	waves = psf.read(psf_file, names)
+	for name in names:
+		if name not in waves:
+			raise ValueError("%s: signal %s has not been saved" % (psf_file, name))
+	return waves
+
+
+# Returns the time at which a wave crosses the threshold th for the n-th time,
+# counting only crossings with the given edge, which is one of "rising",
+# "falling", or "either".
+def cross(wave, th, n=1, edge="either"):
+	direction = EDGES[edge]
+	count = 0
+	for (t, d) in psf.crossings(wave[0], wave[1], th):
+		if direction == 0 or d == direction:
+			count += 1
+			if count == n:
+				return t
+	raise ValueError("wave has %d %s crossings of %g, expected at least %d" % (count, edge, th, n))
+
+
+# Returns the value of a wave at time t, linearly interpolated between the time
+# points around t. The wave is held constant before its first and after its last
+# time point.
+def value(wave, t):
+	(time, values) = wave
+	i = bisect_right(time, t)
+	if i == 0:
+		return values[0]
+	if i == len(time):
+		return values[-1]
+	(ta, tb, va, vb) = (time[i-1], time[i], values[i-1], values[i])
+	return va + (t - ta) * (vb - va) / (tb - ta)
+
+
+# Returns the integral of a wave from start to end, using the trapezoidal rule.
+# The wave is interpolated at start and end.
+def integ(wave, start, end):
+	(time, values) = wave
+	a = bisect_right(time, start)
+	b = bisect_left(time, end, a)
+	ts = [start] + list(time[a:b]) + [end]
+	vs = [value(wave, start)] + list(values[a:b]) + [value(wave, end)]
+	return sum((tb - ta) * (va + vb) for (ta, tb, va, vb) in zip(ts, ts[1:], vs, vs[1:])) * 0.5
@@ -0,0 +1,253 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a pool of persistent OCEAN sessions. Starting OCEAN takes
+# tens of seconds and checks out a license, which dominates the analysis of a
+# single characterization run. A session is therefore kept alive and fed one
+# script after another over its stdin. After each script the session prints a
+# marker line, which tells the pool that the script has completed and whether
+# loading it raised an error. Sessions that exit are restarted, and the script
+# they were executing is retried once. Sessions that do not complete a script
+# within the timeout are killed and restarted for the next script, but the
+# script is not retried.
+#
+# The characterizations of a batch run in separate processes. To share the
+# sessions among them, a pool is served over a unix socket by the ocean-server
+# command. If the POTSTILL_OCEAN_SOCKET environment variable points to such a
+# socket, OCEAN scripts are submitted to the server instead of starting OCEAN.
+# The OCEAN command may be overridden by the POTSTILL_OCEAN environment
+# variable, e.g. to test the pool against a scripted fake.
+
+import sys, os, re, shlex, json, time, signal, socket, socketserver, subprocess, threading, queue
+
+
+SOCKET_ENV = "POTSTILL_OCEAN_SOCKET"
+COMMAND_ENV = "POTSTILL_OCEAN"
+DEFAULT_COMMAND = "cds_ic6 ocean -nograph"
+MARKER = "@POTSTILL-OCEAN-DONE@"
+MARKER_LINE = re.compile(re.escape(MARKER) + r" (\d+) (ok|error)")
+
+
+class OceanError(Exception):
+	pass
+
+
+# Raised if an OCEAN session exits while executing a script.
+class SessionError(OceanError):
+	pass
+
+
+# Raised if an OCEAN session does not complete a script within the timeout.
+class SessionTimeout(SessionError):
+	pass
+
+
+def default_command():
+	return shlex.split(os.environ.get(COMMAND_ENV, DEFAULT_COMMAND))
+
+
+def server_address():
+	return os.environ.get(SOCKET_ENV) or None
+
+
+# A single OCEAN process. The process is started on demand when the first script
+# is executed. Its output is read by a separate thread, such that run() can give
+# up on a script after timeout seconds. The process is started in a new process
+# group, such that the OCEAN processes spawned by the wrapper script are killed
+# along with it.
+class Session(object):
+	def __init__(self, command=None, log=None, timeout=None):
+		super(Session, self).__init__()
+		self.command = command or default_command()
+		self.log = log
+		self.timeout = timeout
+		self.process = None
+		self.lines = None
+		self.num_jobs = 0
+
+	def alive(self):
+		return self.process is not None and self.process.poll() is None
+
+	def start(self):
+		cmd = list(self.command)
+		if self.log is not None:
+			cmd += ["-log", self.log]
+		self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, start_new_session=True)
+		self.lines = queue.Queue()
+		threading.Thread(target=read_lines, args=(self.process.stdout, self.lines), daemon=True).start()
+
+	def kill(self):
+		try:
+			os.killpg(self.process.pid, signal.SIGKILL)
+		except OSError:
+			pass
+		self.process.wait()
+
+	# Stops the session, asking OCEAN to exit unless kill is set.
+	def stop(self, kill=False):
+		if self.process is None:
+			return
+		if self.alive() and not kill:
+			try:
+				self.process.stdin.write("exit\n")
+				self.process.stdin.flush()
+				self.process.wait(timeout=10)
+			except (OSError, subprocess.TimeoutExpired):
+				self.kill()
+		else:
+			self.kill()
+		try:
+			self.process.stdin.close()
+		except OSError:
+			pass
+		self.process = None
+		self.lines = None
+
+	# Executes an OCEAN script with cwd as working directory. Returns a pair
+	# of whether the script completed without error and the output of the
+	# session while executing it.
+	def run(self, script, cwd="."):
+		if not self.alive():
+			self.stop()
+			self.start()
+		self.num_jobs += 1
+		job = self.num_jobs
+		try:
+			self.process.stdin.write(
+				"cd(\"%s\")\n" % os.path.abspath(cwd) +
+				"_potstillStatus = errset(load(\"%s\") t)\n" % script +
+				"printf(\"\\n%s %%d %%s\\n\" %d if(_potstillStatus \"ok\" \"error\"))\n" % (MARKER, job)
+			)
+			self.process.stdin.flush()
+		except OSError as e:
+			raise SessionError("unable to write to OCEAN session: %s" % e)
+
+		output = list()
+		deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+		while True:
+			try:
+				line = self.lines.get(timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None)
+			except queue.Empty:
+				self.stop(kill=True)
+				raise SessionTimeout("OCEAN session did not complete %s within %gs" % (script, self.timeout))
+			if line is None:
+				break
+			m = MARKER_LINE.search(line)
+			if m is not None and int(m.group(1)) == job:
+				return (m.group(2) == "ok", "".join(output))
+			output.append(line)
+		raise SessionError("OCEAN session exited with status %d while executing %s" % (self.process.wait(), script))
+
+
+# Puts the lines read from the output of a session into a queue, followed by
+# None once the session has exited.
+def read_lines(stdout, lines):
+	try:
+		with stdout:
+			for line in stdout:
+				lines.put(line)
+	except (OSError, ValueError):
+		pass
+	lines.put(None)
+
+
+# A fixed number of sessions that execute scripts concurrently. run() blocks
+# until a session is available.
+class Pool(object):
+	def __init__(self, size, command=None, max_retries=1, timeout=None):
+		super(Pool, self).__init__()
+		self.size = size
+		self.max_retries = max_retries
+		self.sessions = list()
+		self.idle = queue.Queue()
+		for i in range(size):
+			session = Session(command, timeout=timeout)
+			self.sessions.append(session)
+			self.idle.put(session)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def run(self, script, cwd="."):
+		session = self.idle.get()
+		try:
+			for attempt in range(self.max_retries+1):
+				try:
+					return session.run(script, cwd)
+				except SessionTimeout as e:
+					sys.stderr.write("%s; restarting session\n" % e)
+					raise
+				except SessionError as e:
+					sys.stderr.write("%s; restarting session\n" % e)
+					session.stop()
+					error = e
+			raise error
+		finally:
+			self.idle.put(session)
+
+	def close(self):
+		for session in self.sessions:
+			session.stop()
+
+
+# Serves a pool on a unix socket at path. Each connection submits one request,
+# a JSON object with the script and the working directory on a single line, and
+# receives a JSON object with the outcome in return.
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, path, pool):
+		self.pool = pool
+		socketserver.UnixStreamServer.__init__(self, path, RequestHandler)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		try:
+			request = json.loads(self.rfile.readline().decode())
+			(ok, output) = self.server.pool.run(request["script"], request["cwd"])
+			reply = {"ok": ok, "output": output}
+		except Exception as e:
+			reply = {"ok": False, "output": "", "error": str(e)}
+		self.wfile.write((json.dumps(reply)+"\n").encode())
+
+
+# Submits a script to the server at address, or at the address given by the
+# environment. The output of the session is written to the log file in cwd.
+# Raises an OceanError if the script did not complete without error.
+def submit(script, cwd=".", log="CDS.log", address=None):
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+		s.connect(address or server_address())
+		s.sendall((json.dumps({"script": script, "cwd": os.path.abspath(cwd)})+"\n").encode())
+		with s.makefile("rb") as f:
+			line = f.readline()
+	if len(line) == 0:
+		raise OceanError("OCEAN server closed the connection while executing %s" % script)
+	reply = json.loads(line.decode())
+	if log is not None:
+		with open(os.path.join(cwd, log), "w") as f:
+			f.write(reply["output"])
+	if "error" in reply:
+		raise OceanError("OCEAN server failed to execute %s: %s" % (script, reply["error"]))
+	if not reply["ok"]:
+		raise OceanError("OCEAN script %s failed%s" % (script, ", see "+os.path.join(cwd, log) if log is not None else ""))
+
+
+# Submits multiple (script, cwd) jobs to the server concurrently. Raises the
+# first error after all jobs have completed.
+def submit_all(jobs, log="CDS.log", address=None):
+	errors = list()
+	def work(script, cwd):
+		try:
+			submit(script, cwd, log, address)
+		except (OceanError, OSError) as e:
+			errors.append(e)
+	threads = [threading.Thread(target=work, args=job) for job in jobs]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	if len(errors) > 0:
+		raise errors[0]
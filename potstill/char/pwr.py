@@ -8,8 +8,9 @@
 # file data generation.
 
 import sys, os, potstill
+from collections import OrderedDict
 
-from potstill.char import util
+from potstill.char import util, measure
 from potstill.char.util import ScsWriter, OcnWriter
 
 
@@ -79,13 +80,35 @@ class Input(util.Input):
 
 		return wr.collect()
 
+	# Returns the windows over which the energies are integrated, as a list of
+	# (name, starts, duration, rd_toggle) tuples. The energy is the average over
+	# the windows starting at each of the starts. If rd_toggle is set, the read
+	# data toggles every other cycle and the energy deposited in the load
+	# capacitances is subtracted.
+	def energy_windows(self):
+		windows = list()
+		for (name, start, num_cycles, rd_toggle) in [
+			("idle",  self.Tstart_idle,  1, False),
+			("read",  self.Tstart_read,  2, True),
+			("write", self.Tstart_write, 4, False),
+			("rw",    self.Tstart_rw,    4, True)
+		]:
+			stops = [start + 1*self.T + i*self.Tcycle for i in range(num_cycles)]
+			windows.append(("E_%s" % name, stops, 2*self.T, rd_toggle))
+		return windows
+
+	# Returns the total energy deposited in the load capacitances during a
+	# rising edge of the read data.
+	def energy_cload(self):
+		return self.macro.num_bits * 0.5 * self.cload * self.macro.vdd**2
+
 	def make_ocean(self):
 		wr = OcnWriter()
 		self.write_ocean_prolog(wr)
 		wr.skip()
 
 		wr.comment("Total energy deposited in the load capacitances during RD rising edge")
-		wr.assign("E_cload", self.macro.num_bits * 0.5 * self.cload * self.macro.vdd**2)
+		wr.assign("E_cload", self.energy_cload())
 		wr.skip()
 
 		wr.comment("Calculate leakage power")
@@ -97,15 +120,9 @@ class Input(util.Input):
 		wr.skip()
 
 		wr.comment("Integrate energies")
-		for (name, start, num_cycles, rd_toggle) in [
-			("idle",  self.Tstart_idle,  1, False),
-			("read",  self.Tstart_read,  2, True),
-			("write", self.Tstart_write, 4, False),
-			("rw",    self.Tstart_rw,    4, True)
-		]:
-			stops = [start + 1*self.T + i*self.Tcycle for i in range(num_cycles)]
+		for (name, stops, duration, rd_toggle) in self.energy_windows():
 			parts = [
-				"integ(-IT(\"VDD:p\") %g %g)" % (stop, stop+2*self.T)
+				"integ(-IT(\"VDD:p\") %g %g)" % (stop, stop+duration)
 				for stop in stops
 			]
 			joined = " + ".join(parts)
@@ -113,16 +130,29 @@ class Input(util.Input):
 				joined = "("+joined+")"
 			energy_expr = "%s*VDD/%d" % (
 				joined,
-				num_cycles
+				len(stops)
 			)
 			if rd_toggle:
-				energy_expr = "%s - %d*E_cload" % (energy_expr, num_cycles/2)
-			wr.result("E_%s" % name, energy_expr)
+				energy_expr = "%s - %d*E_cload" % (energy_expr, len(stops)/2)
+			wr.result(name, energy_expr)
 		wr.skip()
 
 		self.write_ocean_epilog(wr)
 		return wr.collect()
 
+	# Calculates the results of the OCEAN script from the SPECTRE results.
+	def analyze(self, psf_file):
+		i = measure.load(psf_file, ["VDD:p"])["VDD:p"]
+		vdd = self.macro.vdd
+		results = OrderedDict()
+		results["P_leak"] = -measure.integ(i, 0.75*self.T, 1.00*self.T) / (0.25*self.T) * vdd
+		for (name, stops, duration, rd_toggle) in self.energy_windows():
+			energy = -sum(measure.integ(i, stop, stop+duration) for stop in stops) * vdd / len(stops)
+			if rd_toggle:
+				energy -= len(stops)//2 * self.energy_cload()
+			results[name] = energy
+		return results
+
 
 class Run(util.RegularRun):
 	pass
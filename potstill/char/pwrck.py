@@ -5,8 +5,9 @@
 # characterizes leakage power, idle, read, write, and read+write energy.
 
 import sys, os
+from collections import OrderedDict
 import potstill
-from potstill.char import util
+from potstill.char import util, measure
 from potstill.char.util import ScsWriter, OcnWriter
 
 
@@ -61,6 +62,22 @@ class Input(util.Input):
 
 		return wr.collect()
 
+	# Returns the windows over which the energies are integrated, as a list of
+	# (name, starts, duration) tuples. The energy is the average over the
+	# windows starting at each of the starts.
+	def energy_windows(self):
+		windows = list()
+		for (name, start, num_cycles) in [
+			("idle", self.Tstart_idle, 1),
+			("read", self.Tstart_read, 2),
+			("write", self.Tstart_write, 2),
+			("rw", self.Tstart_rw, 2)
+		]:
+			for (offset, edge) in [(0, "rise"), (1, "fall")]:
+				stops = [start + (1+offset)*self.T + i*self.Tcycle for i in range(num_cycles)]
+				windows.append(("E_%s_%s" % (name, edge), stops, self.T))
+		return windows
+
 	def make_ocean(self):
 		wr = OcnWriter()
 		wr.comment("Internal clock power analysis for "+self.macro.name)
@@ -76,30 +93,33 @@ class Input(util.Input):
 		wr.skip()
 
 		wr.comment("Integrate energies")
-		for (name, start, num_cycles) in [
-			("idle", self.Tstart_idle, 1),
-			("read", self.Tstart_read, 2),
-			("write", self.Tstart_write, 2),
-			("rw", self.Tstart_rw, 2)
-		]:
-			for (offset, edge) in [(0, "rise"), (1, "fall")]:
-				stops = [start + (1+offset)*self.T + i*self.Tcycle for i in range(num_cycles)]
-				parts = [
-					"integ(-IT(\"VDD:p\") %g %g)" % (stop, stop+self.T)
-					for stop in stops
-				]
-				joined = " + ".join(parts)
-				if len(parts) > 1:
-					joined = "("+joined+")"
-				wr.result("E_%s_%s" % (name, edge), "%s*VDD/%d" % (
-					joined,
-					num_cycles
-				))
+		for (name, stops, duration) in self.energy_windows():
+			parts = [
+				"integ(-IT(\"VDD:p\") %g %g)" % (stop, stop+duration)
+				for stop in stops
+			]
+			joined = " + ".join(parts)
+			if len(parts) > 1:
+				joined = "("+joined+")"
+			wr.result(name, "%s*VDD/%d" % (
+				joined,
+				len(stops)
+			))
 		wr.skip()
 
 		self.write_ocean_epilog(wr)
 		return wr.collect()
 
+	# Calculates the results of the OCEAN script from the SPECTRE results.
+	def analyze(self, psf_file):
+		i = measure.load(psf_file, ["VDD:p"])["VDD:p"]
+		vdd = self.macro.vdd
+		results = OrderedDict()
+		results["P_leak"] = -measure.integ(i, 0.5*self.T, 1*self.T) / (0.5*self.T) * vdd
+		for (name, stops, duration) in self.energy_windows():
+			results[name] = -sum(measure.integ(i, stop, stop+duration) for stop in stops) * vdd / len(stops)
+		return results
+
 
 class Run(util.RegularRun):
 	pass
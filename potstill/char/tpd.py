@@ -4,8 +4,9 @@
 # propagation and transition time analysis of a full memory macro.
 
 import sys, os, subprocess
+from collections import OrderedDict
 import potstill, potstill.nodeset, potstill.netlist
-from potstill.char import util
+from potstill.char import util, measure
 from potstill.char.util import ScsWriter, OcnWriter
 
 
@@ -68,6 +69,21 @@ class Input(util.Input):
 		self.write_ocean_epilog(wr)
 		return wr.collect()
 
+	# Calculates the results of the OCEAN script from the SPECTRE results.
+	def analyze(self, psf_file):
+		rd = measure.load(psf_file, ["RD0"])["RD0"]
+		x = dict()
+		for (suffix,pct) in [("S", 0.1), ("M", 0.5), ("E", 0.9)]:
+			x["rise_"+suffix] = measure.cross(rd, self.macro.vdd*pct, 1, "rising")
+			x["fall_"+suffix] = measure.cross(rd, self.macro.vdd*(1.0-pct), 1, "falling")
+
+		return OrderedDict([
+			("Tpd_RD_rise", x["rise_M"] - 3*self.T),
+			("Tpd_RD_fall", x["fall_M"] - 5*self.T),
+			("Ttran_RD_rise", x["rise_E"] - x["rise_S"]),
+			("Ttran_RD_fall", x["fall_E"] - x["fall_S"]),
+		])
+
 
 class Run(util.RegularRun):
 	pass
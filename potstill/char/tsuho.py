@@ -3,8 +3,10 @@
 # This file implements input file generation and simulation execution for the
 # setup and hold time analysis of a full memory macro.
 
-import sys, os, numbers, collections, subprocess, csv
+import sys, os, math, numbers, collections, subprocess, csv, json
 import potstill
+from array import array
+from potstill import psf
 from potstill.char import util
 from potstill.char.util import ScsWriter, OcnWriter
 
@@ -13,17 +15,26 @@ def d2str(v):
 	return "%.8g" % v
 
 
-def lerp(v, a, b, x, y):
-	f = float(v - a) / (b - a)
-	return x*(1-f) + y*f
+# Returns the path of the address decoder slice that holds the first word. In a
+# banked macro, the first word lies in the slice of the first bank.
+def decoder_path(macro):
+	return "X.XAD0" if macro.num_banks > 1 else "X.XAD"
 
 
-def crossings(points, th):
-	for ((ta,va), (tb,vb)) in zip(points[0:-1], points[1:]):
-		if va < th and vb >= th:
-			yield(lerp(th, va, vb, ta, tb), 1)
-		elif vb < th and va >= th:
-			yield(lerp(th, vb, va, tb, ta), -1)
+# Checks that the nodes saved by the testbench exist in the netlist of the
+# macro, which is instantiated as X. A node is either a net of a generated
+# subcircuit, which must connect to at least one terminal, or an internal node
+# of a standard cell, whose instance must exist.
+def check_nodes(circuit, nodes):
+	for node in nodes:
+		path = node.split(".")[1:]
+		try:
+			insts = circuit.resolve(".".join(path[:-1])) if len(path) > 1 else []
+		except KeyError as e:
+			raise ValueError("probed node %s not in netlist: %s" % (node, e.args[0]))
+		subckt = insts[-1].cell if len(insts) > 0 else circuit.top
+		if subckt is None or (not subckt.external and len(circuit.terminals(path[-1], subckt)) == 0):
+			raise ValueError("probed node %s not in netlist" % node)
 
 
 class Probe(object):
@@ -57,16 +68,16 @@ class Pulse(object):
 
 
 class Input(util.Input):
-	probes = [
-		Probe("RE", "X.XRWCKG.X0.n1", inverted=True, outer=True, relative_to_clock=False),
-		Probe("RA", "X.nRA0"),
-		Probe("WE", "X.XRWCKG.X1.n1", inverted=True, outer=True, relative_to_clock=False),
-		Probe("WA", "X.XAD.XCKG0.n1", relative_to_clock=False),
-		Probe("WD", "X.nWD0"),
-	]
-
-	def __init__(self, macro, tslewck, tslewpin, num_steps=3, intervals=None, inclusive_intervals=True):
+	def __init__(self, macro, tslewck, tslewpin, num_steps=3, intervals=None, inclusive_intervals=True, stops=None):
 		super(Input, self).__init__(macro)
+		self.decoder = decoder_path(macro)
+		self.probes = [
+			Probe("RE", "X.XRWCKG.X0.n1", inverted=True, outer=True, relative_to_clock=False),
+			Probe("RA", "X.nRA0"),
+			Probe("WE", "X.XRWCKG.X1.n1", inverted=True, outer=True, relative_to_clock=False),
+			Probe("WA", self.decoder+".XCKG0.n1", relative_to_clock=False),
+			Probe("WD", "X.nWD0"),
+		]
 		self.tslewck = tslewck
 		self.tslewpin = tslewpin
 		self.num_steps = num_steps
@@ -87,8 +98,9 @@ class Input(util.Input):
 
 		# Assemble a lists of rising and falling setup times checks to perform.
 		# Each of these will be translated into a separate pulse during the
-		# simulation.
-		self.stops = dict([
+		# simulation. The stops may also be given explicitly, as num_steps
+		# ascending stops for each edge of each probe.
+		self.stops = stops or dict([
 			(name, (
 				list(self.calc_stops(rise)),
 				list(self.calc_stops(fall))
@@ -171,43 +183,22 @@ class Input(util.Input):
 
 		wr.comment("Analysis")
 		wr.tran(self.num_steps*self.Tcycle + 1*self.T, errpreset="liberal")
-		wr.stmt("save CK X.XAD.nWE0 " + " ".join(
-			[p.terminal for p in self.probes] +
-			[p.probe for p in self.probes]
-		))
+		wr.stmt("save CK " + " ".join(self.saved_nodes()))
 
 		return wr.collect()
 
+	# Returns the nodes of the macro saved by the testbench.
+	def saved_nodes(self):
+		return [self.decoder+".nWE0"] + [p.terminal for p in self.probes] + [p.probe for p in self.probes]
 
-	# Analyzes the results of the SPECTRE run.
-	def analyze(self, psfascii_file):
-
-		# Load the waves from the ASCII file.
-		waves = dict(
-			[(p.name, list()) for p in self.probes] +
-			[(p.probe, list()) for p in self.probes]
-		)
-		with open(psfascii_file) as f:
-			# Skip everything up until the VALUE section.
-			for raw_line in f:
-				if raw_line.strip() == "VALUE":
-					break
-
-			# Parse the values.
-			time = None
-			for raw_line in f:
-				line = raw_line.strip()
-				if line == "END":
-					break
-				fields = line.split()
-				name = fields[0].strip('\"')
-				value = float(fields[1])
-				if name == "time":
-					time = value
-				else:
-					if name in waves:
-						assert(time is not None)
-						waves[name].append((time, value))
+
+	# Analyzes the results of the SPECTRE run, in either the PSF ASCII or the
+	# binary PSF format.
+	def analyze(self, psf_file):
+
+		# Load the waves of the probes.
+		waves = psf.read(psf_file, [p.probe for p in self.probes])
+		empty = (array("d"), array("d"))
 
 		# Find the crossing points for each of the observed probes.
 		Vth = self.macro.vdd/2
@@ -216,7 +207,8 @@ class Input(util.Input):
 			(rise_edges, fall_edges) = self.edges[probe.name]
 			rise_Tpd = dict()
 			fall_Tpd = dict()
-			for (t, probe_edge) in crossings(waves[probe.probe], Vth):
+			(time, values) = waves.get(probe.probe, empty)
+			for (t, probe_edge) in psf.crossings(time, values, Vth):
 
 				# Calculate the cycle this crossing belongs to.
 				cycle = int(t / self.Tcycle)
@@ -361,13 +353,96 @@ class HoldInput(Input):
 			)
 
 
+# The search for the setup or hold time of one edge of a probe. Stops up to lo
+# pass, i.e. the propagation delay stays below the limit, stops from hi on fail.
+# lo and hi are (stop, Tpd) pairs. The passing points are kept, since they
+# describe the shape of the Tpd curve towards the failing stops.
+class Bracket(object):
+	def __init__(self, limit):
+		super(Bracket, self).__init__()
+		self.limit = limit
+		self.lo = None
+		self.hi = None
+		self.passing = list()
+		self.estimated = None
+		self.missed = False
+		self.converged = None
+
+	def width(self):
+		return self.hi[0] - self.lo[0]
+
+	# Narrows the bracket to the (stop, Tpd) points measured in a simulation,
+	# in ascending order of the stops.
+	def update(self, points):
+		for (stop, Tpd) in points:
+			if Tpd < self.limit:
+				self.passing.append((stop, Tpd))
+				if self.lo is None or self.lo[0] < stop:
+					self.lo = (stop, Tpd)
+			else:
+				if self.hi is None or self.hi[0] > stop:
+					self.hi = (stop, Tpd)
+				break
+
+		# An estimated stop that passes means the curve did not have the
+		# expected shape.
+		if self.estimated is not None:
+			self.missed = self.lo[0] >= self.estimated
+			self.estimated = None
+
+	# Estimates the stop where the Tpd curve crosses the limit, by extending
+	# the secant through the two latest passing points. The curve rises ever
+	# more steeply towards the failing stops, such that the estimate lies at
+	# or beyond the crossing. The Tpd of failing stops is not used, since the
+	# output may only transition with the next clock edge. Returns None if the
+	# passing points do not rise.
+	def estimate(self):
+		top = sorted(self.passing)[-2:]
+		if len(top) < 2 or top[1][1] <= top[0][1]:
+			return None
+		((x1, T1), (x2, T2)) = top
+		return x2 + (x2-x1) * (self.limit-T2) / (T2-T1)
+
+	# Returns whether the secant estimate lies outside the bracket, or the
+	# previous estimate has missed the crossing, such that the secant cannot be
+	# used to narrow the bracket.
+	def estimate_outside(self):
+		if self.missed:
+			return True
+		x = self.estimate()
+		return x is not None and not (self.lo[0] < x < self.hi[0])
+
+	# Returns the number of stops needed to narrow the bracket to the target
+	# precision in one simulation.
+	def num_steps_needed(self, target_precision, secant=True):
+		(a, b) = (self.lo[0], self.hi[0])
+		n = int(math.ceil((b-a) / target_precision)) - 1
+		x = self.estimate() if secant and not self.missed else None
+		if x is not None and x < b:
+			n = min(n, int(math.ceil((x-a) / target_precision)))
+		return max(n, 1)
+
+	# Returns n ascending stops within the bracket. With secant, the stops are
+	# spread up to the estimated crossing if that narrows the bracket more than
+	# spreading them evenly across the entire bracket. Even spreading is used
+	# as well after an estimate has missed the crossing.
+	def place(self, n, secant=True):
+		(a, b) = (self.lo[0], self.hi[0])
+		x = self.estimate() if secant and not self.missed else None
+		self.missed = False
+		if x is None or (x-a) / n >= (b-a) / (n+1):
+			return [a + (i+1) * (b-a) / (n+1) for i in range(n)]
+		self.estimated = x
+		return [a + (i+1) * (x-a) / n for i in range(n)]
+
+
 class Run(util.Run):
-	def __init__(self, output, figure, macro, tslewck, tslewpin, threshold=1.05, max_iterations=10, target_precision=1e-12):
-		super(Run, self).__init__(macro)
+	def __init__(self, output, figure, macro, tslewck, tslewpin, threshold=1.05, max_iterations=10, target_precision=1e-12, reduced=False, psf_format="psfascii", cache=None, search="secant", num_steps=3, max_steps=8):
+		super(Run, self).__init__(macro, reduced=reduced, cache=cache)
 		self.tslewck = tslewck
 		self.tslewpin = tslewpin
 		self.threshold = threshold
-		self.intervals = None
+		self.brackets = None
 		self.baseline = None
 		self.precision = None
 		self.iteration = 0
@@ -375,21 +450,53 @@ class Run(util.Run):
 		self.target_precision = target_precision
 		self.output = output
 		self.figure = figure
+		self.psf_format = psf_format
+		self.search = search
+		self.num_steps = num_steps
+		self.max_steps = max_steps
 
 	def prepare(self):
-		self.make_netlist("netlist.cir")
+		circuit = self.make_netlist("netlist.cir")
+		check_nodes(circuit, [n for n in self.make_input(self.macro, self.tslewck, self.tslewpin).saved_nodes() if n.startswith("X.")])
 		self.make_nodeset("nodeset.ns")
 
+	# Returns the number of stops per probe edge of the next simulation. The
+	# first simulation uses num_steps stops like the uniform search. Later on,
+	# if every bracket can be narrowed to the target precision with at most
+	# max_steps stops, that many are used to finish in one run. Otherwise
+	# max_steps stops are only used while the secant estimate of a bracket
+	# falls outside of it, where the secant cannot narrow the bracket.
+	def calc_num_steps(self):
+		if self.search != "secant" or self.brackets is None:
+			return self.num_steps
+		brackets = [b for pair in self.brackets.values() for b in pair]
+		needed = max([b.num_steps_needed(self.target_precision) for b in brackets])
+		if self.num_steps < needed <= self.max_steps:
+			return needed
+		if any(b.estimate_outside() for b in brackets):
+			return max(self.num_steps, self.max_steps)
+		return self.num_steps
+
+	def make_iteration_input(self):
+		num_steps = self.calc_num_steps()
+		if self.brackets is None:
+			return self.make_input(self.macro, self.tslewck, self.tslewpin, num_steps=num_steps)
+		secant = (self.search == "secant")
+		stops = dict([
+			(name, (rise.place(num_steps, secant), fall.place(num_steps, secant)))
+			for (name, (rise, fall)) in self.brackets.items()
+		])
+		return self.make_input(self.macro, self.tslewck, self.tslewpin, num_steps=num_steps, stops=stops)
+
 	def run_iteration(self):
 		# Run the SPECTRE simulation and analysis. During the first iteration
-		# when self.intervals = None, the interval [-T/2,T/2] is inspected for
+		# when self.brackets = None, the interval [-T/2,T/2] is inspected for
 		# all inputs.
 		filename = "input.scs"
-		inp = self.make_input(self.macro, self.tslewck, self.tslewpin, intervals=self.intervals, inclusive_intervals=(self.intervals is None))
+		inp = self.make_iteration_input()
 		with open(filename, "w") as f:
 			f.write(inp.make_spectre())
-		self.exec_spectre(filename, output=self.output, format="psfascii", quiet=True)
-		results = inp.analyze(self.output+"/tran.tran.tran")
+		results = self.simulate(inp, filename)
 
 		# If no baseline for Tpd has been established yet, i.e. this is the
 		# first iteration, use the propagation delay for Tsu/Tho = -T/2 as the
@@ -404,57 +511,72 @@ class Run(util.Run):
 				print("  Tpd_%s_rise: %.4gps" % (name, rise*1e12))
 				print("  Tpd_%s_fall: %.4gps" % (name, fall*1e12))
 
-		# Initialize the intervals if this is the first iteration.
-		if self.intervals is None:
-			self.intervals = dict([
-				(name, ([None, None], [None, None]))
-				for (name,_,_) in results
+		# Initialize the brackets if this is the first iteration.
+		if self.brackets is None:
+			self.brackets = dict([
+				(name, (Bracket(rise*self.threshold), Bracket(fall*self.threshold)))
+				for (name, (rise, fall)) in self.baseline.items()
 			])
 
+		self.iteration += 1
 		for (name, rise, fall) in results:
-			# print("Analyzing results of %s" % name)
-			(rise_baseline, fall_baseline) = self.baseline[name]
-			(rise_intv, fall_intv) = self.intervals[name]
-			for (points, intv, baseline) in [(rise, rise_intv, rise_baseline), (fall, fall_intv, fall_baseline)]:
-				for (Tsu,Tpd) in points:
-					if Tpd < baseline * self.threshold:
-						if intv[0] is None or intv[0] < Tsu:
-							intv[0] = Tsu
-					else:
-						if intv[1] is None or intv[1] > Tsu:
-							intv[1] = Tsu
-							break
+			for (points, bracket, edge) in zip((rise, fall), self.brackets[name], ("rise", "fall")):
+				bracket.update(points)
+				if bracket.lo is None or bracket.hi is None:
+					raise ValueError("%s_%s_%s: no %s stop found" % (self.figure, name, edge, "passing" if bracket.lo is None else "failing"))
+				if bracket.converged is None and bracket.width() <= self.target_precision:
+					bracket.converged = self.iteration
 
 
 		# Write this iteration's results to disk.
 		with open(self.output+".csv", "w") as f:
 			wr = csv.writer(f)
 			for probe in inp.probes:
-				(rise,fall) = self.intervals[probe.name]
-				wr.writerow(["%s_%s_rise" % (self.figure, probe.name), rise[0]])
-				wr.writerow(["%s_%s_fall" % (self.figure, probe.name), fall[0]])
+				(rise,fall) = self.brackets[probe.name]
+				wr.writerow(["%s_%s_rise" % (self.figure, probe.name), rise.lo[0]])
+				wr.writerow(["%s_%s_fall" % (self.figure, probe.name), fall.lo[0]])
 
 
 		# Write the current value range for the rise and fall times for each
 		# input to stdout, for informative purposes only.
-		print("Iteration %d:" % self.iteration)
-		for (name, (rise,fall)) in self.intervals.items():
+		print("Iteration %d (%d stops):" % (self.iteration-1, inp.num_steps))
+		for (name, (rise,fall)) in self.brackets.items():
 			print("  %s: %s rise = %.4gps ±%.4gps, fall = %.4gps ±%.4gps" % (
 				name, self.figure,
-				(rise[0]+rise[1])*0.5*1e12, (rise[1]-rise[0])*0.5*1e12,
-				(fall[0]+fall[1])*0.5*1e12, (fall[1]-fall[0])*0.5*1e12
+				(rise.lo[0]+rise.hi[0])*0.5*1e12, rise.width()*0.5*1e12,
+				(fall.lo[0]+fall.hi[0])*0.5*1e12, fall.width()*0.5*1e12
 			))
 
-		# Calculate the overall precision achieved and keep track of the
-		# iteration counter.
+		# Calculate the overall precision achieved.
 		self.precision = max([
-			max(tb-ta, td-tc) for ((ta,tb),(tc,td)) in self.intervals.values()
+			max(rise.width(), fall.width()) for (rise, fall) in self.brackets.values()
 		])
 		print("  precision = %.4gps" % (self.precision*1e12))
-		self.iteration += 1
 		return self.precision
 
 
+	# Simulates an input and returns the propagation delays measured for each
+	# stop. If a cache is set, the delays are stored in a JSON file alongside
+	# the results and restored from the cache for identical simulations. The
+	# stops are part of the key, since they relate the delays to the stimuli.
+	def simulate(self, inp, filename):
+		if self.cache is None:
+			self.exec_spectre(filename, output=self.output, format=self.psf_format, quiet=True)
+			return inp.analyze(self.output+"/tran.tran.tran")
+
+		tpd_file = self.output+"-tpd.json"
+		key = self.spectre_key(filename, "tsuho", repr(sorted(inp.stops.items())), output=self.output, format=self.psf_format)
+		if self.cache.restore(key, [tpd_file], self.output):
+			with open(tpd_file) as f:
+				return json.load(f)
+		self.exec_spectre(filename, output=self.output, format=self.psf_format, quiet=True)
+		results = inp.analyze(self.output+"/tran.tran.tran")
+		with open(tpd_file, "w") as f:
+			json.dump(results, f)
+		self.cache.store(key, [tpd_file], self.output)
+		return results
+
+
 	# Perform multiple iterations of the analysis until a certain precision has
 	# been reached or the maximum number of iterations have elapsed.
 	def run(self):
@@ -464,6 +586,11 @@ class Run(util.Run):
 			self.run_iteration()
 
 		print("Finished after %d iterations, precision = %.4gps" % (self.iteration, self.precision*1e12))
+		for (name, brackets) in self.brackets.items():
+			print("  %s: %s" % (name, ", ".join([
+				"%s %s" % (edge, "converged after %d runs" % b.converged if b.converged is not None else "±%.4gps" % (b.width()*0.5*1e12))
+				for (edge, b) in zip(("rise", "fall"), brackets)
+			])))
 
 
 class SetupRun(Run):
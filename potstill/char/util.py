@@ -2,9 +2,10 @@
 #
 # Various utilities to produce SPECTRE and OCEAN input files.
 
-import sys, os, subprocess, numbers, collections
-import potstill.netlist, potstill.nodeset
+import sys, os, subprocess, numbers, collections, csv
+import potstill.netlist, potstill.nodeset, potstill.circuit
 from potstill.macro import Macro
+from potstill.char import ocean, cache
 
 
 # Writer that generates SPECTRE input text.
@@ -100,9 +101,43 @@ def argparse_init_macro(parser):
 	parser.add_argument("NBITS", type=int, help="number of bits per word")
 	parser.add_argument("VDD", type=float, help="supply voltage [V]")
 	parser.add_argument("TEMP", type=float, help="junction temperature [°C]")
+	parser.add_argument("-b", "--banks", type=int, default=1, help="number of banks the words are split into")
+	parser.add_argument("-f", "--fold", type=int, default=1, choices=[1,2,4,8], help="number of words placed side by side in each row")
+	parser.add_argument("--predecode", action="store_true", help="predecode groups of address bits in the address decoder")
+	parser.add_argument("--radix", type=int, default=2, choices=[2,4], help="number of inputs of the read mux stages")
+
+# Adds the options to preload the memory contents from a file.
+def argparse_init_contents(parser):
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument("--readmemh", metavar="FILE", type=str, help="initialize the memory with the hexadecimal words in FILE")
+	group.add_argument("--readmemb", metavar="FILE", type=str, help="initialize the memory with the binary words in FILE")
+
+def argparse_get_contents(args, macro):
+	if args.readmemh is not None:
+		return potstill.nodeset.read_contents(args.readmemh, macro.num_words, macro.num_bits, 16)
+	if args.readmemb is not None:
+		return potstill.nodeset.read_contents(args.readmemb, macro.num_words, macro.num_bits, 2)
+	return None
+
+# Adds the options to select how the simulation results are analyzed.
+def argparse_init_analyzer(parser):
+	parser.add_argument("--analyzer", type=str, choices=["ocean", "python"], default="ocean", help="analyze the results with an OCEAN script or in Python [default: ocean]")
+	parser.add_argument("--psf-format", type=str, choices=["psfascii", "psfbin"], default="psfascii", help="format of the SPECTRE results analyzed in Python [default: psfascii]")
+
+# Adds the options to cache simulation results, see potstill.char.cache.
+def argparse_init_cache(parser):
+	parser.add_argument("--cache", metavar="DIR", type=str, help="restore the results of identical simulations from the cache in DIR [default: $"+cache.CACHE_ENV+"]")
+	parser.add_argument("--cache-psf", action="store_true", help="also cache the SPECTRE results, not only the extracted results")
+	parser.add_argument("--no-cache", action="store_true", help="don't use the simulation cache")
+
+def argparse_get_cache(args):
+	root = args.cache or cache.default_root()
+	if args.no_cache or root is None:
+		return None
+	return cache.Cache(root, keep_psf=args.cache_psf)
 
 def argparse_get_macro(args):
-	return Macro(args.NADDR, args.NBITS, args.VDD, args.TEMP)
+	return Macro(args.NADDR, args.NBITS, args.VDD, args.TEMP, num_banks=args.banks, words_per_row=args.fold, predecode=args.predecode, mux_radix=args.radix)
 
 
 class CommonArgs(object):
@@ -128,11 +163,14 @@ class CommonArgs(object):
 			parser.add_argument("--keep-nodeset", action="store_true", help="don't create new nodeset file")
 			parser.add_argument("-c", "--cut", type=str, help="name of the circuit to instantiate")
 			parser.add_argument("--postlayout", action="store_true", help="run SPECTRE with the +postlayout switch")
+			argparse_init_contents(parser)
+			argparse_init_cache(parser)
 
 		# Add OCEAN-specific options.
+		argparse_init_analyzer(parser)
 		if not no_ocean:
 			parser.add_argument("--dump-ocean", action="store_true", help="write OCEAN input file to stdout")
-			parser.add_argument("--only-ocean", action="store_true", help="only run OCEAN")
+			parser.add_argument("--only-ocean", action="store_true", help="only analyze the SPECTRE results")
 			parser.add_argument("--ocean", type=str, help="name of the OCEAN input file")
 			parser.add_argument("--keep-ocean", action="store_true", help="don't create new OCEAN input file")
 
@@ -157,6 +195,10 @@ class CommonArgs(object):
 			opts["dont_netlist"] = self.args.keep_netlist
 			opts["dont_nodeset"] = self.args.keep_nodeset
 			opts["postlayout"] = self.args.postlayout
+			opts["contents"] = argparse_get_contents(self.args, self.get_macro())
+			opts["cache"] = argparse_get_cache(self.args)
+		opts["analyzer"] = self.args.analyzer
+		opts["psf_format"] = self.args.psf_format
 		return opts
 
 	def handle_input(self, inp):
@@ -179,7 +221,7 @@ class CommonArgs(object):
 				sys.exit(0)
 		if not self.no_ocean:
 			if self.args.only_ocean:
-				run.run_ocean()
+				run.run_analysis()
 				sys.exit(0)
 
 
@@ -265,42 +307,87 @@ class Input(object):
 
 
 
+# Loads the name,value rows of results files as written by the OCEAN scripts
+# and the setup/hold iterations. Files that do not exist are skipped.
+def load_results(filenames):
+	results = collections.OrderedDict()
+	for filename in filenames:
+		if not os.path.exists(filename):
+			continue
+		with open(filename) as f:
+			for row in csv.reader(f):
+				if len(row) != 2:
+					continue
+				try:
+					results[row[0]] = float(row[1])
+				except ValueError:
+					pass
+	return results
+
+
 class Run(object):
-	def __init__(self, macro, postlayout=False):
+	def __init__(self, macro, postlayout=False, reduced=False, contents=None, cache=None):
 		super(Run, self).__init__()
 		self.macro = macro
 		self.postlayout = postlayout
+		self.reduced = reduced
+		self.contents = contents
+		self.cache = cache
 
+	# Writes the netlist of the macro to filename and returns it as a
+	# potstill.circuit.Netlist, such that the nets to be probed can be checked.
 	def make_netlist(self, filename):
-		sys.stderr.write("Generating netlist %s\n" % filename)
+		sys.stderr.write("Generating %snetlist %s\n" % ("reduced " if self.reduced else "", filename))
+		circuit = potstill.netlist.buildMacro(self.macro, self.reduced)
 		with open(filename, "w") as f:
-			f.write(potstill.netlist.generate(self.macro.num_addr, self.macro.num_bits))
+			potstill.circuit.write_spice(circuit, f)
+		return circuit
 
 	def make_nodeset(self, filename):
 		sys.stderr.write("Generating nodeset %s\n" % filename)
 		with open(filename, "w") as f:
-			f.write(potstill.nodeset.generate("X", self.macro.num_addr, self.macro.num_bits))
+			potstill.nodeset.writeMacro(f, "X", self.macro, self.reduced, self.contents)
 
-	def exec_spectre(self, filename, output="psf", log="spectre.out", aps=True, format="psfxl", quiet=False):
-		sys.stderr.write("Executing SPECTRE input %s\n" % filename)
+	def spectre_command(self, filename, output="psf", log="spectre.out", aps=True, format="psfxl"):
 		cmd = ["cds_mmsim", "spectre", "-64", filename, "+escchars", "+log", log, "-format", format, "-raw", output]
 		if aps:
 			cmd.append("+aps")
 		if self.postlayout:
 			cmd.append("+postlayout")
+		return cmd
+
+	def exec_spectre(self, filename, output="psf", log="spectre.out", aps=True, format="psfxl", quiet=False):
+		sys.stderr.write("Executing SPECTRE input %s\n" % filename)
+		cmd = self.spectre_command(filename, output=output, log=log, aps=aps, format=format)
 		subprocess.check_call(cmd, stdout=(subprocess.DEVNULL if quiet else None))
 
+	# Returns the cache key of a SPECTRE run of filename. The extra strings
+	# describe how the results are extracted from the simulation.
+	def spectre_key(self, filename, *extra, **kwargs):
+		return self.cache.key(filename, self.spectre_command(filename, **kwargs), *extra)
+
+	# Executes an OCEAN script, on the session server if one is available, see
+	# potstill.char.ocean.
 	def exec_ocean(self, filename, log="CDS.log"):
+		if ocean.server_address() is not None:
+			sys.stderr.write("Submitting OCEAN input %s\n" % filename)
+			ocean.submit(filename, log=log)
+			return
 		sys.stderr.write("Executing OCEAN input %s\n" % filename)
-		subprocess.check_call(["cds_ic6", "ocean", "-nograph", "-log", log, "-replay", filename])
+		subprocess.check_call(ocean.default_command() + ["-log", log, "-replay", filename])
 
 
+# A run that simulates an input and analyzes the results. The results are either
+# calculated by the input's OCEAN script, or by its analyze() function if the
+# analyzer is "python", in which case SPECTRE writes its results in psf_format.
 class RegularRun(Run):
-	def __init__(self, inp, dont_netlist=False, dont_nodeset=False, **kwargs):
+	def __init__(self, inp, dont_netlist=False, dont_nodeset=False, analyzer="ocean", psf_format="psfascii", **kwargs):
 		super(RegularRun, self).__init__(inp.macro, **kwargs)
 		self.inp = inp
 		self.dont_netlist = dont_netlist
 		self.dont_nodeset = dont_nodeset
+		self.analyzer = analyzer
+		self.psf_format = psf_format
 
 	def make_spectre_input(self, filename, **kwargs):
 		sys.stderr.write("Generating SPECTRE input %s\n" % filename)
@@ -312,18 +399,91 @@ class RegularRun(Run):
 		with open(filename, "w") as f:
 			f.write(self.inp.make_ocean())
 
-	def run_spectre(self):
+	def spectre_format(self):
+		return self.psf_format if self.analyzer == "python" else "psfxl"
+
+	def prepare_spectre(self):
 		if not self.dont_netlist:
 			self.make_netlist(self.inp.netlist_name)
 		if not self.dont_nodeset:
 			self.make_nodeset(self.inp.nodeset_name)
 		self.make_spectre_input("input.scs")
-		self.exec_spectre("input.scs")
+
+	def run_spectre(self):
+		self.prepare_spectre()
+		self.exec_spectre("input.scs", format=self.spectre_format())
 
 	def run_ocean(self):
 		self.make_ocean_input("analyze.ocn")
 		self.exec_ocean("analyze.ocn")
 
+	# Analyzes the SPECTRE results in Python and writes the results file in
+	# the same format as the OCEAN script.
+	def run_python(self):
+		sys.stderr.write("Analyzing SPECTRE results\n")
+		results = self.inp.analyze("psf/tran.tran.tran")
+		with open(self.inp.results_name, "w") as f:
+			for (name, value) in results.items():
+				f.write("%s,%g\n" % (name, value))
+
+	def run_analysis(self):
+		if self.analyzer == "python":
+			self.run_python()
+		else:
+			self.run_ocean()
+
+	# Executes the simulation and analysis. If a cache is set, the results of
+	# an identical simulation are restored from it instead. The OCEAN script
+	# describes the measurements of both analyzers, and is thus part of the
+	# key.
+	def run(self):
+		if self.cache is None:
+			self.run_spectre()
+			self.run_analysis()
+			return
+		self.prepare_spectre()
+		key = self.spectre_key("input.scs", self.analyzer, self.inp.make_ocean(), format=self.spectre_format())
+		files = [self.inp.results_name, "spectre.out"]
+		if self.cache.restore(key, files, "psf"):
+			return
+		self.exec_spectre("input.scs", format=self.spectre_format())
+		self.run_analysis()
+		self.cache.store(key, files, "psf")
+
+
+# Calibrates the reduced netlist against the full one. The run returned by
+# make_run(reduced) is executed once with the full and once with the reduced
+# netlist, in the subdirectories "full" and "reduced", and the relative error
+# of every result is reported and written to calibration.csv.
+class CalibrationRun(object):
+	def __init__(self, make_run, results_names=("results.csv",)):
+		super(CalibrationRun, self).__init__()
+		self.make_run = make_run
+		self.results_names = results_names
+
+	def run_in(self, workdir, reduced):
+		if not os.path.exists(workdir):
+			os.makedirs(workdir)
+		cwd = os.getcwd()
+		os.chdir(workdir)
+		try:
+			self.make_run(reduced).run()
+			return load_results(self.results_names)
+		finally:
+			os.chdir(cwd)
+
 	def run(self):
-		self.run_spectre()
-		self.run_ocean()
+		full = self.run_in("full", False)
+		reduced = self.run_in("reduced", True)
+
+		with open("calibration.csv", "w") as f:
+			wr = csv.writer(f)
+			wr.writerow(["name", "full", "reduced", "error"])
+			print("%-24s %12s %12s %8s" % ("name", "full", "reduced", "error"))
+			for (name, a) in full.items():
+				if name not in reduced:
+					continue
+				b = reduced[name]
+				err = (b-a)/a if a != 0 else float("nan")
+				wr.writerow([name, a, b, err])
+				print("%-24s %12.5g %12.5g %7.2f%%" % (name, a, b, err*100))
@@ -0,0 +1,150 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements geometric checks of a generated layout. They operate on
+# the bounding boxes of the placed cells and catch misplacements such as
+# overlapping cells, gaps between the columns of the macro, cells that are not
+# aligned to the placement grid, or wiring that does not lie on any cell, long
+# before an LVS run would.
+
+import heapq
+
+
+# Pairs of cell kinds that are allowed to overlap. The global clock gate sits in
+# a cutout of the address decoder's top row.
+ALLOWED_OVERLAPS = set([
+	("addrdec", "rwckg"),
+	("rwckg", "addrdec"),
+])
+
+# Groups of the instance table that make up the columns of the macro.
+COLUMN_GROUPS = ["Bit Arrays", "Address Decoder", "Welltaps"]
+
+
+class Violation(object):
+	def __init__(self, kind, message, x, y):
+		super(Violation, self).__init__()
+		self.kind = kind
+		self.message = message
+		self.x = x
+		self.y = y
+
+	def __str__(self):
+		return "%s at (%g, %g): %s" % (self.kind, self.x*1e6, self.y*1e6, self.message)
+
+
+# Finds all pairs of boxes with a non-empty intersection. The boxes are given as
+# (x0, y0, x1, y1, data) tuples with x0 <= x1 and y0 <= y1. The function sweeps
+# a vertical line across the boxes from left to right, keeping the boxes that
+# intersect the sweep line in an active set. Each box entering the set is only
+# compared against the active boxes, which are evicted as the sweep line passes
+# their right edge.
+def find_overlaps(boxes, eps=0):
+	events = sorted(boxes, key=lambda b: b[0])
+	active = list()
+	expiry = list()
+	counter = 0
+	for box in events:
+		(x0, y0, x1, y1, _) = box
+		while expiry and expiry[0][0] <= x0 + eps:
+			(_, _, old) = heapq.heappop(expiry)
+			active.remove(old)
+		for other in active:
+			if other[1] < y1 - eps and y0 < other[3] - eps:
+				yield (other, box)
+		active.append(box)
+		heapq.heappush(expiry, (x1, counter, box))
+		counter += 1
+
+
+# Finds the points that do not lie within or on the edge of any box. The points
+# are given as (x, y, data) tuples, the boxes as in find_overlaps. The function
+# sweeps across boxes and points from left to right, keeping the boxes that
+# intersect the sweep line in an active set.
+def find_uncovered(points, boxes, eps=0):
+	pending = sorted(boxes, key=lambda b: b[0])
+	active = list()
+	expiry = list()
+	k = 0
+	for point in sorted(points, key=lambda p: p[0]):
+		(x, y, _) = point
+		while k < len(pending) and pending[k][0] <= x + eps:
+			heapq.heappush(expiry, (pending[k][2], k, pending[k]))
+			active.append(pending[k])
+			k += 1
+		while expiry and expiry[0][0] < x - eps:
+			(_, _, old) = heapq.heappop(expiry)
+			active.remove(old)
+		if not any(b[1] <= y + eps and y - eps <= b[3] for b in active):
+			yield point
+
+
+# Finds the gaps in the union of the intervals [a,b) within [lo,hi). Returns a
+# list of (start, end) tuples.
+def find_gaps(intervals, lo, hi, eps=0):
+	gaps = list()
+	x = lo
+	for (a, b) in sorted(intervals):
+		if a > x + eps:
+			gaps.append((x, a))
+		x = max(x, b)
+	if hi > x + eps:
+		gaps.append((x, hi))
+	return gaps
+
+
+def is_on_grid(v, grid, eps):
+	r = v / grid
+	return abs(r - round(r)) * grid <= eps
+
+
+# Checks the layout and returns a list of violations.
+def check_layout(layout, grid=None):
+	insts = layout.insts
+	cells = insts.cells
+	grid = grid or layout.config.get("placement-grid", layout.grid)
+	eps = grid * 1e-3
+	violations = list()
+
+	# Overlaps among the placed cells. Cells without a known size, such as the
+	# wiring, cannot overlap and are checked separately below.
+	boxes = list()
+	points = list()
+	for (_, name, cell, x0, y0, x1, y1) in insts.boxes():
+		if x1 > x0 and y1 > y0:
+			boxes.append((x0, y0, x1, y1, (name, cells[cell])))
+		else:
+			points.append((x0, y0, (name, cells[cell])))
+	for (a, b) in find_overlaps(boxes, eps):
+		(name_a, cell_a) = a[4]
+		(name_b, cell_b) = b[4]
+		if (cell_a.kind, cell_b.kind) in ALLOWED_OVERLAPS:
+			continue
+		violations.append(Violation(
+			"overlap",
+			"%s (%s) and %s (%s)" % (name_a, cell_a.name, name_b, cell_b.name),
+			max(a[0], b[0]), max(a[1], b[1])
+		))
+
+	# Cells without a known size must lie within the macro and on top of one
+	# of the placed cells, which they wire across.
+	for (x, y, (name, cell)) in points:
+		if x < -eps or y < -eps or x > layout.size.x + eps or y > layout.size.y + eps:
+			violations.append(Violation("outside", "%s (%s) lies outside the macro" % (name, cell.name), x, y))
+	for (x, y, (name, cell)) in find_uncovered(points, boxes, eps):
+		if not (x < -eps or y < -eps or x > layout.size.x + eps or y > layout.size.y + eps):
+			violations.append(Violation("dangling", "%s (%s) does not lie on any placed cell" % (name, cell.name), x, y))
+
+	# Gaps between the columns of the macro.
+	columns = list()
+	for (title, start, end) in insts.groups:
+		if title in COLUMN_GROUPS:
+			columns += [(x0, x1) for (_, _, _, x0, _, x1, _) in insts.boxes(start, end)]
+	for (a, b) in find_gaps(columns, 0, layout.size.x, eps):
+		violations.append(Violation("gap", "no column covers x in [%g, %g]" % (a*1e6, b*1e6), a, 0))
+
+	# Placement off the grid.
+	for (_, name, cell, x, y, _, _) in insts.expand():
+		if not is_on_grid(x, grid, eps) or not is_on_grid(y, grid, eps):
+			violations.append(Violation("off-grid", "%s (%s) not on %g grid" % (name, cells[cell].name, grid*1e6), x, y))
+
+	return violations
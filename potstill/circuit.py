@@ -0,0 +1,260 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements an in-memory model of netlists. A netlist consists of
+# subcircuits with ports, whose instances connect cells or other subcircuits to
+# nets. Subcircuits defined by a library of SPICE text, such as the standard
+# cells, are kept as external subcircuits of which only the ports are known.
+# The model can be queried for the terminals connected to a net, and written as
+# SPICE, native Spectre, or structural Verilog.
+
+import re
+
+
+# Primitive devices, identified by the first letter of the instance name, and
+# their Spectre device type and value parameter.
+PRIMITIVES = {
+	"C": ("capacitor", "c"),
+	"R": ("resistor", "r"),
+}
+
+
+class Instance(object):
+	__slots__ = ("name", "cell", "nets", "value")
+
+	def __init__(self, name, cell, nets, value=None):
+		self.name = name
+		self.cell = cell
+		self.nets = nets
+		self.value = value
+
+	@property
+	def is_primitive(self):
+		return self.cell is None
+
+	@property
+	def cell_name(self):
+		return self.cell.name if self.cell is not None else None
+
+	# Returns the name of the pin connected to the i-th net.
+	def pin(self, i):
+		if self.cell is not None and self.cell.ports is not None and i < len(self.cell.ports):
+			return self.cell.ports[i]
+		return str(i)
+
+
+class Subcircuit(object):
+	def __init__(self, name, ports, external=False):
+		super(Subcircuit, self).__init__()
+		self.name = name
+		self.ports = list(ports) if ports is not None else None
+		self.external = external
+		self.instances = list()
+		self.cached_key = None
+
+	# Adds an instance of cell to the subcircuit. The cell is a Subcircuit;
+	# primitive devices such as resistors and capacitors have no cell and a
+	# value instead.
+	def add(self, name, cell, nets, value=None):
+		if cell is not None and cell.ports is not None and len(nets) != len(cell.ports):
+			raise ValueError("instance %s of %s in %s connects %d nets to %d ports" % (name, cell.name, self.name, len(nets), len(cell.ports)))
+		inst = Instance(name, cell, nets, value)
+		self.instances.append(inst)
+		self.cached_key = None
+		return inst
+
+	def instance(self, name):
+		for inst in self.instances:
+			if inst.name == name:
+				return inst
+		raise KeyError("no instance %s in %s" % (name, self.name))
+
+	# Returns a hashable description of the contents of the subcircuit, which
+	# is equal for two subcircuits that only differ in their name.
+	def key(self):
+		if self.cached_key is None:
+			self.cached_key = (
+				tuple(self.ports),
+				tuple((i.name, i.cell_name, tuple(i.nets), i.value) for i in self.instances)
+			)
+		return self.cached_key
+
+	# Returns the nets of the subcircuit, ports first, in order of appearance.
+	def nets(self):
+		seen = dict.fromkeys(self.ports)
+		for inst in self.instances:
+			seen.update(dict.fromkeys(inst.nets))
+		return list(seen)
+
+	# Returns the (instance, pin) pairs connected to a net.
+	def connections(self, net):
+		return [
+			(inst, inst.pin(i))
+			for inst in self.instances
+			for (i, n) in enumerate(inst.nets)
+			if n == net
+		]
+
+
+# A block of library text included verbatim, e.g. the netlists of the standard
+# cells. The subcircuits it defines are registered as external subcircuits.
+class Include(object):
+	def __init__(self, text):
+		super(Include, self).__init__()
+		self.text = text
+		self.subcircuits = [
+			Subcircuit(m.group(1), m.group(2).split(), external=True)
+			for m in re.finditer(r"^\.SUBCKT\s+(\S+)([^\n]*)", text, re.MULTILINE | re.IGNORECASE)
+		]
+
+
+class Netlist(object):
+	def __init__(self):
+		super(Netlist, self).__init__()
+		self.items = list()
+		self.subcircuits = dict()
+		self.contents = dict()
+
+	# Includes library text, given as a string or an Include.
+	def include(self, inc):
+		if not isinstance(inc, Include):
+			inc = Include(inc)
+		self.items.append(inc)
+		for sub in inc.subcircuits:
+			self.subcircuits[sub.name] = sub
+		return inc
+
+	# Adds a subcircuit to the netlist, after the subcircuits it instantiates.
+	# If a subcircuit with the same name or identical contents has been added
+	# before, that subcircuit is returned instead, such that every subcircuit
+	# is only emitted once.
+	def add(self, subckt):
+		if subckt.external:
+			return self.subcircuits.setdefault(subckt.name, subckt)
+		if self.subcircuits.get(subckt.name) is subckt:
+			return subckt
+		for inst in subckt.instances:
+			if inst.cell is not None:
+				cell = self.add(inst.cell)
+				if cell is not inst.cell:
+					inst.cell = cell
+					subckt.cached_key = None
+		if subckt.name in self.subcircuits:
+			existing = self.subcircuits[subckt.name]
+			if existing is not subckt and existing.key() != subckt.key():
+				raise ValueError("conflicting definitions of subcircuit %s" % subckt.name)
+			return existing
+		key = subckt.key()
+		if key in self.contents:
+			return self.contents[key]
+		self.contents[key] = subckt
+		self.subcircuits[subckt.name] = subckt
+		self.items.append(subckt)
+		return subckt
+
+	def __getitem__(self, name):
+		return self.subcircuits[name]
+
+	# The top-level circuit, which is the subcircuit added last.
+	@property
+	def top(self):
+		for item in reversed(self.items):
+			if isinstance(item, Subcircuit):
+				return item
+		return None
+
+	# Resolves a hierarchical instance path such as "XBA0.XS1" relative to a
+	# subcircuit, which defaults to the top-level circuit. Returns the list of
+	# instances along the path. The contents of external subcircuits are not
+	# known, so the path is only resolved up to the first external subcircuit.
+	def resolve(self, path, subckt=None):
+		subckt = subckt or self.top
+		insts = list()
+		for name in path.split("."):
+			if subckt is None:
+				raise KeyError("%s is not hierarchical" % ".".join(i.name for i in insts))
+			if subckt.external:
+				break
+			inst = subckt.instance(name)
+			insts.append(inst)
+			subckt = inst.cell
+		return insts
+
+	# Returns the leaf terminals connected to a net of a subcircuit, which
+	# defaults to the top-level circuit, as hierarchical "inst.pin" names.
+	# Nets connected to ports of generated subcircuits are followed into them.
+	def terminals(self, net, subckt=None, prefix=""):
+		subckt = subckt or self.top
+		result = list()
+		for (inst, pin) in subckt.connections(net):
+			if inst.cell is not None and not inst.cell.external:
+				result += self.terminals(pin, inst.cell, prefix+inst.name+".")
+			else:
+				result.append(prefix+inst.name+"."+pin)
+		return result
+
+
+# Writes the netlist in SPICE syntax.
+def write_spice(netlist, f):
+	for (n, item) in enumerate(netlist.items):
+		if n > 0:
+			f.write("\n\n")
+		if isinstance(item, Include):
+			f.write(item.text)
+			continue
+		f.write(".SUBCKT %s %s\n" % (item.name, " ".join(item.ports)))
+		for inst in item.instances:
+			f.write("%s %s %s\n" % (inst.name, " ".join(inst.nets), inst.cell.name if inst.cell is not None else "%g" % inst.value))
+		f.write(".ENDS")
+	f.write("\n")
+
+
+# Writes the netlist in native Spectre syntax. Included library text is kept in
+# SPICE syntax by switching the simulator language around it.
+def write_spectre(netlist, f):
+	f.write("simulator lang=spectre\n")
+	for item in netlist.items:
+		f.write("\n")
+		if isinstance(item, Include):
+			f.write("simulator lang=spice\n")
+			f.write(item.text)
+			if not item.text.endswith("\n"):
+				f.write("\n")
+			f.write("simulator lang=spectre\n")
+			continue
+		f.write("subckt %s %s\n" % (item.name, " ".join(item.ports)))
+		for inst in item.instances:
+			if inst.cell is not None:
+				f.write("%s (%s) %s\n" % (inst.name, " ".join(inst.nets), inst.cell.name))
+			else:
+				(device, param) = PRIMITIVES[inst.name[0].upper()]
+				f.write("%s (%s) %s %s=%g\n" % (inst.name, " ".join(inst.nets), device, param, inst.value))
+		f.write("ends %s\n" % item.name)
+
+
+# Writes the generated subcircuits of the netlist as structural Verilog modules.
+# The cells of included libraries are expected to be provided separately, and
+# primitive devices are omitted.
+def write_verilog(netlist, f):
+	first = True
+	for item in netlist.items:
+		if isinstance(item, Include):
+			continue
+		if not first:
+			f.write("\n")
+		first = False
+		f.write("module %s (%s);\n" % (item.name, ", ".join(item.ports)))
+		for port in item.ports:
+			f.write("\tinout %s;\n" % port)
+		ports = set(item.ports)
+		for net in item.nets():
+			if net not in ports:
+				f.write("\twire %s;\n" % net)
+		for inst in item.instances:
+			if inst.cell is None:
+				continue
+			if inst.cell.ports is not None:
+				conns = [".%s(%s)" % (p, n) for (p, n) in zip(inst.cell.ports, inst.nets)]
+			else:
+				conns = inst.nets
+			f.write("\t%s %s (%s);\n" % (inst.cell.name, inst.name, ", ".join(conns)))
+		f.write("endmodule\n")
@@ -5,9 +5,11 @@
 # be used by other parts of the generator to derive the placement of subcells
 # or the location of obstructions and pins.
 
-import sys, os, yaml
+import sys, os
+import potstill.cache, potstill.tech, potstill.macro
+from potstill.macro import default_name, array_suffix
+from array import array
 from bisect import bisect
-from functools import reduce
 
 
 class Vec():
@@ -19,6 +21,7 @@ class Vec():
 class Cell(object):
 	def __init__(self, name, config, suffix=None):
 		super(Cell, self).__init__()
+		self.kind = name
 		self.name = name + (suffix or "")
 		self.config = config
 		self.gds_struct = config["gds_struct"] + (suffix or "")
@@ -47,29 +50,35 @@ class InstPin(object):
 			config["anchor"][1] * self.inst.size.y
 		) if "anchor" in config else Vec(0,0)
 
-		# Calculate where the pin label should be positioned.
-		r = next(self.rects())
-		self.label_pos = Vec((r[0].x+r[1].x)*0.5, (r[0].y+r[1].y)*0.5)
-
-	def rects(self):
+	# Calculates the rectangles of the pin in the coordinate system of the
+	# instance, as a list of (x0, y0, x1, y1) tuples.
+	def local_rects(self):
+		rects = list()
 		if "geometry" in self.config:
+			ax = self.anchor.x
+			ay = self.anchor.y
 			for a in self.config["geometry"]:
-				yield (
-					self.inst.to_world(Vec(a[0]*1e-6 + self.anchor.x, a[1]*1e-6 + self.anchor.y)),
-					self.inst.to_world(Vec(a[2]*1e-6 + self.anchor.x, a[3]*1e-6 + self.anchor.y))
-				)
+				rects.append((a[0]*1e-6 + ax, a[1]*1e-6 + ay, a[2]*1e-6 + ax, a[3]*1e-6 + ay))
 
 		if self.additional_rects is not None:
 			for r in self.additional_rects:
-				yield (
-					self.inst.to_world(self.rect[0]),
-					self.inst.to_world(self.rect[1])
-				)
+				rects.append((r[0].x, r[0].y, r[1].x, r[1].y))
 
 		if self.track is not None:
-			a = Vec((self.track + 0.25) * self.inst.layout.grid, 0.05e-6)
-			b = Vec((self.track + 0.75) * self.inst.layout.grid, self.inst.size.y - 0.05e-6)
-			yield (self.inst.to_world(a), self.inst.to_world(b))
+			G = self.inst.layout.grid
+			rects.append(((self.track + 0.25) * G, 0.05e-6, (self.track + 0.75) * G, self.inst.size.y - 0.05e-6))
+
+		return rects
+
+	def rects(self):
+		for (x0, y0, x1, y1) in self.local_rects():
+			yield (self.inst.to_world(Vec(x0, y0)), self.inst.to_world(Vec(x1, y1)))
+
+	# The position of the pin label, which is the center of the first rect.
+	@property
+	def label_pos(self):
+		(a, b) = next(self.rects())
+		return Vec((a.x+b.x)*0.5, (a.y+b.y)*0.5)
 
 
 class Inst(object):
@@ -104,6 +113,211 @@ class Inst(object):
 					yield InstPin(name, cfg, self, index=self.index)
 
 
+# A table of the pin shapes of a layout. The rectangles of all pins are
+# gathered in flat arrays, with the rectangles of pin i occupying the range
+# [start[i], start[i+1]). The rectangles are transformed into the layout's
+# coordinate system in bulk, one instance at a time. The label position of each
+# pin is the center of its first rectangle.
+class PinTable(object):
+	def __init__(self, insts):
+		super(PinTable, self).__init__()
+		self.pins = list()
+		self.start = array("I")
+		self.x0 = array("d")
+		self.y0 = array("d")
+		self.x1 = array("d")
+		self.y1 = array("d")
+		self.label_x = array("d")
+		self.label_y = array("d")
+		for inst in insts:
+			self.add_inst(inst)
+		self.start.append(len(self.x0))
+
+	def add_inst(self, inst):
+		pins = list(inst.pins())
+		if len(pins) == 0:
+			return
+		local = [p.local_rects() for p in pins]
+		flat = [r for rs in local for r in rs]
+		px = inst.pos.x
+		py = inst.pos.y
+		sx = -1.0 if inst.mx else 1.0
+		sy = -1.0 if inst.my else 1.0
+		first = len(self.x0)
+		self.x0.extend([px + sx*r[0] for r in flat])
+		self.y0.extend([py + sy*r[1] for r in flat])
+		self.x1.extend([px + sx*r[2] for r in flat])
+		self.y1.extend([py + sy*r[3] for r in flat])
+		for (p, rs) in zip(pins, local):
+			self.pins.append(p)
+			self.start.append(first)
+			self.label_x.append((self.x0[first] + self.x1[first])*0.5)
+			self.label_y.append((self.y0[first] + self.y1[first])*0.5)
+			first += len(rs)
+
+	def __len__(self):
+		return len(self.pins)
+
+	# Returns the rectangles of pin i as a list of (x0, y0, x1, y1) tuples.
+	def rects(self, i):
+		r = range(self.start[i], self.start[i+1])
+		return [(self.x0[k], self.y0[k], self.x1[k], self.y1[k]) for k in r]
+
+
+# Generates the vertical offset and vertical mirroring of each element of a
+# stacked instance. Every other element is flipped such that the supply rails of
+# neighbouring rows line up, unless noflip is set.
+def stack_placement(stack, step, my, noflip):
+	dy = -step if my else step
+	for i in range(stack):
+		if noflip:
+			yield (i, i*dy, my)
+		else:
+			yield (i, i*dy + (i%2)*dy, (i%2==1) != my)
+
+
+# A columnar table of the instances in a layout. Rather than keeping one object
+# per placed cell, the table stores the placement information in flat arrays,
+# one entry per instance. Stacked instances occupy a single entry and are only
+# expanded into individual rows when the table is iterated over, which keeps
+# the memory footprint of large macros small.
+class InstTable(object):
+	def __init__(self):
+		super(InstTable, self).__init__()
+		self.cells = list()
+		self.cell_ids = dict()
+		self.names = list()
+		self.cell = array("H")
+		self.x = array("d")
+		self.y = array("d")
+		self.mx = array("B")
+		self.my = array("B")
+		self.stack = array("I")
+		self.stack_step = array("d")
+		self.stack_noflip = array("B")
+		self.w = array("d")
+		self.h = array("d")
+		self.groups = list()
+
+	def __len__(self):
+		return len(self.names)
+
+	def cell_id(self, cell):
+		key = cell.gds_struct
+		if key not in self.cell_ids:
+			self.cell_ids[key] = len(self.cells)
+			self.cells.append(cell)
+		return self.cell_ids[key]
+
+	def add(self, inst):
+		self.names.append(inst.name)
+		self.cell.append(self.cell_id(inst.cell))
+		self.x.append(inst.pos.x)
+		self.y.append(inst.pos.y)
+		self.mx.append(inst.mx)
+		self.my.append(inst.my)
+		self.stack.append(inst.stack or 0)
+		self.stack_step.append(inst.stack_step or 0)
+		self.stack_noflip.append(inst.stack_noflip)
+		self.w.append(inst.size.x if inst.size is not None else 0)
+		self.h.append(inst.stack_step if inst.stack else inst.size.y if inst.size is not None else 0)
+		return len(self.names)-1
+
+	# Adds a named group of instances to the table. The groups keep track of the
+	# order in which the instances were added, such that output writers can
+	# emit them in sections.
+	def add_group(self, title, insts):
+		start = len(self.names)
+		for inst in insts:
+			self.add(inst)
+		self.groups.append((title, start, len(self.names)))
+
+	# Number of cells placed by the instances in the table, with stacks expanded.
+	def num_placed(self):
+		return sum(s or 1 for s in self.stack)
+
+	# Generates a (index, name, cell id, x, y, mx, my) tuple for every cell
+	# placed by the instances in the range [start,end), expanding stacks into
+	# individual rows. The index refers to the table entry the cell belongs to.
+	def expand(self, start=0, end=None):
+		if end is None:
+			end = len(self.names)
+		names, cell, X, Y, MX, MY = self.names, self.cell, self.x, self.y, self.mx, self.my
+		stack, stack_step, stack_noflip = self.stack, self.stack_step, self.stack_noflip
+		for i in range(start, end):
+			if stack[i] == 0:
+				yield (i, names[i], cell[i], X[i], Y[i], MX[i], MY[i])
+			else:
+				name = names[i]
+				for (k, dy, my) in stack_placement(stack[i], stack_step[i], MY[i], stack_noflip[i]):
+					yield (i, "%s%d" % (name, k), cell[i], X[i], Y[i]+dy, MX[i], my)
+
+	# Generates a (index, name, cell id, x0, y0, x1, y1) tuple with the bounding
+	# box of every cell placed by the instances in the range [start,end). Cells
+	# whose size is not known, such as the wiring, have an empty bounding box
+	# at their origin.
+	def boxes(self, start=0, end=None):
+		W, H = self.w, self.h
+		for (i, name, cell, x, y, mx, my) in self.expand(start, end):
+			x0 = x - W[i] if mx else x
+			y0 = y - H[i] if my else y
+			yield (i, name, cell, x0, y0, x0 + W[i], y0 + H[i])
+
+
+# Calculates the placement of num_welltaps welltaps evenly distributed across
+# the macro. Each welltap is inserted before the column to the left of its
+# approximate position. Returns a list of (index, x) tuples, where index is the
+# column before which the welltap is inserted and x the position of that
+# column.
+def uniform_welltaps(colpos, width, num_welltaps):
+	placement = list()
+	for i in range(num_welltaps):
+		k = bisect(colpos, width * i / (num_welltaps-1))
+		placement.append((k, colpos[k] if k < len(colpos) else width))
+	return placement
+
+
+# Calculates the maximum spacing between two neighbouring welltaps.
+def max_welltap_spacing(placement, welltap_width):
+	return max(
+		b - a + welltap_width
+		for ((_,a),(_,b)) in zip(placement[:-1], placement[1:])
+	)
+
+
+# Calculates the placement with the fewest welltaps that satisfies the welltap
+# cadence, by sweeping across the columns once and always inserting the next
+# welltap before the rightmost column that is still within reach of the
+# previous welltap. Returns a list of (index, x) tuples as uniform_welltaps.
+def greedy_welltaps(colpos, width, welltap_width, welltap_cadence):
+	bounds = list(colpos) + [width]
+	placement = [(0, bounds[0])]
+	k = 0
+	while k < len(bounds)-1:
+		j = k
+		while j+1 < len(bounds) and bounds[j+1] - bounds[k] + welltap_width <= welltap_cadence:
+			j += 1
+		if j == k:
+			raise ValueError("column %d is too wide to satisfy the welltap cadence of %g" % (k, welltap_cadence))
+		k = j
+		placement.append((k, bounds[k]))
+	return placement
+
+
+# Determines where welltaps need to be inserted among the given columns such
+# that no two neighbouring welltaps are further apart than the welltap cadence.
+# The greedy sweep yields the minimal number of welltaps; if distributing that
+# many welltaps evenly across the macro satisfies the cadence as well, the even
+# distribution is preferred.
+def place_welltaps(colpos, width, welltap_width, welltap_cadence):
+	greedy = greedy_welltaps(colpos, width, welltap_width, welltap_cadence)
+	uniform = uniform_welltaps(colpos, width, len(greedy))
+	if max_welltap_spacing(uniform, welltap_width) <= welltap_cadence:
+		return uniform
+	else:
+		return greedy
+
+
 def layout_columns(columns):
 	x = 0
 	for col in columns:
@@ -120,10 +334,13 @@ class Layout(object):
 		self.num_addr = macro.num_addr
 		self.num_bits = macro.num_bits
 		self.num_words = 2**self.num_addr
-		self.name = "PS%dX%d" % (self.num_words, self.num_bits)
+		self.num_banks = macro.num_banks
+		self.words_per_bank = self.num_words // self.num_banks
+		self.words_per_row = macro.words_per_row
+		self.rows_per_bank = self.words_per_bank // self.words_per_row
+		self.name = default_name(self.num_words, self.num_bits, self.num_banks, self.words_per_row)
 		self.wiring = list()
-		with open(macro.techdir+"/config.yml") as f:
-			self.config = yaml.load(f)
+		self.config = potstill.tech.load(macro.techdir).config
 
 		# Calculate the number of bits and address bits that go to the left and
 		# right of the central spine.
@@ -132,11 +349,30 @@ class Layout(object):
 		self.num_addr_left  = int(self.num_addr/2)
 		self.num_addr_right = self.num_addr - self.num_addr_left
 
+		# The words are split into banks which are stacked on top of each other.
+		# Every other bank is mirrored vertically, such that the write data rows
+		# of two neighbouring banks face each other. Each bank has its own slice
+		# of the address decoder and bit arrays. Folded macros place multiple
+		# words side by side in each row, such that each bit array holds one
+		# sub-array per word of a row. The cells are looked up in the technology
+		# with the number of words and the array suffix, e.g. "bitarray128B2"
+		# or "bitarray128F4". The rows of the macro are the word rows and the
+		# write data row of each bank, and the read address register row on top.
+		#
+		# Banked layouts are a placement-only preview: no read data merge or
+		# write data and address distribution cells are placed between the
+		# banks, and the pins are those of the first bank. Their LEF and GDS
+		# therefore do not match the netlist's per-bank sub-arrays, and make
+		# does not offer banking.
+		suffix = array_suffix(self.num_banks, self.words_per_row)
+		self.array_key = "%d%s" % (self.num_words, suffix) if suffix else self.num_words
+		self.num_rows = self.num_banks * (self.rows_per_bank+1) + 1
+
 		# Load the cell descriptions.
 		cells = self.config["cells"]
 		self.rwckg_cell = Cell("rwckg", cells["rwckg"])
-		self.addrdec_cell = Cell("addrdec", cells["addrdec"], suffix=str(self.num_words))
-		self.bitarray_cell = Cell("bitarray", cells["bitarray"], suffix=str(self.num_words))
+		self.addrdec_cell = Cell("addrdec", cells["addrdec"], suffix=str(self.array_key))
+		self.bitarray_cell = Cell("bitarray", cells["bitarray"], suffix=str(self.array_key))
 		self.rareg_cell = Cell("rareg", cells["rareg"])
 		self.rareg_vwire_cells = [
 			Cell("raregwire", cells["raregwire"], suffix=str(i+1))
@@ -157,16 +393,21 @@ class Layout(object):
 		self.row_height_trk = self.config["row-height"]
 		self.row_height = self.row_height_trk*G
 
-		self.regwd_y_trk = self.num_words * self.row_height_trk
-		self.column_width_trk = self.config["widths"]["bitarray"]
-		self.addrdec_width_trk = self.config["widths"]["addrdec"][self.num_words]
+		self.subcolumn_width_trk = self.config["widths"]["bitarray"]
+		self.column_width_trk = self.subcolumn_width_trk * self.words_per_row
+		try:
+			self.addrdec_width_trk = self.config["widths"]["addrdec"][self.array_key]
+		except KeyError:
+			raise KeyError("technology has no address decoder width for %s words; add %s to widths.addrdec in config.yml" % (self.array_key, self.array_key))
 		self.column_right_trk = self.num_bits_left * self.column_width_trk + self.addrdec_width_trk
 		bit_width = self.column_width_trk*G
 		rwckg_width = self.config["widths"]["rwckg"]*G
 		addrdec_width = self.addrdec_width_trk*G
 		rareg_width = self.config["widths"]["rareg"]*G
-		bitarray_size = Vec(bit_width, self.num_words * self.row_height)
-		column_height = (self.num_words+1)*self.row_height
+		subcolumn_width = self.subcolumn_width_trk*G
+		bitarray_size = Vec(bit_width, self.rows_per_bank * self.row_height)
+		column_height = (self.rows_per_bank+1)*self.row_height
+		banks_height = self.num_banks * column_height
 		welltap_width = float(self.welltap_cell.config["width"])
 		welltap_cadence = float(self.welltap_cell.config["cadence"])
 
@@ -174,17 +415,35 @@ class Layout(object):
 		self.supply_layer_gds = self.config["supply_layer_gds"]
 		self.supply_tracks = [
 			("VSS" if y%2 == 0 else "VDD", y*self.row_height)
-			for y in range(self.num_words+3)
+			for y in range(self.num_rows+1)
+		]
+
+		# Calculate the origin of each bank, in tracks. Mirrored banks have
+		# their origin at the top, such that a track t within the bank lies at
+		# y_trk - t rather than y_trk + t.
+		self.bank_origins = [
+			((b+1 if b%2 == 1 else b) * (self.rows_per_bank+1) * self.row_height_trk, b%2 == 1)
+			for b in range(self.num_banks)
 		]
+		self.regwd_trk = self.rows_per_bank * self.row_height_trk
 
 		# Assemble the columns of the memory, which consist of bit arrays,
 		# welltaps, and the address decoder.
 
-		# Lower and upper bits.
+		# Lower and upper bits. In a banked layout, the columns below are the
+		# ones of the first bank, which are replicated for the other banks once
+		# their horizontal position is known.
+		if self.num_banks == 1:
+			bitarray_name = lambda i, b: "XBA%d" % i
+			addrdec_name = lambda b: "XAD"
+		else:
+			bitarray_name = lambda i, b: "XBA%dS%d" % (i, b)
+			addrdec_name = lambda b: "XAD%d" % b
+
 		lower_bits = [
 			Inst(
 				self, self.bitarray_cell,
-				"XBA%d" % i,
+				bitarray_name(i, 0),
 				Vec(0, 0),
 				mx=True,
 				index=i,
@@ -195,7 +454,7 @@ class Layout(object):
 		upper_bits = [
 			Inst(
 				self, self.bitarray_cell,
-				"XBA%d" % (i + self.num_bits_left),
+				bitarray_name(i + self.num_bits_left, 0),
 				Vec(0, 0),
 				index=i + self.num_bits_left,
 				size=bitarray_size
@@ -206,10 +465,10 @@ class Layout(object):
 
 		# Address Decoder
 		self.addrdec = Inst(
-			self, self.addrdec_cell, "XAD",
+			self, self.addrdec_cell, addrdec_name(0),
 			# Vec(x_addrdec, 0),
 			Vec(0, 0),
-			index=self.num_words,
+			index=self.array_key,
 			size=Vec(addrdec_width, column_height)
 		)
 
@@ -218,43 +477,12 @@ class Layout(object):
 
 		# Determine a reasonable distribution for the welltaps.
 		width = layout_columns(columns)
-		num_welltaps = int(width/(welltap_cadence - welltap_width)) + 2
-		max_spacing = None
-		welltap_placement = None
-
-		while welltap_placement is None or max_spacing > welltap_cadence:
-
-			# Calculate the approximate position for each welltap.
-			approx_welltap_positions = [
-				width * i / (num_welltaps-1) for i in range(num_welltaps)
-			]
-
-			# Calculate the index of the column before which each welltap should
-			# be inserted. This positions each welltap to the left of each
-			# approximate positions.
-			colpos = [col.pos.x for col in columns]
-			welltap_indices = [
-				max(0, min(len(columns), bisect(colpos, x)))
-				for x in approx_welltap_positions
-			]
-
-			# Extract the position the welltaps would have if placed at the
-			# indices found above.
-			welltap_placement = [
-				(i, columns[i].pos.x if i < len(columns) else width)
-				for i in welltap_indices
-			]
-
-			# Calculate the maximum spacing between two neighbouring welltaps.
-			max_spacing = reduce(max, [
-				b - a + welltap_width
-				for ((_,a),(_,b)) in zip(welltap_placement[:-1], welltap_placement[1:])
-			])
-
-			# Increase the number of welltaps. If the max_spacing calculated
-			# above is greater than the required welltap cadence, the loop body
-			# is re-executed with one more welltap.
-			num_welltaps += 1
+		welltap_placement = place_welltaps(
+			[col.pos.x for col in columns],
+			width,
+			welltap_width,
+			welltap_cadence
+		)
 
 
 		# Insert the welltaps and the required wiring on top of them.
@@ -262,7 +490,7 @@ class Layout(object):
 		for (i, (offset, _)) in enumerate(reversed(welltap_placement)):
 			wt = Inst(self, self.welltap_cell, "WT%d" % i, Vec(0,0),
 				size=Vec(welltap_width, column_height),
-				stack=self.num_words+2,
+				stack=self.num_rows,
 				stack_step=self.row_height
 			)
 			self.welltaps.append(wt)
@@ -273,41 +501,74 @@ class Layout(object):
 		# macro.
 		self.size = Vec(
 			layout_columns(columns),
-			(self.num_words+2) * self.row_height
+			banks_height + self.row_height
 		)
 
 
-		# Add the wiring to the welltaps.
+		# Replicate the bit arrays and address decoder for the remaining banks.
+		self.banks = [(self.bitarrays, self.addrdec)]
+		for b in range(1, self.num_banks):
+			my = self.bank_origins[b][1]
+			y = (b+1 if my else b) * column_height
+			self.banks.append((
+				[
+					Inst(
+						self, self.bitarray_cell,
+						bitarray_name(ba.index, b),
+						Vec(ba.pos.x, y),
+						mx=ba.mx,
+						my=my,
+						index=ba.index,
+						size=bitarray_size
+					)
+					for ba in self.bitarrays
+				],
+				Inst(
+					self, self.addrdec_cell, addrdec_name(b),
+					Vec(self.addrdec.pos.x, y),
+					my=my,
+					index=self.array_key,
+					size=self.addrdec.size
+				)
+			))
+
+
+		# Add the wiring to the welltaps, mirrored along with the banks.
 		for wt in self.welltaps[1:-1]:
 			flip = wt.pos.x < self.addrdec.pos.x + 0.5*addrdec_width
-			self.wiring.append(Inst(
-				self, self.welltap_awire_cell, wt.name+"WA",
-				Vec(wt.pos.x + welltap_width if flip else wt.pos.x, wt.pos.y),
-				stack=self.num_words,
-				stack_step=self.row_height,
-				mx=flip
-			))
-			self.wiring.append(Inst(
-				self, self.welltap_bwire_cell, wt.name+"WB",
-				Vec(
-					wt.pos.x + welltap_width if flip else wt.pos.x,
-					wt.pos.y + self.num_words * self.row_height
-				),
-				mx=flip
-			))
+			x = wt.pos.x + welltap_width if flip else wt.pos.x
+			for b in range(self.num_banks):
+				my = self.bank_origins[b][1]
+				y = wt.pos.y + (b+1 if my else b) * column_height
+				dy = -self.row_height if my else self.row_height
+				name = wt.name if b == 0 else "%sB%d" % (wt.name, b)
+				self.wiring.append(Inst(
+					self, self.welltap_awire_cell, name+"WA",
+					Vec(x, y),
+					stack=self.rows_per_bank,
+					stack_step=self.row_height,
+					mx=flip,
+					my=my
+				))
+				self.wiring.append(Inst(
+					self, self.welltap_bwire_cell, name+"WB",
+					Vec(x, y + self.rows_per_bank * dy),
+					mx=flip,
+					my=my
+				))
 
 		# Add the power routing ontop of the welltaps.
 		for wt in self.welltaps:
 			self.wiring.append(Inst(
 				self, self.welltap_pwr_inner_cell, wt.name+"WPI",
 				wt.pos,
-				stack=self.num_words+2,
+				stack=self.num_rows,
 				stack_step=self.row_height
 			))
 			self.wiring.append(Inst(
 				self, self.welltap_pwr_outer_cell, wt.name+"WPO",
 				Vec(wt.pos.x, wt.pos.y+self.row_height),
-				stack=self.num_words+1,
+				stack=self.num_rows-1,
 				stack_step=self.row_height,
 				stack_noflip=True
 			))
@@ -320,13 +581,15 @@ class Layout(object):
 
 		# Global Clock Gate
 		rwckg_x = x_spine_r - rwckg_width
-		rwckg_y = self.num_words * self.row_height
-		self.rwckg = Inst(self, self.rwckg_cell, "XRWCKG", Vec(rwckg_x, rwckg_y))
+		rwckg_y = self.rows_per_bank * self.row_height
+		self.rwckg = Inst(self, self.rwckg_cell, "XRWCKG", Vec(rwckg_x, rwckg_y),
+			size=Vec(rwckg_width, self.row_height)
+		)
 
 		# Read Address Registers
 		x_ralower = x_spine_l - (self.num_addr_left) * rareg_width
 		x_raupper = x_spine_r
-		y_rareg = (self.num_words+2) * self.row_height
+		y_rareg = banks_height + self.row_height
 
 		self.raregs = [
 			Inst(
@@ -336,6 +599,7 @@ class Layout(object):
 				index=i,
 				mx=True,
 				my=True,
+				size=Vec(rareg_width, self.row_height),
 				data = {
 					"ytrack": self.num_addr_left - i - 1,
 					"ymax": self.num_addr_left
@@ -349,6 +613,7 @@ class Layout(object):
 				Vec(self.bitarrays[self.num_bits_left+i].pos.x, y_rareg),
 				index=(i + self.num_addr_left),
 				my=True,
+				size=Vec(rareg_width, self.row_height),
 				data = {
 					"ytrack": i,
 					"ymax": self.num_addr_right
@@ -358,7 +623,7 @@ class Layout(object):
 		]
 
 		# Wire up the RAREGs.
-		y_raregwire = (self.num_words+1) * self.row_height
+		y_raregwire = banks_height
 		for ra in self.raregs:
 			# Vertical breakout.
 			self.wiring.append(Inst(
@@ -388,7 +653,7 @@ class Layout(object):
 					self, self.welltap_bwire_cell, wt.name+"WB",
 					Vec(
 						x,
-						wt.pos.y + (self.num_words+2) * self.row_height
+						wt.pos.y + self.num_rows * self.row_height
 					),
 					mx=flip,
 					my=True
@@ -415,29 +680,73 @@ class Layout(object):
 
 
 
-		# Add the filler cells in the top row.
+		# Add the filler cells in the top row. Folded columns receive one filler
+		# per word of a row, except where a read address register sits.
 		self.fillers = list()
 		for ba in self.bitarrays:
-			if ba.pos.x < self.raregs[0].pos.x - 0.5*bit_width or ba.pos.x > self.raregs[-1].pos.x + 0.5*bit_width:
+			has_rareg = not (ba.pos.x < self.raregs[0].pos.x - 0.5*bit_width or ba.pos.x > self.raregs[-1].pos.x + 0.5*bit_width)
+			for k in range(1 if has_rareg else 0, self.words_per_row):
+				dx = k*subcolumn_width
 				self.fillers.append(Inst(
-					self, self.filler_cell, ba.name+"FILL",
+					self, self.filler_cell, ba.name+"FILL"+(str(k) if k > 0 else ""),
 					Vec(
-						ba.pos.x,
-						(self.num_words+2) * self.row_height
+						ba.pos.x - dx if ba.mx else ba.pos.x + dx,
+						banks_height + self.row_height
 					),
 					mx=ba.mx,
-					my=True
+					my=True,
+					size=Vec(subcolumn_width, self.row_height)
 				))
 
 
+		# Gather all instances in a compact table that output writers can
+		# iterate over efficiently.
+		self.insts = InstTable()
+		self.insts.add_group("Bit Arrays", [ba for (bas, _) in self.banks for ba in bas])
+		self.insts.add_group("Address Decoder", [ad for (_, ad) in self.banks])
+		self.insts.add_group("Global Clock Gate", [self.rwckg])
+		self.insts.add_group("Read Address Registers", self.raregs)
+		self.insts.add_group("Welltaps", self.welltaps)
+		self.insts.add_group("Wiring", self.wiring)
+		self.insts.add_group("Fillers", self.fillers)
+
+		# Calculate the pin geometry once, such that the output writers do
+		# not have to transform the pin shapes individually. The pins are
+		# taken from the first bank, see the note on banked layouts above.
+		self.pin_table = PinTable([self.rwckg, self.addrdec] + self.raregs + self.bitarrays)
+
+
 	def pins(self):
-		for p in self.rwckg.pins():
-			yield p
-		for p in self.addrdec.pins():
-			yield p
-		for reg in self.raregs:
-			for p in reg.pins():
-				yield p
-		for b in self.bitarrays:
-			for p in b.pins():
-				yield p
+		return iter(self.pin_table.pins)
+
+	# Converts a track within bank b to a track of the macro.
+	def bank_track(self, b, t):
+		(y_trk, my) = self.bank_origins[b]
+		return y_trk - t if my else y_trk + t
+
+
+# The modules whose source determines the layout of a macro: this file, the
+# naming and validation of macros, and the interpretation of the technology
+# configuration.
+LAYOUT_SOURCES = [__file__, potstill.macro.__file__, potstill.tech.__file__]
+
+
+# Returns the layout for the given macro. Layouts are cached on disk, keyed by
+# the macro size, the contents of the technology configuration, and the source
+# of the modules in LAYOUT_SOURCES, such that subsequent invocations for the
+# same macro can skip the layout calculation.
+def load_layout(macro):
+	key = potstill.cache.make_key(
+		macro.num_addr,
+		macro.num_bits,
+		macro.num_banks,
+		macro.words_per_row,
+		potstill.tech.load(macro.techdir).digest,
+		*[potstill.cache.file_digest(f) for f in LAYOUT_SOURCES]
+	)
+	layout = potstill.cache.load("layout", key)
+	if layout is None:
+		layout = Layout(macro)
+		potstill.cache.store("layout", key, layout)
+	layout.macro = macro
+	return layout
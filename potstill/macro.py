@@ -2,15 +2,49 @@
 
 import os
 
+
+# Returns the suffix that distinguishes the arrangement of the words of a macro
+# from the plain single column, e.g. "B2" for two banks or "F4" for four words
+# per row. The suffix is empty for the plain arrangement.
+def array_suffix(num_banks=1, words_per_row=1):
+	suffix = ""
+	if num_banks > 1:
+		suffix += "B%d" % num_banks
+	if words_per_row > 1:
+		suffix += "F%d" % words_per_row
+	return suffix
+
+
+# Returns the default name of a macro of the given size. Banked and folded
+# macros carry the array suffix, such that they do not collide with the plain
+# macro of the same size.
+def default_name(num_words, num_bits, num_banks=1, words_per_row=1):
+	return "PS%dX%d%s" % (num_words, num_bits, array_suffix(num_banks, words_per_row))
+
+
 class Macro(object):
-	def __init__(self, num_addr, num_bits, vdd=1.2, temp=25, name=None):
+	def __init__(self, num_addr, num_bits, vdd=1.2, temp=25, name=None, num_banks=1, words_per_row=1, predecode=False, mux_radix=2):
 		super(Macro, self).__init__()
 		self.num_addr = num_addr
 		self.num_bits = num_bits
 		self.vdd = vdd
 		self.temp = temp
 		self.num_words = 2**num_addr
-		self.name = name or ("PS%dX%d" % (2**num_addr, num_bits))
+		self.num_banks = num_banks
+		if num_banks < 1 or num_banks & (num_banks-1) or num_banks > self.num_words//2:
+			raise ValueError("number of banks must be a power of two no larger than %d, got %d" % (self.num_words//2, num_banks))
+		self.words_per_row = words_per_row
+		if words_per_row < 1 or words_per_row & (words_per_row-1) or words_per_row > 8:
+			raise ValueError("number of words per row must be 1, 2, 4, or 8, got %d" % words_per_row)
+		if num_banks * words_per_row > self.num_words//2:
+			raise ValueError("%d banks with %d words per row leave less than two rows per bank" % (num_banks, words_per_row))
+		self.predecode = predecode
+		if predecode and num_addr < 4:
+			raise ValueError("predecoding requires at least 4 address bits, got %d" % num_addr)
+		self.mux_radix = mux_radix
+		if mux_radix not in [2, 4]:
+			raise ValueError("read mux radix must be 2 or 4, got %d" % mux_radix)
+		self.name = name or default_name(self.num_words, num_bits, num_banks, words_per_row)
 		self.techdir = os.path.dirname(__file__)+"/../umc65"
 
 class MacroConditions(Macro):
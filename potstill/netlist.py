@@ -1,194 +1,414 @@
 # Copyright (c) 2016 Fabian Schuiki
-import os
+import os, io, functools
+import potstill.tech
+from potstill.macro import default_name, array_suffix
+from potstill.circuit import Netlist, Subcircuit, Include, write_spice
 
 BASE = os.path.dirname(__file__)+"/.."
 
-def generate(size, bits):
-	lines = list()
-	lines.append(".SUBCKT PS%dX%d CK RE %s %s WE %s %s VDD VSS" % (
-		2**size, bits,
-		" ".join(["RA%d" % i for i in reversed(range(size))]),
-		" ".join(["RD%d" % i for i in reversed(range(bits))]),
-		" ".join(["WA%d" % i for i in reversed(range(size))]),
-		" ".join(["WD%d" % i for i in reversed(range(bits))]),
-	))
-
-	netsRA = " ".join(["nRA%d" % i for i in range(size)])
-	netsWA = " ".join(["WA%d" % i for i in range(size)])
-	netsSGPGN = " ".join(["nS%d nGP%d nGN%d" % (i,i,i) for i in range(2**size)])
-
-	# Add the root clock gates.
-	lines.append("XRWCKG RE WE CK nRCKP nRCKN nWCKP nWCKN VDD VSS PSRWCKG")
-
-	# Instantiate the address decoder.
-	lines.append("XAD nWCKP nWCKN %s %s %s VDD VSS PSAD%d" % (
-		netsRA, netsWA, netsSGPGN, 2**size
-	))
-
-	# Instantiate the write data registers.
-	for i in range(bits):
-		lines.append("XWDREG%d WD%d nWCKP nWCKN nWD%d iw%d VDD VSS PSREG" % (
-			i, i, i, i
-		))
-
-	# Instantiate the read address registers.
-	for i in range(size):
-		lines.append("XRAREG%d RA%d nRCKP nRCKN nRA%d ir%d VDD VSS PSREG" % (
-			i, i, i, i
-		))
-
-	# Instantiate the bit arrays.
-	for i in range(bits):
-		lines.append("XBA%d nWD%d %s RD%d VDD VSS PSBA%d" % (
-			i, i, netsSGPGN, i, 2**size
-		))
-
-	lines.append(".ENDS")
-
-	with open("%s/umc65/netlists/components.cir" % BASE, "r") as f:
-		netlistPrefix = f.read()
-
-	return "\n\n".join([
-		netlistPrefix,
-		generateAD(size),
-		generateBA(size),
-		"\n".join(lines)+"\n"
-	])
-
-
-# Generate the netlist for a bit array.
-def generateBA(size):
-	lines = list()
-	lines.append(".SUBCKT PSBA%d D %s Q VDD VSS" % (
-		2**size,
-		" ".join(["S%d GP%d GN%d" % (i,i,i) for i in range(2**size)])
-	))
-	for i in range(2**size):
-		lines.append("X%d D GP%d GN%d S%d nL0Q%d VDD VSS PSBA1" % (
-			i, i, i, i, i
-		))
-	if size % 2 == 0:
-		outName = "nQ"
-		lines.append("XINV nQ Q VDD VSS PSRMINV")
+# Generates the netlist of a macro in SPICE syntax. In a banked macro, each bank
+# has its own slice of the address decoder. In banked and folded macros, each
+# bit array is split into sub-arrays, one per bank and word of a row, whose read
+# muxes are combined by the remaining levels of the read mux tree. The macro is
+# logically equivalent to the plain one.
+#
+# If loads is given, a reduced netlist for characterization is generated
+# instead, see NetlistLibrary.build. If predecode is set, the address decoders
+# predecode groups of address bits, see NetlistLibrary.predecoded_decoder. The
+# radix selects the number of inputs of the read mux stages, see
+# read_mux_stages.
+def generate(size, bits, banks=1, fold=1, loads=None, predecode=False, radix=2):
+	f = io.StringIO()
+	write(f, size, bits, banks, fold, loads, predecode, radix)
+	return f.getvalue()
+
+
+# Writes the netlist of a macro to the file object f, as generated by generate.
+# The netlist is written piece by piece rather than assembled in memory first.
+def write(f, size, bits, banks=1, fold=1, loads=None, predecode=False, radix=2):
+	write_spice(build(size, bits, banks, fold, loads, predecode, radix), f)
+
+
+# Builds the netlist of a macro as a potstill.circuit.Netlist.
+def build(size, bits, banks=1, fold=1, loads=None, predecode=False, radix=2):
+	return library.build(size, bits, banks, fold, loads, predecode, radix)
+
+
+# Returns the number of address bits resolved by each stage of a read mux tree
+# over 2**size words. With radix 2, every stage is a 2:1 mux. With radix 4, the
+# tree consists of 4:1 stages, followed by a 2:1 stage if size is odd.
+def read_mux_stages(size, radix=2):
+	if radix == 2:
+		return [1]*size
+	elif radix == 4:
+		return [2]*(size//2) + [1]*(size%2)
 	else:
-		outName = "nQ"
-		lines.append("XBUF nQ Q VDD VSS PSRMBUF")
-	for i in range(size):
-		for n in range(2**(size-i-1)):
-			lines.append("XL%dQ%d nL%dQ%d nL%dQ%d %s VDD VSS %s" % (
-				i+1, n,
-				i, n*2+0,
-				i, n*2+1,
-				("nL%dQ%d" % (i+1, n)) if i < size-1 else outName,
-				"PSRMND" if i % 2 == 0 else "PSRMNR"
-			))
-	lines.append(".ENDS")
-	return "\n".join(lines)
-
-
-# Generate the netlist for an address decoder.
-def generateAD(size):
-	lines = list()
-	lines.append(".SUBCKT PSAD%d CKP CKN %s %s %s VDD VSS" % (2**size,
-		" ".join(["RA%d" % i for i in range(size)]),
-		" ".join(["WA%d" % i for i in range(size)]),
-		" ".join(["S%d GP%d GN%d" % (i,i,i) for i in range(2**size)])
-	))
-
-	# Instantiate the clock gates that generate the WWL.
-	for i in range(2**size):
-		lines.append("XCKG%d nWE%d CKP CKN GP%d GN%d VDD VSS PSADCKG " % (
-			i, i, i, i,
-		))
-
-	# Instantiate the one-hot decoder for the read and write address.
-	lines.append("XRAD %s %s VDD VSS PSADOH%d" % (
-		" ".join(["RA%d" % i for i in range(size)]),
-		" ".join(["S%d"  % i for i in range(2**size)]),
-		2**size
-	))
-	lines.append("XWAD %s %s VDD VSS PSADOH%d" % (
-		" ".join(["WA%d"  % i for i in range(size)]),
-		" ".join(["nWE%d" % i for i in range(2**size)]),
-		2**size
-	))
-
-	lines.append(".ENDS")
-	return generateADOH(size) + "\n\n" + "\n".join(lines)
-
-
-# Generate the netlist for the one-hot decoder used in address decoders.
-def generateADOH(size):
-	lines = list()
-	with open(BASE+"/umc65/netlists/PSADOH.cir") as f:
-		lines.append(f.read())
-
-	lines.append(".SUBCKT PSADOH%d %s %s VDD VSS" % (2**size,
-		" ".join(["A%d" % i for i in range(size)]),
-		" ".join(["Z%d" % i for i in range(2**size)])
-	))
-	N = 0
-	for i in range(size):
-		lines.append("XI%d A%d N%d VDD VSS PSADINV" % (N, i, i))
-		N += 1
-	N = 0
-	actHiInputs = (size > 3)
-	flipped_lines = set()
-	for i in range(2**size):
-		lines.append("X%d %s Z%d VDD VSS PSADOH%dR" % (N,
-			" ".join([("A%d" if (i if actHiInputs and n != 6 else ~i) & (1 << n) else "N%d") % n for n in range(size)]),
-			i,
-			2**size
-		))
-		N += 1
-	lines.append(".ENDS")
-	return "\n".join(lines)
-
-# class Netlist(object):
-# 	def __init__(self):
-# 		super(Netlist, self).__init__()
-# 		self.circuits = dict()
-
-# 	def make(name, *args,):
-# 		if name is in self.circuits:
-# 			return self.circuits[name]
-# 		else:
-# 			funcName = "generateNetlistFor"
-# 			subckt = globals()
-
-# class NetlistSubcircuit(object):
-# 	def __init__(self):
-# 		super(NetlistSubcircuit, self).__init__()
-
-
-def generateMacro(macro):
-	return generate(macro.num_addr, macro.num_bits)
-
-
-# class AdohNetlist(object):
-# 	def __init__(self):
-# 		super(AdohNetlist, self).__init__()
-
-# 		lines = list()
-# 		with open("%s/umc65/netlists/PSADOH%dR.cir" % (BASE, 2**size), "r") as f:
-# 			lines.append(f.read())
-
-# 		lines.append(".SUBCKT PSADOH%d %s %s VDD VSS" % (2**size,
-# 			" ".join(["A%d" % i for i in range(size)]),
-# 			" ".join(["Z%d" % i for i in range(2**size)])
-# 		))
-# 		N = 0
-# 		for i in range(size):
-# 			lines.append("XI%d A%d N%d VDD VSS PSADINV" % (N, i, i))
-# 			N += 1
-# 		N = 0
-# 		actHiInputs = (size > 3)
-# 		for i in range(2**size):
-# 			lines.append("X%d %s Z%d VDD VSS PSADOH%dR" % (N,
-# 				" ".join([("A%d" if (i if actHiInputs else ~i) & (1 << n) else "N%d") % n for n in range(size)]),
-# 				i,
-# 				2**size
-# 			))
-# 			N += 1
-# 		lines.append(".ENDS")
-# 		return "\n".join(lines)
+		raise ValueError("read mux radix must be 2 or 4, got %d" % radix)
+
+
+# Returns the suffix that distinguishes the bit arrays of a read mux radix other
+# than 2, e.g. "M4".
+def radix_suffix(radix):
+	return "M%d" % radix if radix != 2 else ""
+
+
+# Returns the groups of address bits that are predecoded separately, as a list
+# of (first bit, number of bits) pairs. The address is split into as few groups
+# of two and three bits as possible, the larger groups taking the lower bits.
+def predecode_groups(size):
+	if size < 4:
+		raise ValueError("predecoding requires at least 4 address bits, got %d" % size)
+	num_groups = (size+2) // 3
+	num_large = size - 2*num_groups
+	groups = list()
+	first = 0
+	for g in range(num_groups):
+		n = 3 if g < num_large else 2
+		groups.append((first, n))
+		first += n
+	return groups
+
+
+# Returns the loads a bit cell presents to the nets it connects to, as given by
+# the bitcell-loads section of the technology configuration. The capacitances
+# on the D, S, GP, and GN inputs are in farads, and Q-tie is the resistance in
+# ohms that holds the output of a lumped bit column at a defined level.
+def bitcell_loads(techdir):
+	config = potstill.tech.load(techdir).config
+	if "bitcell-loads" not in config:
+		raise ValueError("%s/config.yml: reduced netlists require a bitcell-loads section" % techdir)
+	loads = dict()
+	for k in ["D", "S", "GP", "GN", "Q-tie"]:
+		if k not in config["bitcell-loads"]:
+			raise ValueError("%s/config.yml: missing %s in bitcell-loads" % (techdir, k))
+		loads[k] = float(config["bitcell-loads"][k])
+	return loads
+
+
+# Returns the list of words held by each bank of a banked macro.
+def bank_words(size, banks):
+	n = 2**size // banks
+	return [range(b*n, (b+1)*n) for b in range(banks)]
+
+
+# Returns the list of words held by each sub-array of a bit array, ordered by
+# bank and then by position within the row. Each row of a folded bank holds
+# fold consecutive words, such that sub-array k of a bank holds every fold-th
+# word starting at k.
+def subarray_words(size, banks, fold):
+	return [
+		words[k::fold]
+		for words in bank_words(size, banks)
+		for k in range(fold)
+	]
+
+
+# A library of the subcircuits that make up the netlists of macros. The files
+# of the technology's netlist directory are read and parsed once, and the
+# subcircuits generated for a given size are kept in a least recently used
+# cache, such that building the netlists of many macros in a row, e.g. for the
+# runs of a characterization sweep, does not regenerate the same subcircuits
+# over and over.
+class NetlistLibrary(object):
+	def __init__(self, path=None, maxsize=64):
+		super(NetlistLibrary, self).__init__()
+		self.path = path or BASE+"/umc65/netlists"
+		self.files = dict()
+		self.includes = dict()
+		self.cells = dict()
+		for name in ["one_hot_decoder", "predecoded_decoder", "address_decoder", "bit_array", "bit_array_raw", "bit_array_load", "word_line_nets"]:
+			setattr(self, name, functools.lru_cache(maxsize)(getattr(self, name)))
+
+	# Returns the contents of a file in the netlist directory.
+	def read(self, name):
+		if name not in self.files:
+			with open(self.path+"/"+name) as f:
+				self.files[name] = f.read()
+		return self.files[name]
+
+	# Returns a file of the netlist directory as a potstill.circuit.Include.
+	def include(self, name):
+		if name not in self.includes:
+			inc = Include(self.read(name))
+			self.includes[name] = inc
+			for sub in inc.subcircuits:
+				self.cells.setdefault(sub.name, sub)
+		return self.includes[name]
+
+	# Returns the library cell with the given name. Cells that are not defined
+	# in any of the included files are assumed to be provided elsewhere, with
+	# unknown ports.
+	def cell(self, name):
+		self.include("components.cir")
+		self.include("PSADOH.cir")
+		if name not in self.cells:
+			self.cells[name] = Subcircuit(name, None, external=True)
+		return self.cells[name]
+
+	# Returns the nets connecting the address decoder and the bit arrays.
+	def word_line_nets(self, size):
+		return ["n%s%d" % (n, i) for i in range(2**size) for n in ["S", "GP", "GN"]]
+
+	# Adds the levels [first,last) of the read mux tree to a subcircuit. The
+	# levels are grouped into stages as given by read_mux_stages. Each stage
+	# combines the outputs nL<level>Q<n> of the previous stage in groups of 2
+	# or 4, alternating between NAND and NOR gates. The stages of an enclosed
+	# sub-array are counted by offset, such that the alternation carries on
+	# across the sub-array boundary. The last stage drives outName.
+	def read_mux(self, subckt, first, last, outName, radix=2, offset=0):
+		gates = {
+			1: (self.cell("PSRMND"), self.cell("PSRMNR")),
+			2: (self.cell("PSRMND4"), self.cell("PSRMNR4")),
+		}
+		i = first
+		for (s, k) in enumerate(read_mux_stages(last-first, radix)):
+			(nand, nor) = gates[k]
+			for n in range(2**(last-i-k)):
+				subckt.add("XL%dQ%d" % (i+k, n), nand if (offset+s) % 2 == 0 else nor,
+					["nL%dQ%d" % (i, n*2**k+j) for j in range(2**k)] + [
+					("nL%dQ%d" % (i+k, n)) if i+k < last else outName,
+					"VDD", "VSS"
+				])
+			i += k
+
+	# Adds the inverting or buffering output stage of a read mux tree with the
+	# given number of stages to a subcircuit.
+	def read_mux_output(self, subckt, stages):
+		if stages % 2 == 0:
+			subckt.add("XINV", self.cell("PSRMINV"), ["nQ", "Q", "VDD", "VSS"])
+		else:
+			subckt.add("XBUF", self.cell("PSRMBUF"), ["nQ", "Q", "VDD", "VSS"])
+
+	# Adds the bit cells of the given words to a subcircuit.
+	def bit_cells(self, subckt, num_words):
+		cell = self.cell("PSBA1")
+		for i in range(num_words):
+			subckt.add("X%d" % i, cell, ["D", "GP%d" % i, "GN%d" % i, "S%d" % i, "nL0Q%d" % i, "VDD", "VSS"])
+
+	# Returns the ports of a bit array with the given number of words.
+	def bit_array_ports(self, num_words):
+		return ["D"] + ["%s%d" % (n, i) for i in range(num_words) for n in ["S", "GP", "GN"]] + ["Q", "VDD", "VSS"]
+
+	# Returns the bit array of a macro. The bit array of a banked or folded
+	# macro has the same ports as the plain bit array. Each of its sub-arrays
+	# holds the raw read mux tree of its words, the outputs of which are
+	# combined by the remaining levels of the tree and the output stage. In a
+	# folded macro, the first of these levels form the column mux that selects
+	# among the words of a row.
+	def bit_array(self, size, banks=1, fold=1, radix=2):
+		subckt = Subcircuit("PSBA%d%s%s" % (2**size, array_suffix(banks, fold), radix_suffix(radix)), self.bit_array_ports(2**size))
+		if banks == 1 and fold == 1:
+			self.bit_cells(subckt, 2**size)
+			self.read_mux_output(subckt, len(read_mux_stages(size, radix)))
+			self.read_mux(subckt, 0, size, "nQ", radix)
+		else:
+			subarrays = subarray_words(size, banks, fold)
+			subsize = size - (len(subarrays).bit_length()-1)
+			raw = self.bit_array_raw(subsize, radix)
+			for (j, words) in enumerate(subarrays):
+				subckt.add("XS%d" % j, raw,
+					["D"] +
+					["%s%d" % (n, i) for i in words for n in ["S", "GP", "GN"]] +
+					["nL%dQ%d" % (subsize, j), "VDD", "VSS"]
+				)
+			offset = len(read_mux_stages(subsize, radix))
+			self.read_mux_output(subckt, offset + len(read_mux_stages(size-subsize, radix)))
+			self.read_mux(subckt, subsize, size, "nQ", radix, offset)
+		return subckt
+
+	# Returns a bit array without output stage, i.e. the bit cells and the read
+	# mux tree, whose root is the output Q.
+	def bit_array_raw(self, size, radix=2):
+		subckt = Subcircuit("PSBA%dR%s" % (2**size, radix_suffix(radix)), self.bit_array_ports(2**size))
+		self.bit_cells(subckt, 2**size)
+		self.read_mux(subckt, 0, size, "Q", radix)
+		return subckt
+
+	# Returns the lumped load that the given number of bit columns present to
+	# the word lines, with the capacitances cs, cgp, and cgn of a single bit
+	# cell on its S, GP, and GN inputs.
+	def bit_array_load(self, size, columns, cs, cgp, cgn):
+		ports = ["%s%d" % (n, i) for i in range(2**size) for n in ["S", "GP", "GN"]] + ["VSS"]
+		subckt = Subcircuit("PSBA%dL%d" % (2**size, columns), ports)
+		for i in range(2**size):
+			for (n, c) in [("S", cs), ("GP", cgp), ("GN", cgn)]:
+				subckt.add("C%s%d" % (n, i), None, ["%s%d" % (n, i), "VSS"], c*columns)
+		return subckt
+
+	# Returns the address decoder of a bank. In a banked macro, each bank holds
+	# the slice of the decoder with the word lines of its words.
+	def address_decoder(self, size, banks=1, bank=0, predecode=False):
+		if banks == 1:
+			words = range(2**size)
+			suffix = str(2**size)
+		else:
+			words = bank_words(size, banks)[bank]
+			suffix = "%dB%dS%d" % (2**size, banks, bank)
+		n = len(words)
+		if predecode:
+			suffix += "P"
+			ohd = self.predecoded_decoder(size, words, suffix)
+		else:
+			ohd = self.one_hot_decoder(size, words, suffix)
+		subckt = Subcircuit("PSAD%s" % suffix,
+			["CKP", "CKN"] +
+			["RA%d" % i for i in range(size)] +
+			["WA%d" % i for i in range(size)] +
+			["%s%d" % (p, i) for i in range(n) for p in ["S", "GP", "GN"]] +
+			["VDD", "VSS"]
+		)
+
+		# Instantiate the clock gates that generate the WWL.
+		ckg = self.cell("PSADCKG")
+		for i in range(n):
+			subckt.add("XCKG%d" % i, ckg, ["nWE%d" % i, "CKP", "CKN", "GP%d" % i, "GN%d" % i, "VDD", "VSS"])
+
+		# Instantiate the one-hot decoder for the read and write address.
+		subckt.add("XRAD", ohd, ["RA%d" % i for i in range(size)] + ["S%d" % i for i in range(n)] + ["VDD", "VSS"])
+		subckt.add("XWAD", ohd, ["WA%d" % i for i in range(size)] + ["nWE%d" % i for i in range(n)] + ["VDD", "VSS"])
+		return subckt
+
+	# Returns the one-hot decoder used in address decoders, generating the
+	# outputs of the given words.
+	def one_hot_decoder(self, size, words, suffix):
+		subckt = Subcircuit("PSADOH%s" % suffix,
+			["A%d" % i for i in range(size)] +
+			["Z%d" % i for i in range(len(words))] +
+			["VDD", "VSS"]
+		)
+		inv = self.cell("PSADINV")
+		gate = self.cell("PSADOH%dR" % 2**size)
+		for i in range(size):
+			subckt.add("XI%d" % i, inv, ["A%d" % i, "N%d" % i, "VDD", "VSS"])
+		actHiInputs = (size > 3)
+		for (N, i) in enumerate(words):
+			subckt.add("X%d" % N, gate,
+				[("A%d" if (i if actHiInputs and n != 6 else ~i) & (1 << n) else "N%d") % n for n in range(size)] +
+				["Z%d" % N, "VDD", "VSS"]
+			)
+		return subckt
+
+	# Returns a one-hot decoder with the same ports as the one returned by
+	# one_hot_decoder, which first decodes groups of two or three address bits
+	# with the small one-hot decoders used for macros with 4 and 8 words. The
+	# outputs of the words are then formed by a gate per word that combines
+	# one predecoded line of each group, such that each address line only
+	# loads its predecoder rather than half of the word gates. Like the word
+	# gates of one_hot_decoder, the gates of up to three inputs are active on
+	# low inputs, which are obtained by inverting the predecoded lines.
+	def predecoded_decoder(self, size, words, suffix):
+		subckt = Subcircuit("PSADOH%s" % suffix,
+			["A%d" % i for i in range(size)] +
+			["Z%d" % i for i in range(len(words))] +
+			["VDD", "VSS"]
+		)
+		groups = predecode_groups(size)
+		inv = self.cell("PSADINV")
+		gate = self.cell("PSADOH%dR" % 2**len(groups))
+		actHiInputs = (len(groups) > 3)
+
+		# Instantiate the predecoders and, if needed, invert their outputs.
+		for (g, (first, n)) in enumerate(groups):
+			pd = self.one_hot_decoder(n, range(2**n), str(2**n))
+			subckt.add("XPD%d" % g, pd,
+				["A%d" % (first+i) for i in range(n)] +
+				["P%dZ%d" % (g, j) for j in range(2**n)] +
+				["VDD", "VSS"]
+			)
+			if not actHiInputs:
+				for j in range(2**n):
+					subckt.add("XPI%dZ%d" % (g, j), inv, ["P%dZ%d" % (g, j), "P%dN%d" % (g, j), "VDD", "VSS"])
+
+		# Instantiate the word gates.
+		for (N, i) in enumerate(words):
+			subckt.add("X%d" % N, gate,
+				["P%d%s%d" % (g, "Z" if actHiInputs else "N", (i >> first) & (2**n-1)) for (g, (first, n)) in enumerate(groups)] +
+				["Z%d" % N, "VDD", "VSS"]
+			)
+		return subckt
+
+	# Builds the netlist of a macro.
+	#
+	# If the bit cell loads are given, as returned by bitcell_loads, a reduced
+	# netlist for characterization is built. Only the first bit column, which
+	# the testbenches probe, is kept at full detail. The other columns are
+	# replaced by their load on the word lines and the write data nets, and
+	# their read data outputs are tied low through a resistor. The registers,
+	# address decoders, and clock gates are kept, such that the shared clock
+	# nets see the same load as in the full netlist. The switching and leakage
+	# energy of the removed columns is not modelled, so the reduced netlist is
+	# only suited for timing, not for power characterization.
+	def build(self, size, bits, banks=1, fold=1, loads=None, predecode=False, radix=2):
+		netlist = Netlist()
+		netlist.include(self.include("components.cir"))
+		netlist.include(self.include("PSADOH.cir"))
+		for b in range(banks):
+			netlist.add(self.address_decoder(size, banks, b, predecode))
+		ba = netlist.add(self.bit_array(size, banks, fold, radix))
+
+		top = Subcircuit(default_name(2**size, bits, banks, fold),
+			["CK", "RE"] +
+			["RA%d" % i for i in reversed(range(size))] +
+			["RD%d" % i for i in reversed(range(bits))] +
+			["WE"] +
+			["WA%d" % i for i in reversed(range(size))] +
+			["WD%d" % i for i in reversed(range(bits))] +
+			["VDD", "VSS"]
+		)
+		netsRA = ["nRA%d" % i for i in range(size)]
+		netsWA = ["WA%d" % i for i in range(size)]
+		netsSGPGN = self.word_line_nets(size)
+
+		# Add the root clock gates.
+		top.add("XRWCKG", self.cell("PSRWCKG"), ["RE", "WE", "CK", "nRCKP", "nRCKN", "nWCKP", "nWCKN", "VDD", "VSS"])
+
+		# Instantiate the address decoder.
+		for (b, words) in enumerate(bank_words(size, banks)):
+			top.add("XAD%d" % b if banks > 1 else "XAD", netlist.add(self.address_decoder(size, banks, b, predecode)),
+				["nWCKP", "nWCKN"] + netsRA + netsWA +
+				netsSGPGN[words.start*3:words.stop*3] +
+				["VDD", "VSS"]
+			)
+
+		# Instantiate the write data registers.
+		reg = self.cell("PSREG")
+		for i in range(bits):
+			top.add("XWDREG%d" % i, reg, ["WD%d" % i, "nWCKP", "nWCKN", "nWD%d" % i, "iw%d" % i, "VDD", "VSS"])
+
+		# Instantiate the read address registers.
+		for i in range(size):
+			top.add("XRAREG%d" % i, reg, ["RA%d" % i, "nRCKP", "nRCKN", "nRA%d" % i, "ir%d" % i, "VDD", "VSS"])
+
+		# Instantiate the bit arrays.
+		if loads is None:
+			for i in range(bits):
+				top.add("XBA%d" % i, ba, ["nWD%d" % i] + netsSGPGN + ["RD%d" % i, "VDD", "VSS"])
+		else:
+			top.add("XBA0", ba, ["nWD0"] + netsSGPGN + ["RD0", "VDD", "VSS"])
+			if bits > 1:
+				load = self.bit_array_load(size, bits-1, loads["S"], loads["GP"], loads["GN"])
+				top.add("XBAL", netlist.add(load), netsSGPGN + ["VSS"])
+			for i in range(1, bits):
+				top.add("CWD%d" % i, None, ["nWD%d" % i, "VSS"], loads["D"]*2**size)
+				top.add("RRD%d" % i, None, ["RD%d" % i, "VSS"], loads["Q-tie"])
+
+		netlist.add(top)
+		return netlist
+
+
+library = NetlistLibrary()
+
+
+def generateMacro(macro, reduced=False):
+	loads = bitcell_loads(macro.techdir) if reduced else None
+	return generate(macro.num_addr, macro.num_bits, macro.num_banks, macro.words_per_row, loads, macro.predecode, macro.mux_radix)
+
+
+def buildMacro(macro, reduced=False):
+	loads = bitcell_loads(macro.techdir) if reduced else None
+	return build(macro.num_addr, macro.num_bits, macro.num_banks, macro.words_per_row, loads, macro.predecode, macro.mux_radix)
+
+
+def writeMacro(f, macro, reduced=False):
+	write_spice(buildMacro(macro, reduced), f)
+
@@ -1,57 +1,119 @@
 # Copyright (c) 2016 Fabian Schuiki
+#
+# This file generates the nodesets of memory macros, which put the latches of
+# a macro into a defined state at the beginning of a simulation. The bit cells
+# may be preloaded with memory contents, e.g. as read by read_contents from a
+# file in the format of Verilog's $readmemh and $readmemb.
+
+import io, re
+from potstill.netlist import subarray_words
+
 
 def generateADCKG(prefix, value):
 	return prefix+".X1.n1 %g\n" % value
 
 
 def generateAD(prefix, num_addr):
-	res = ""
-	for i in range(2**num_addr):
-		res += generateADCKG(prefix+".XCKG%d" % i, 0)
-	return res
+	return "".join(generateADCKG(prefix+".XCKG%d" % i, 0) for i in range(2**num_addr))
 
 
 def generateREGLA(prefix, value):
 	return prefix+".n1 %g\n" % value
 
 
-def generateREG(prefix, value):
-	return generateREGLA(prefix+".XI0", value) + generateREGLA(prefix+".XI1", 1.2-value)
+def generateREG(prefix, value, vdd=1.2):
+	return generateREGLA(prefix+".XI0", value) + generateREGLA(prefix+".XI1", vdd-value)
 
 
-def generateBA1(prefix, value):
-	return prefix+".nFB %g\n" % (1.2-value)
+def generateBA1(prefix, value, vdd=1.2):
+	return prefix+".nFB %g\n" % (vdd-value)
 
 
-def generateBT(prefix, num_addr, value):
-	res = ""
-	for i in range(2**num_addr):
-		res += generateBA1(prefix+".X%d" % i, value)
-	return res
+# Generates the nodeset of a macro. In a banked macro, each bank has its own
+# address decoder. In banked and folded macros, the bit cells are held in one
+# sub-array per bank and word of a row. In a reduced netlist, only the first
+# bit column holds bit cells.
+def generate(prefix, num_addr, num_bits, num_banks=1, words_per_row=1, reduced=False, contents=None, vdd=1.2):
+	f = io.StringIO()
+	write(f, prefix, num_addr, num_bits, num_banks, words_per_row, reduced, contents, vdd)
+	return f.getvalue()
 
 
-def generate(prefix, num_addr, num_bits):
-	res = ""
+# Writes the nodeset of a macro to the file object f, as generated by generate.
+# The bit cells are initialized to the given contents, a list of the words of
+# the macro as integers, or to 0 if no contents are given. The nodeset is
+# written one memory column at a time.
+def write(f, prefix, num_addr, num_bits, num_banks=1, words_per_row=1, reduced=False, contents=None, vdd=1.2):
+	bank_addr = num_addr - (num_banks.bit_length()-1)
+	num_subarrays = num_banks * words_per_row
 
 	# Global clock gate.
-	res += generateADCKG(prefix+".XRWCKG.X0", 0)
-	res += generateADCKG(prefix+".XRWCKG.X1", 0)
+	f.write(generateADCKG(prefix+".XRWCKG.X0", 0))
+	f.write(generateADCKG(prefix+".XRWCKG.X1", 0))
 
 	# Address decoder.
-	res += generateAD(prefix+".XAD", num_addr)
+	if num_banks == 1:
+		f.write(generateAD(prefix+".XAD", num_addr))
+	else:
+		for b in range(num_banks):
+			f.write(generateAD(prefix+".XAD%d" % b, bank_addr))
 
 	# Write data and read address registers.
 	for i in range(num_addr):
-		res += generateREG(prefix+".XRAREG%d" % i, 0)
-	for i in range(num_bits):
-		res += generateREG(prefix+".XWDREG%d" % i, 0)
-
-	# Memory columns.
+		f.write(generateREG(prefix+".XRAREG%d" % i, 0, vdd))
 	for i in range(num_bits):
-		res += generateBT(prefix+".XBA%d" % i, num_addr, 0)
-
-	return res
-
-
-def generateMacro(prefix, macro):
-	return generate(prefix, macro.num_addr, macro.num_bits)
+		f.write(generateREG(prefix+".XWDREG%d" % i, 0, vdd))
+
+	# Memory columns. Each bit cell is named by its path within the bit array
+	# of a column.
+	if num_subarrays == 1:
+		cells = [(w, "X%d" % w) for w in range(2**num_addr)]
+	else:
+		cells = [
+			(w, "XS%d.X%d" % (j, n))
+			for (j, words) in enumerate(subarray_words(num_addr, num_banks, words_per_row))
+			for (n, w) in enumerate(words)
+		]
+	for i in range(1 if reduced else num_bits):
+		column = "%s.XBA%d." % (prefix, i)
+		f.write("".join(
+			generateBA1(column+path, vdd if contents is not None and contents[w] >> i & 1 else 0, vdd)
+			for (w, path) in cells
+		))
+
+
+def generateMacro(prefix, macro, reduced=False, contents=None):
+	return generate(prefix, macro.num_addr, macro.num_bits, macro.num_banks, macro.words_per_row, reduced, contents, macro.vdd)
+
+
+def writeMacro(f, prefix, macro, reduced=False, contents=None):
+	write(f, prefix, macro.num_addr, macro.num_bits, macro.num_banks, macro.words_per_row, reduced, contents, macro.vdd)
+
+
+# Reads the contents of a memory with num_words words of num_bits bits from a
+# file in the format of Verilog's $readmemh or $readmemb, with the words given
+# as hexadecimal or binary numbers. Words are separated by whitespace, "//" and
+# "/* */" comments are ignored, and "@<hex>" sets the address of the following
+# word. Words the file does not cover are 0. Returns the list of words.
+def read_contents(path, num_words, num_bits, base=16):
+	with open(path) as f:
+		text = f.read()
+	text = re.sub(r"//[^\n]*|/\*.*?\*/", " ", text, flags=re.DOTALL)
+
+	contents = [0]*num_words
+	addr = 0
+	for token in text.split():
+		if token.startswith("@"):
+			addr = int(token[1:], 16)
+			continue
+		try:
+			value = int(token.replace("_", ""), base)
+		except ValueError:
+			raise ValueError("%s: invalid word %s" % (path, token))
+		if addr >= num_words:
+			raise ValueError("%s: address %d out of range for %d words" % (path, addr, num_words))
+		if value >> num_bits:
+			raise ValueError("%s: word %s at address %d exceeds %d bits" % (path, token, addr, num_bits))
+		contents[addr] = value
+		addr += 1
+	return contents
@@ -3,6 +3,7 @@
 # This file implements GDS output generation using the Phalanx tool.
 
 import sys, numbers, itertools, subprocess
+from potstill.layout import stack_placement
 
 
 def argify(v):
@@ -45,25 +46,33 @@ class PhalanxWriter(object):
 
 	def inst(self, inst):
 		if inst.stack is None:
-			self.pushgrp("inst", inst.cell.gds_struct, inst.name)
-			self.cmd("set_position", inst.pos.x, inst.pos.y)
-			if inst.mx or inst.my:
-				self.cmd("set_orientation", "MX" if inst.mx else None, "MY" if inst.my else None)
-			self.popgrp()
+			self.place(inst.cell.gds_struct, inst.name, inst.pos.x, inst.pos.y, inst.mx, inst.my)
 		else:
-			dy = -inst.stack_step if inst.my else inst.stack_step
-			for i in range(inst.stack):
-				if inst.stack_noflip:
-					y = i*dy
-					my = inst.my
-				else:
-					y = i*dy + (i%2)*dy
-					my = ((i%2==1) != inst.my)
-				self.pushgrp("inst", inst.cell.gds_struct, "%s%d" % (inst.name,i))
-				self.cmd("set_position", inst.pos.x, inst.pos.y+y)
-				if inst.mx or my:
-					self.cmd("set_orientation", "MX" if inst.mx else None, "MY" if my else None)
-				self.popgrp()
+			for (i, dy, my) in stack_placement(inst.stack, inst.stack_step, inst.my, inst.stack_noflip):
+				self.place(inst.cell.gds_struct, "%s%d" % (inst.name,i), inst.pos.x, inst.pos.y+dy, inst.mx, my)
+
+	def place(self, gds_struct, name, x, y, mx, my):
+		self.pushgrp("inst", gds_struct, name)
+		self.cmd("set_position", x, y)
+		if mx or my:
+			self.cmd("set_orientation", "MX" if mx else None, "MY" if my else None)
+		self.popgrp()
+
+	# Emits the instances [start,end) of an InstTable. This bypasses the generic
+	# cmd() machinery since it is called for every placed cell of the macro.
+	def table(self, table, start=0, end=None):
+		outer = self.prefix
+		inner = self.prefix + "    "
+		structs = [c.gds_struct for c in table.cells]
+		orient = [None, inner+"set_orientation MY;", inner+"set_orientation MX;", inner+"set_orientation MX MY;"]
+		lines = self.lines
+		for (_, name, cell, x, y, mx, my) in table.expand(start, end):
+			lines.append("%sinst %s %s {" % (outer, structs[cell], name))
+			lines.append("%sset_position %s %s;" % (inner, argify(x), argify(y)))
+			o = orient[mx*2 + my]
+			if o is not None:
+				lines.append(o)
+			lines.append(outer+"}")
 
 	def collect(self):
 		return "\n".join(self.lines)+"\n"
@@ -98,52 +107,20 @@ def make_phalanx_input(layout, outfile):
 	wr.cmd("set_size", layout.size.x, layout.size.y)
 	wr.skip()
 
-	# Instantiate the bit columns.
-	wr.comment("Bit Arrays")
-	for ba in layout.bitarrays:
-		wr.inst(ba)
-	wr.skip()
-
-	# Instantiate the address decoder.
-	wr.comment("Address Decoder")
-	wr.inst(layout.addrdec)
-	wr.skip()
-
-	# Instantiate the global clock gate.
-	wr.comment("Global Clock Gate")
-	wr.inst(layout.rwckg)
-	wr.skip()
-
-	# Instantiate the read address registers.
-	wr.comment("Read Address Registers")
-	for r in layout.raregs:
-		wr.inst(r)
-	wr.skip()
-
-	# Instantiate the welltaps.
-	wr.comment("Welltaps")
-	for wt in layout.welltaps:
-		wr.inst(wt)
-	wr.skip()
-
-	# Instantiate the wiring.
-	wr.comment("Wiring")
-	for r in layout.wiring:
-		wr.inst(r)
-	wr.skip()
-
-	# Instantiate the fillers.
-	wr.comment("Fillers")
-	for r in layout.fillers:
-		wr.inst(r)
-	wr.skip()
+	# Instantiate the bit columns, address decoder, global clock gate, read
+	# address registers, welltaps, wiring, and fillers.
+	for (title, start, end) in layout.insts.groups:
+		wr.comment(title)
+		wr.table(layout.insts, start, end)
+		wr.skip()
 
 	# Add the pin labels. These are used to perform LVS checks.
 	wr.comment("Pin Labels")
 	for (name, y) in layout.supply_tracks:
 		wr.cmd("add_gds_text", layout.supply_layer_gds, 0, layout.addrdec.pos.x, y, '"'+name+'"')
-	for pin in layout.pins():
-		wr.cmd("add_gds_text", pin.layer_gds, 0, pin.label_pos.x, pin.label_pos.y, '"'+pin.name_gds+'"')
+	pt = layout.pin_table
+	for (pin, x, y) in zip(pt.pins, pt.label_x, pt.label_y):
+		wr.cmd("add_gds_text", pin.layer_gds, 0, x, y, '"'+pin.name_gds+'"')
 
 	# Close the root cell.
 	wr.popgrp()
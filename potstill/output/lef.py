@@ -53,10 +53,12 @@ class ObstructionSet(object):
 
 
 def add_bit_vchannel(obs, layout, layer, stretch, channel):
-	for i in range(layout.num_bits_left):
-		obs.add_channel(layer, stretch, (i+1) * layout.column_width_trk - channel - 1)
-	for i in range(layout.num_bits_right):
-		obs.add_channel(layer, stretch, layout.column_right_trk + i * layout.column_width_trk + channel)
+	for k in range(layout.words_per_row):
+		offset = k * layout.subcolumn_width_trk + channel
+		for i in range(layout.num_bits_left):
+			obs.add_channel(layer, stretch, (i+1) * layout.column_width_trk - offset - 1)
+		for i in range(layout.num_bits_right):
+			obs.add_channel(layer, stretch, layout.column_right_trk + i * layout.column_width_trk + offset)
 
 
 # Generates a sequence of integer intervals from an ordered list of integers.
@@ -105,7 +107,8 @@ def make_lef(layout):
 	wr.skip()
 
 	# Generate the pin statements.
-	for p in layout.pins():
+	pt = layout.pin_table
+	for (i, p) in enumerate(pt.pins):
 		wr.pushgrp("PIN", p.name)
 		wr.add("DIRECTION", p.dir)
 		wr.add("USE", p.use)
@@ -113,8 +116,8 @@ def make_lef(layout):
 			wr.add("SHAPE", p.shape)
 		wr.pushgrp("PORT")
 		wr.add("LAYER", p.layer)
-		for (ra, rb) in p.rects():
-			wr.add("RECT %g %g %g %g" % (ra.x*1e6, ra.y*1e6, rb.x*1e6, rb.y*1e6))
+		for k in range(pt.start[i], pt.start[i+1]):
+			wr.add("RECT %g %g %g %g" % (pt.x0[k]*1e6, pt.y0[k]*1e6, pt.x1[k]*1e6, pt.y1[k]*1e6))
 		wr.popgrp("END")
 		if p.dir == "INPUT":
 			wr.add("ANTENNAMODEL OXIDE1")
@@ -128,7 +131,7 @@ def make_lef(layout):
 	wr.add("SHAPE ABUTMENT")
 	wr.pushgrp("PORT")
 	wr.add("LAYER ME1")
-	wr.add("RECT ITERATE 0 1.65 %g 1.95 DO 1 BY %d STEP 0 %g" % (layout.size.x*1e6, layout.num_words/2+1, layout.row_height*2e6))
+	wr.add("RECT ITERATE 0 1.65 %g 1.95 DO 1 BY %d STEP 0 %g" % (layout.size.x*1e6, (layout.num_rows+1)//2, layout.row_height*2e6))
 	wr.popgrp("END")
 	wr.popgrp("END VDD")
 	wr.skip()
@@ -139,7 +142,7 @@ def make_lef(layout):
 	wr.add("SHAPE ABUTMENT")
 	wr.pushgrp("PORT")
 	wr.add("LAYER ME1")
-	wr.add("RECT ITERATE 0 -0.15 %g 0.15 DO 1 BY %d STEP 0 %g" % (layout.size.x*1e6, layout.num_words/2+1, layout.row_height*2e6))
+	wr.add("RECT ITERATE 0 -0.15 %g 0.15 DO 1 BY %d STEP 0 %g" % (layout.size.x*1e6, (layout.num_rows+1)//2, layout.row_height*2e6))
 	wr.popgrp("END")
 	wr.popgrp("END VSS")
 	wr.skip()
@@ -147,7 +150,7 @@ def make_lef(layout):
 	# Calculate the set of obstructed channels.
 	obs = ObstructionSet()
 	obs_cfg = layout.config["obstructed-channels"]
-	vstretch = (0.05, (layout.num_words+1) * layout.row_height * 1e6 - 0.05)
+	vstretch = (0.05, layout.num_banks * (layout.rows_per_bank+1) * layout.row_height * 1e6 - 0.05)
 	hstretch = (0.05, layout.size.x * 1e6 - 0.05)
 
 	if "bit" in obs_cfg:
@@ -160,20 +163,22 @@ def make_lef(layout):
 
 		if "horizontal" in bit_cfg:
 			for (layer, channels) in bit_cfg["horizontal"].items():
-				for i in range(int(layout.num_words/2)):
-					for ch in channels:
-						obs.add_channel(layer, hstretch, i*layout.row_height_trk*2 + ch)
+				for b in range(layout.num_banks):
+					for i in range(int(layout.rows_per_bank/2)):
+						for ch in channels:
+							obs.add_channel(layer, hstretch, layout.bank_track(b, i*layout.row_height_trk*2 + ch))
 
 	if "bitarray" in obs_cfg:
 		for (num_words, channels) in obs_cfg["bitarray"].items():
-			if num_words <= layout.num_words:
+			if num_words <= layout.rows_per_bank:
 				for ch in channels:
 					add_bit_vchannel(obs, layout, "ME2", vstretch, ch)
 
 	if "regwd" in obs_cfg:
 		for (layer, channels) in obs_cfg["regwd"].items():
-			for ch in channels:
-				obs.add_channel(layer, hstretch, layout.regwd_y_trk + ch)
+			for b in range(layout.num_banks):
+				for ch in channels:
+					obs.add_channel(layer, hstretch, layout.bank_track(b, layout.regwd_trk + ch))
 
 	# Generate the obstruction statements.
 	wr.pushgrp("OBS")
@@ -0,0 +1,327 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements the reduction of the RC networks of a parasitic
+# extraction netlist (*.pxi). Each net of the extracted netlist is a subcircuit
+# of resistors and capacitors, whose ports are the terminals of the net. The
+# internal nodes of these subcircuits are eliminated TICER-style: nodes whose
+# time constant is small compared to the delays of interest are removed one at
+# a time, and their resistors and capacitors are redistributed among their
+# neighbours. The ports are never eliminated, such that the nodes nodesets are
+# remapped to, see potstill.pxi, are preserved.
+
+import sys, re, math, heapq
+
+
+SUFFIXES = {
+	"t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3, "m": 1e-3,
+	"u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15, "a": 1e-18,
+}
+VALUE = re.compile(r"^([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpfa])?", re.IGNORECASE)
+
+
+# Parses a SPICE value such as "12.5", "1e-15", or "3.2f".
+def parse_value(s):
+	m = VALUE.match(s)
+	if m is None:
+		raise ValueError("invalid value %s" % s)
+	v = float(m.group(1))
+	if m.group(2) is not None:
+		v *= SUFFIXES[m.group(2).lower()]
+	return v
+
+
+# Returns whether a node is global, i.e. visible outside of any subcircuit.
+def is_global(node):
+	return node == "0" or node.endswith("!")
+
+
+# The RC network of a net. Resistors are stored as conductances. Both are kept
+# as adjacency maps from node to neighbouring node to value, with each element
+# stored in both directions.
+class RCNet(object):
+	def __init__(self, name, ports):
+		super(RCNet, self).__init__()
+		self.name = name
+		self.ports = ports
+		self.conductances = dict()
+		self.capacitances = dict()
+		self.others = list()
+		self.fixed = set(ports)
+
+	def nodes(self):
+		return set(self.conductances) | set(self.capacitances)
+
+	def add(self, adj, a, b, v):
+		if a == b:
+			return
+		adj.setdefault(a, dict())
+		adj.setdefault(b, dict())
+		adj[a][b] = adj[a].get(b, 0) + v
+		adj[b][a] = adj[b].get(a, 0) + v
+
+	def add_resistor(self, a, b, r):
+		if r == 0:
+			raise ValueError("zero resistor between %s and %s in %s" % (a, b, self.name))
+		self.add(self.conductances, a, b, 1/r)
+
+	def add_capacitor(self, a, b, c):
+		self.add(self.capacitances, a, b, c)
+
+	# Adds an element other than a resistor or capacitor, which is kept as is
+	# and whose nodes are never eliminated.
+	def add_other(self, line, nodes):
+		self.others.append(line)
+		self.fixed.update(nodes)
+
+	def is_internal(self, node):
+		return node not in self.fixed and not is_global(node)
+
+	# Returns the time constant of a node, i.e. its capacitance times the
+	# resistance to its neighbours in parallel, or None if the node has no
+	# resistive connection.
+	def time_constant(self, node):
+		g = sum(self.conductances.get(node, {}).values())
+		if g == 0:
+			return None
+		return sum(self.capacitances.get(node, {}).values()) / g
+
+	# Eliminates a node. Its neighbours are connected by the conductances of a
+	# star-mesh transformation, and each of its capacitors is split among the
+	# neighbours in proportion to their conductance to the node.
+	def eliminate(self, node):
+		gs = self.conductances.pop(node, {})
+		cs = self.capacitances.pop(node, {})
+		for n in gs:
+			del self.conductances[n][node]
+		for n in cs:
+			del self.capacitances[n][node]
+		G = sum(gs.values())
+		items = list(gs.items())
+		for (i, (a, ga)) in enumerate(items):
+			for (b, gb) in items[i+1:]:
+				self.add(self.conductances, a, b, ga*gb/G)
+			for (m, c) in cs.items():
+				self.add_capacitor(a, m, c*ga/G)
+
+	# Eliminates all internal nodes whose time constant is below tau, quickest
+	# first, as long as they have no more than max_degree neighbours. Nodes
+	# without any capacitance or resistive connection are removed as well.
+	# Returns the number of eliminated nodes.
+	def reduce(self, tau, max_degree=8):
+		num_eliminated = 0
+		for node in list(self.capacitances):
+			if self.is_internal(node) and node not in self.conductances and len(self.capacitances[node]) == 0:
+				del self.capacitances[node]
+		heap = list()
+		def push(node):
+			t = self.time_constant(node)
+			if t is not None and t < tau and len(self.conductances[node]) <= max_degree:
+				heapq.heappush(heap, (t, node))
+		for node in self.conductances:
+			if self.is_internal(node):
+				push(node)
+		while len(heap) > 0:
+			(t, node) = heapq.heappop(heap)
+			if node not in self.conductances or self.time_constant(node) != t:
+				continue
+			neighbours = list(self.conductances[node])
+			self.eliminate(node)
+			num_eliminated += 1
+			for n in neighbours:
+				if self.is_internal(n):
+					push(n)
+		return num_eliminated
+
+	def num_elements(self):
+		return (
+			sum(len(x) for x in self.conductances.values()) // 2 +
+			sum(len(x) for x in self.capacitances.values()) // 2
+		)
+
+	# Calculates the delays from the source port to the other ports, with
+	# every capacitor considered to be grounded. Returns a dictionary of
+	# (elmore, d2m) pairs per port, where elmore is the Elmore delay, i.e. the
+	# first moment m1 of the impulse response, and d2m the D2M delay metric
+	# ln(2)*m1^2/sqrt(m2), which also accounts for the second moment. The
+	# reduction preserves the former, such that the latter is a better
+	# indication of its error. Returns None if the network has more than
+	# max_nodes nodes or is not connected.
+	def delays(self, source, max_nodes=400):
+		nodes = [n for n in self.conductances if n != source and not is_global(n)]
+		if len(nodes) == 0 or len(nodes) > max_nodes:
+			return None
+		idx = dict((n, i) for (i, n) in enumerate(nodes))
+		size = len(nodes)
+
+		# Assemble the conductance matrix with the source grounded, and the
+		# vector of node capacitances.
+		G = [[0.0]*size for _ in range(size)]
+		C = [sum(self.capacitances.get(n, {}).values()) for n in nodes]
+		for (a, adj) in self.conductances.items():
+			if a not in idx:
+				continue
+			i = idx[a]
+			for (b, g) in adj.items():
+				G[i][i] += g
+				if b in idx:
+					G[i][idx[b]] -= g
+
+		# Factorize G with partial pivoting, keeping the multipliers in its
+		# lower triangle.
+		perm = list(range(size))
+		for k in range(size):
+			p = max(range(k, size), key=lambda i: abs(G[i][k]))
+			if G[p][k] == 0:
+				return None
+			(G[k], G[p]) = (G[p], G[k])
+			(perm[k], perm[p]) = (perm[p], perm[k])
+			Gk = G[k]
+			for i in range(k+1, size):
+				Gi = G[i]
+				f = Gi[k] / Gk[k]
+				Gi[k] = f
+				if f == 0:
+					continue
+				for j in range(k+1, size):
+					Gi[j] -= f*Gk[j]
+
+		def solve(b):
+			x = [b[perm[i]] for i in range(size)]
+			for i in range(size):
+				Gi = G[i]
+				x[i] -= sum(Gi[j]*x[j] for j in range(i))
+			for i in reversed(range(size)):
+				Gi = G[i]
+				x[i] = (x[i] - sum(Gi[j]*x[j] for j in range(i+1, size))) / Gi[i]
+			return x
+
+		m1 = solve(C)
+		m2 = solve([c*t for (c, t) in zip(C, m1)])
+		result = dict()
+		for p in self.ports:
+			if p in idx:
+				(t1, t2) = (m1[idx[p]], m2[idx[p]])
+				result[p] = (t1, math.log(2)*t1*t1/math.sqrt(t2) if t2 > 0 else 0)
+		return result
+
+	# Writes the resistors, capacitors, and other elements of the network as
+	# SPICE lines.
+	def write(self, f):
+		for line in self.others:
+			f.write(line+"\n")
+		n = 0
+		for (a, adj) in self.conductances.items():
+			for (b, g) in adj.items():
+				if a < b:
+					n += 1
+					f.write("R%d %s %s %g\n" % (n, a, b, 1/g))
+		n = 0
+		for (a, adj) in self.capacitances.items():
+			for (b, c) in adj.items():
+				if a < b:
+					n += 1
+					f.write("C%d %s %s %g\n" % (n, a, b, c))
+
+
+# Parses the elements of a subcircuit into an RCNet.
+def parse_net(name, ports, lines):
+	net = RCNet(name, ports)
+	for line in lines:
+		tokens = [t for t in line.split() if not t.startswith("$")]
+		kind = tokens[0][0].upper()
+		if kind in "RC" and len(tokens) >= 4:
+			value = parse_value(tokens[3].split("=")[-1])
+			if kind == "R":
+				net.add_resistor(tokens[1], tokens[2], value)
+			else:
+				net.add_capacitor(tokens[1], tokens[2], value)
+		else:
+			net.add_other(line, tokens[1:])
+	return net
+
+
+# Generator that joins lines starting with a "+" with the preceding line.
+# Empty and comment lines are kept, such that the text outside of the reduced
+# subcircuits passes through.
+def collapse_plus_lines(it):
+	line = None
+	for l in it:
+		l = l.rstrip("\n")
+		if l.lstrip().startswith("+"):
+			line = (line or "") + " " + l.lstrip()[1:]
+			continue
+		if line is not None:
+			yield line
+		line = l
+	if line is not None:
+		yield line
+
+
+# Statistics of a reduction.
+class Stats(object):
+	def __init__(self):
+		super(Stats, self).__init__()
+		self.num_nets = 0
+		self.num_reduced = 0
+		self.nodes_before = 0
+		self.nodes_after = 0
+		self.elements_before = 0
+		self.elements_after = 0
+		self.elmore_errors = list()
+		self.d2m_errors = list()
+		self.not_compared = list()
+
+
+# Reduces the RC networks of the nets in the extracted netlist read from the
+# file object fin, and writes the reduced netlist to fout. Nets whose name is in
+# keep are written as they are. If report is set, the delays from the first
+# port of each net to its other ports are compared before and after the
+# reduction, see RCNet.delays, and the relative errors are collected in the
+# returned Stats as (error, net, port) tuples. Calculating the delays takes
+# cubic time in the number of nodes, so nets with more than max_nodes nodes are
+# not compared. They are collected in the returned Stats as (nodes, net) tuples,
+# together with nets whose delays cannot be calculated.
+def reduce_netlist(fin, fout, tau, max_degree=8, keep=(), report=False, max_nodes=400):
+	stats = Stats()
+	subckt = None
+	for line in collapse_plus_lines(fin):
+		tokens = line.split()
+		head = tokens[0].upper() if len(tokens) > 0 else ""
+		if subckt is None:
+			if head == ".SUBCKT" and "%" in tokens[1]:
+				subckt = (line, tokens[1], tokens[2:], list())
+			else:
+				fout.write(line+"\n")
+			continue
+		if head == ".ENDS":
+			(header, name, ports, lines) = subckt
+			subckt = None
+			fout.write(header+"\n")
+			stats.num_nets += 1
+			if name.split("%", 1)[1] in keep:
+				for l in lines:
+					fout.write(l+"\n")
+			else:
+				net = parse_net(name, ports, lines)
+				stats.nodes_before += len(net.nodes())
+				stats.elements_before += net.num_elements()
+				num_nodes = len(net.nodes())
+				before = net.delays(ports[0], max_nodes) if report and len(ports) > 1 else None
+				if report and len(ports) > 1 and before is None:
+					stats.not_compared.append((num_nodes, name))
+				if net.reduce(tau, max_degree) > 0:
+					stats.num_reduced += 1
+				stats.nodes_after += len(net.nodes())
+				stats.elements_after += net.num_elements()
+				after = net.delays(ports[0], max_nodes) if before is not None else None
+				if after is not None:
+					for (port, (elmore, d2m)) in before.items():
+						if port in after and elmore > 0 and d2m > 0:
+							stats.elmore_errors.append((abs(after[port][0]-elmore)/elmore, name, port))
+							stats.d2m_errors.append((abs(after[port][1]-d2m)/d2m, name, port))
+				net.write(fout)
+			fout.write(line+"\n")
+			continue
+		if len(tokens) > 0 and not tokens[0].startswith("*"):
+			subckt[3].append(line)
+	return stats
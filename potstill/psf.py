@@ -0,0 +1,415 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a reader for the waveforms SPECTRE writes in the PSF
+# ASCII format, and the search for threshold crossings in them. The VALUE
+# section of a transient analysis lists, for every time point, the time
+# followed by the value of every saved signal, one "name" value pair per line.
+# Rather than parsing this line by line, the file is memory-mapped and split
+# into tokens a chunk of time points at a time. Since the signals repeat in the
+# same order at every time point, each signal is then a strided slice of the
+# values, which is converted to an array of doubles in one go.
+#
+# The binary PSF format (psfbin) is read as well. Its sections are located via a
+# table at the end of the file. The values of a sweep are stored as a sequence
+# of fixed-size records, one per sweep point. Each signal is therefore a strided
+# view into the value section. Signals are only loaded once they are requested.
+#
+# SPECTRE writes transient results in "windowed" form, which is indicated by
+# the PSF window size header property. The values are then stored in windows of
+# consecutive sweep points, each with one fixed-size block per signal. A signal
+# is read by concatenating its blocks. PSFXL, a different, undocumented format,
+# is not supported.
+
+import sys, mmap, struct
+from array import array
+
+
+CHUNK_SIZE = 1 << 24
+TIME = b'"time"'
+
+
+# Reads the signals with the given names from a PSF ASCII file. Returns a
+# dictionary that maps each signal to a (time, values) pair of arrays of
+# doubles. Signals that do not appear in the file are omitted.
+def read_ascii(path, names):
+	wanted = dict((('"%s"' % n).encode(), n) for n in names)
+	waves = dict()
+	with open(path, "rb") as f:
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			# The VALUE section is the last in the file, and is followed by
+			# the END keyword.
+			start = mm.find(b"\nVALUE\n")
+			if start < 0:
+				raise ValueError("%s: no VALUE section" % path)
+			start += 7
+			end = mm.rfind(b"\nEND", start)
+			end = end if end >= 0 else len(mm)
+
+			# Split the section into chunks that end before a time point.
+			time = None
+			pos = start
+			while pos < end:
+				cut = mm.find(b"\n"+TIME, min(pos+CHUNK_SIZE, end), end)
+				cut = cut if cut >= 0 else end
+				tokens = mm[pos:cut].split()
+				time = read_chunk(path, tokens[0::2], tokens[1::2], wanted, waves, time)
+				pos = cut
+	return waves
+
+
+# Appends the values in a chunk of the VALUE section to the waves. The keys and
+# values are the names and values of the chunk's lines. Returns the last time
+# point, to which values before the chunk's first time point belong.
+def read_chunk(path, keys, values, wanted, waves, time):
+	# Determine the order of the signals at each time point, and check that
+	# the time and the wanted signals appear in the same place throughout the
+	# chunk.
+	period = keys.index(TIME, 1) if keys.count(TIME) > 1 else len(keys)
+	num_points = len(keys) // period if period > 0 else 0
+	columns = [k for k in range(1, period) if keys[k] in wanted]
+	regular = (
+		num_points > 0 and
+		len(keys) % period == 0 and
+		keys[0] == TIME and
+		all(keys[k::period].count(keys[k]) == num_points for k in [0] + columns)
+	)
+	if regular:
+		times = array("d", map(float, values[0::period]))
+		for k in columns:
+			(t, v) = waves.setdefault(wanted[keys[k]], (array("d"), array("d")))
+			t.extend(times)
+			v.extend(map(float, values[k::period]))
+		return times[-1]
+
+	# Otherwise assign each value to the most recent time point.
+	for (key, value) in zip(keys, values):
+		if key == TIME:
+			time = float(value)
+		elif key in wanted:
+			if time is None:
+				raise ValueError("%s: value of %s before the first time point" % (path, wanted[key]))
+			(t, v) = waves.setdefault(wanted[key], (array("d"), array("d")))
+			t.append(time)
+			v.append(float(value))
+	return time
+
+
+# Finds the points where the values cross the threshold th. Yields (t, 1) for
+# rising and (t, -1) for falling crossings, where t is linearly interpolated
+# between the time points around the crossing. The values are compared to the
+# threshold at once, and the crossings are located by searching the resulting
+# byte string for the next change, such that only the time points around
+# crossings are visited.
+def crossings(time, values, th):
+	above = bytes(map(float(th).__le__, values))
+	if len(above) == 0:
+		return
+	state = above[0]
+	i = above.find(b"\x00" if state else b"\x01")
+	while i >= 0:
+		(ta, tb, va, vb) = (time[i-1], time[i], values[i-1], values[i])
+		if state:
+			f = (th - vb) / (va - vb)
+			yield (tb*(1-f) + ta*f, -1)
+		else:
+			f = (th - va) / (vb - va)
+			yield (ta*(1-f) + tb*f, 1)
+		state = not state
+		i = above.find(b"\x00" if state else b"\x01", i)
+
+
+# Constants of the binary PSF format.
+SIGNATURE = b"Clarissa"
+SECTION_HEADER = 0
+SECTION_TYPE = 1
+SECTION_SWEEP = 2
+SECTION_TRACE = 3
+SECTION_VALUE = 4
+CHUNK_DATA = 16
+CHUNK_GROUP = 17
+CHUNK_STRUCT_END = 18
+CHUNK_ZEROPAD = 20
+CHUNK_SECTION = 21
+CHUNK_SUBSECTION = 22
+CHUNK_PROP_STRING = 33
+CHUNK_PROP_INT = 34
+CHUNK_PROP_DOUBLE = 35
+TYPE_INT32 = 5
+TYPE_DOUBLE = 11
+TYPE_COMPLEX = 12
+TYPE_STRUCT = 16
+
+# The struct format of the values of each supported data type.
+VALUE_FORMATS = {
+	TYPE_INT32: "i",
+	TYPE_DOUBLE: "d",
+	TYPE_COMPLEX: "dd",
+}
+
+
+class Signal(object):
+	def __init__(self, id, name, type, offset):
+		super(Signal, self).__init__()
+		self.id = id
+		self.name = name
+		self.type = type
+		self.offset = offset
+
+
+# A binary PSF file. The header properties, data types, and the layout of the
+# value records are read when the file is opened. The values of each signal are
+# read by signal().
+class BinaryFile(object):
+	def __init__(self, path):
+		super(BinaryFile, self).__init__()
+		self.path = path
+		self.sweep_values = None
+		self.windows = None
+		self.file = open(path, "rb")
+		try:
+			self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except:
+			self.file.close()
+			raise
+		try:
+			self.open()
+		except:
+			self.close()
+			raise
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		self.mm.close()
+		self.file.close()
+
+	def __contains__(self, name):
+		return name in self.signals
+
+	def error(self, msg):
+		return ValueError("%s: %s" % (self.path, msg))
+
+	def u32(self):
+		self.pos += 4
+		return struct.unpack_from(">I", self.mm, self.pos-4)[0]
+
+	def peek(self):
+		return struct.unpack_from(">I", self.mm, self.pos)[0]
+
+	def string(self):
+		n = self.u32()
+		s = self.mm[self.pos:self.pos+n].decode()
+		self.pos += (n+3) & ~3
+		return s
+
+	def expect(self, chunk):
+		c = self.u32()
+		if c != chunk:
+			raise self.error("expected chunk %d at offset %d, found %d" % (chunk, self.pos-4, c))
+
+	# Reads the table of sections at the end of the file. The file ends with
+	# the table, the signature, and the size of the data before the table.
+	def open(self):
+		size = len(self.mm)
+		if size < 12 or self.mm[size-12:size-4] != SIGNATURE:
+			raise self.error("not a binary PSF file")
+		datasize = struct.unpack_from(">I", self.mm, size-4)[0]
+		num_sections = (size - datasize - 12) // 8
+		self.sections = dict(struct.iter_unpack(">II", self.mm[size-12-num_sections*8:size-12]))
+
+		self.header = self.read_section(SECTION_HEADER, self.read_properties)
+		self.types = dict()
+		if SECTION_TYPE in self.sections:
+			self.read_section(SECTION_TYPE, self.read_types)
+
+		# Read the sweep parameter and the traces, whose values are stored in
+		# this order, and locate the values.
+		sweeps = self.read_section(SECTION_SWEEP, self.read_refs) if SECTION_SWEEP in self.sections else []
+		traces = self.read_section(SECTION_TRACE, self.read_refs) if SECTION_TRACE in self.sections else []
+		if len(sweeps) != 1:
+			raise self.error("expected one sweep parameter, found %d" % len(sweeps))
+		self.sweep = sweeps[0][1]
+		self.pos = self.sections[SECTION_VALUE]
+		self.expect(CHUNK_SECTION)
+		end = self.u32()
+		if "PSF window size" in self.header:
+			self.locate_windows(sweeps + traces, end)
+		else:
+			self.locate_records(sweeps + traces, end)
+
+	# Locates the value records of a sweep that is not windowed. A record holds
+	# the sweep parameter followed by each trace, each with a chunk id and the
+	# id of the signal.
+	def locate_records(self, refs, end):
+		fmt = ">"
+		self.signals = dict()
+		for (id, name, type) in refs:
+			if type not in VALUE_FORMATS:
+				raise self.error("unsupported data type %d of signal %s" % (type, name))
+			self.signals[name] = Signal(id, name, type, struct.calcsize(fmt+"II"))
+			fmt += "II" + VALUE_FORMATS[type]
+		self.record = struct.Struct(fmt)
+		self.values_start = self.pos
+		self.num_points = (end - self.pos) // self.record.size
+		if "PSF sweep points" in self.header:
+			self.num_points = min(self.num_points, self.header["PSF sweep points"])
+		if self.num_points > 0:
+			for sig in self.signals.values():
+				(chunk, id) = struct.unpack_from(">II", self.mm, self.values_start + sig.offset - 8)
+				if chunk != CHUNK_DATA or id != sig.id:
+					raise self.error("unexpected layout of the value records")
+
+	# Locates the windows of a windowed sweep. A window starts with a chunk id
+	# and a word that holds the number of sweep points n in its lower and the
+	# unused space of each block in its upper 16 bits. It is followed by one
+	# block of the window size per signal, the sweep parameter first, whose n
+	# values are stored at its end. Windows may be separated by padding. The
+	# offset of a signal is the offset of its block within a window.
+	def locate_windows(self, refs, end):
+		size = self.header["PSF window size"]
+		self.signals = dict()
+		for (k, (id, name, type)) in enumerate(refs):
+			if type != TYPE_DOUBLE:
+				raise self.error("unsupported data type %d of windowed signal %s" % (type, name))
+			self.signals[name] = Signal(id, name, type, k*size)
+		self.windows = list()
+		self.num_points = 0
+		while self.pos < end:
+			chunk = self.u32()
+			if chunk == CHUNK_ZEROPAD:
+				pad = self.u32()
+				self.pos += pad
+				continue
+			if chunk != CHUNK_DATA:
+				raise self.error("expected window at offset %d, found chunk %d" % (self.pos-4, chunk))
+			word = self.u32()
+			(unused, n) = (word >> 16, word & 0xffff)
+			if unused + 8*n != size:
+				raise self.error("unexpected layout of the window at offset %d" % (self.pos-8))
+			self.windows.append((self.pos + unused, n))
+			self.num_points += n
+			self.pos += len(refs)*size
+		if "PSF sweep points" in self.header:
+			self.num_points = min(self.num_points, self.header["PSF sweep points"])
+
+	# Reads a section, whose children are read by the given function. Sections
+	# with an index wrap their children in a subsection.
+	def read_section(self, section, read_children):
+		if section not in self.sections:
+			raise self.error("missing section %d" % section)
+		self.pos = self.sections[section]
+		self.expect(CHUNK_SECTION)
+		end = self.u32()
+		if self.peek() == CHUNK_SUBSECTION:
+			self.pos += 4
+			end = self.u32()
+		return read_children(end)
+
+	def read_properties(self, end=None):
+		props = dict()
+		while (end is None or self.pos < end) and self.peek() in (CHUNK_PROP_STRING, CHUNK_PROP_INT, CHUNK_PROP_DOUBLE):
+			chunk = self.u32()
+			name = self.string()
+			if chunk == CHUNK_PROP_STRING:
+				props[name] = self.string()
+			elif chunk == CHUNK_PROP_INT:
+				props[name] = self.u32()
+			else:
+				props[name] = struct.unpack_from(">d", self.mm, self.pos)[0]
+				self.pos += 8
+		return props
+
+	def read_type(self):
+		self.expect(CHUNK_DATA)
+		id = self.u32()
+		self.string()
+		self.u32()
+		type = self.u32()
+		if type == TYPE_STRUCT:
+			while self.peek() != CHUNK_STRUCT_END:
+				self.read_type()
+			self.pos += 4
+		self.read_properties()
+		self.types[id] = type
+
+	def read_types(self, end):
+		while self.pos < end:
+			self.read_type()
+
+	def read_ref(self):
+		self.expect(CHUNK_DATA)
+		id = self.u32()
+		name = self.string()
+		type = self.u32()
+		self.read_properties()
+		if type not in self.types:
+			raise self.error("signal %s has undefined type %d" % (name, type))
+		return (id, name, self.types[type])
+
+	# Reads the signals of the sweep or trace section. Groups of signals are
+	# flattened.
+	def read_refs(self, end):
+		refs = list()
+		while self.pos < end:
+			if self.peek() == CHUNK_GROUP:
+				self.pos += 4
+				self.u32()
+				self.string()
+				refs.extend(self.read_ref() for i in range(self.u32()))
+			else:
+				refs.append(self.read_ref())
+		return refs
+
+	# Returns the values of a signal. Doubles and integers are returned as an
+	# array, complex numbers as a list.
+	def values(self, name):
+		sig = self.signals[name]
+		if self.windows is not None:
+			a = array("d")
+			for (start, n) in self.windows:
+				a.frombytes(self.mm[start+sig.offset:start+sig.offset+8*n])
+			del a[self.num_points:]
+			if sys.byteorder == "little":
+				a.byteswap()
+			return a
+		fmt = VALUE_FORMATS[sig.type]
+		stride = self.record.size
+		with memoryview(self.mm) as mv:
+			with mv[self.values_start:self.values_start + self.num_points*stride] as block:
+				if fmt == "d" and sig.offset % 8 == 0 and stride % 8 == 0:
+					with block.cast("d") as doubles:
+						a = array("d", doubles[sig.offset//8::stride//8].tobytes())
+				else:
+					item = struct.Struct(">%dx%s%dx" % (sig.offset, fmt, stride - sig.offset - struct.calcsize(">"+fmt)))
+					if fmt == "dd":
+						return [complex(re, im) for (re, im) in item.iter_unpack(block)]
+					return array(fmt, [x for (x,) in item.iter_unpack(block)])
+		if sys.byteorder == "little":
+			a.byteswap()
+		return a
+
+	# Returns the (time, values) pair of a signal, where time holds the values
+	# of the sweep parameter.
+	def signal(self, name):
+		if self.sweep_values is None:
+			self.sweep_values = self.values(self.sweep)
+		return (self.sweep_values, self.values(name))
+
+
+# Reads the signals with the given names from a binary PSF file, like
+# read_ascii.
+def read_binary(path, names):
+	with BinaryFile(path) as f:
+		return dict((name, f.signal(name)) for name in names if name in f)
+
+
+# Reads the signals with the given names from a PSF file in either the ASCII or
+# the binary format.
+def read(path, names):
+	with open(path, "rb") as f:
+		ascii = f.read(6) == b"HEADER"
+	return read_ascii(path, names) if ascii else read_binary(path, names)
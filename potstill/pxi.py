@@ -0,0 +1,128 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements an index of the nets of a parasitic extraction netlist
+# (*.pxi). The extraction replaces each net of the original netlist by a
+# subcircuit instance named "<prefix>%<net>", whose terminals are the nodes the
+# net has been split into. The index maps each net to these terminals, such
+# that nodesets of the original netlist can be remapped to the extracted one.
+#
+# Extracted netlists of large macros are gigabytes in size. The netlist is
+# therefore memory-mapped and scanned for net instances with a byte-level
+# regular expression, rather than read and split line by line. The index is
+# stored next to the netlist, such that many nodesets can be remapped without
+# scanning the netlist again.
+
+import sys, os, re, mmap, pickle
+import potstill.cache
+
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+# Matches the first line of a net instance, whose name contains a "%". Group 1
+# is the net and group 2 the rest of the line up to a comment. Comments start
+# with "*". The expression expects a newline before the instance, such that it
+# can be searched for quickly; the first line of a netlist is always a title.
+NET_INSTANCE = re.compile(rb"\n[ \t]*[^\s*+.][^\s%]*%(\S+)([^\n*]*)")
+
+# Matches the remainder of a line and the following continuation line, which
+# starts with a "+", skipping any empty or comment lines in between. Group 1 is
+# the continuation line up to a comment.
+CONTINUATION = re.compile(rb"[^\n]*(?:\n[ \t]*(?:\*[^\n]*)?(?=\n))*\n[ \t]*\+([^\n*]*)")
+
+
+# Scans a netlist for net instances. Yields (net, terminals) pairs, where
+# terminals is a string of the instance's terminals separated by spaces.
+def scan(path):
+	with open(path, "rb") as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			return
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			for m in NET_INSTANCE.finditer(mm):
+				rest = m.group(2)
+				c = CONTINUATION.match(mm, m.end())
+				if c is not None:
+					parts = [rest]
+					while c is not None:
+						parts.append(c.group(1))
+						c = CONTINUATION.match(mm, c.end())
+					rest = b" ".join(parts)
+
+				# The last token is the name of the instantiated subcircuit.
+				yield (m.group(1).decode(), b" ".join(rest.split()[:-1]).decode())
+
+
+class Index(object):
+	def __init__(self, nets=None):
+		super(Index, self).__init__()
+		self.nets = nets if nets is not None else dict()
+
+	def __len__(self):
+		return len(self.nets)
+
+	def __contains__(self, net):
+		return net in self.nets
+
+	# Returns the terminals a net has been split into.
+	def terminals(self, net):
+		return self.nets[net].split(" ")
+
+	@classmethod
+	def build(cls, path):
+		return cls(dict(scan(path)))
+
+
+# Returns the index of a netlist. A previously stored index is used as long as
+# the netlist has not been modified since; otherwise the netlist is scanned and
+# the index stored at index_path, which defaults to the netlist's path with
+# INDEX_SUFFIX appended. If store is False, the index is never written.
+def load_index(path, index_path=None, store=True):
+	index_path = index_path or path+INDEX_SUFFIX
+	stat = os.stat(path)
+	try:
+		with open(index_path, "rb") as f:
+			(version, mtime, size, nets) = pickle.load(f)
+		if version == INDEX_VERSION and mtime == stat.st_mtime_ns and size == stat.st_size:
+			return Index(nets)
+	except FileNotFoundError:
+		pass
+	except Exception as e:
+		sys.stderr.write("Ignoring unreadable index %s: %s\n" % (index_path, e))
+
+	index = Index.build(path)
+	if store:
+		try:
+			potstill.cache.dump_atomic(index_path, (INDEX_VERSION, stat.st_mtime_ns, stat.st_size, index.nets))
+		except (OSError, pickle.PicklingError, RecursionError) as e:
+			sys.stderr.write("Unable to write index %s: %s\n" % (index_path, e))
+	return index
+
+
+# Reads a nodeset file and returns a list of (net, value) pairs of the nodesets
+# within the circuit instance prefix. The nets are named as in the extracted
+# netlist, i.e. with "/" as hierarchy separator and in upper case.
+def read_nodeset(path, prefix="X"):
+	nodesets = list()
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if len(line) == 0:
+				continue
+			(name, value) = line.split()
+			if not name.startswith(prefix+"."):
+				continue
+			nodesets.append((name[len(prefix)+1:].replace(".", "/").upper(), value))
+	return nodesets
+
+
+# Writes the nodesets to the file object f, applying the value of each net to
+# all of its terminals in the extracted netlist. Returns the list of nets that
+# do not appear in the index.
+def remap(f, index, nodesets, prefix="X"):
+	unmapped = list()
+	for (net, value) in nodesets:
+		if net not in index:
+			unmapped.append(net)
+			continue
+		f.write("".join("%s.%s\t%s\n" % (prefix, terminal, value) for terminal in index.terminals(net)))
+	return unmapped
@@ -0,0 +1,231 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a scheduler for the characterization runs prepared by
+# the batch-prep-* commands. Each run is a directory with a run.sh script, which
+# invokes one of the characterization commands. The scheduler executes the runs
+# in parallel, the most expensive first, such that the batch is not held up by
+# a large run started last. The cost of a run is predicted from the duration of
+# its previous execution if there is one, or estimated from the size of the
+# macro and the kind of characterization otherwise.
+#
+# The setup and hold time characterization is split into two jobs, since the
+# hold time analysis reads the setup times found by the setup time analysis.
+# The hold job only starts once the setup job has succeeded, and the setup
+# job's priority accounts for the hold job waiting for it. The exit code of the
+# run is only recorded once the hold job has finished, such that a batch that
+# is interrupted in between leaves the run marked as missing.
+#
+# As with batch-run-one, the output of a run is written to run.out, and its exit
+# code and duration to the exitcode and duration files in the run directory.
+
+import sys, os, shlex, subprocess, threading, queue, time
+
+
+# Relative cost per bit cell of the characterizations, roughly proportional to
+# the simulated time span.
+CHAR_WEIGHTS = {
+	"tpd": 1,
+	"pwrck": 4,
+	"pwrintcap": 4,
+	"pwr": 6,
+	"pwrout": 6,
+	"trdwr": 6,
+	"tsuho": 60,
+}
+
+
+class Job(object):
+	def __init__(self, runfile, args=(), name=None):
+		super(Job, self).__init__()
+		self.runfile = runfile
+		self.workdir = os.path.dirname(runfile) or "."
+		self.args = list(args)
+		self.name = name or runfile
+		self.deps = list()
+		self.dependents = list()
+		self.cost = None
+		self.licenses = 1
+		self.status = None
+		self.duration = None
+
+	# Returns the cost of this job and all jobs that transitively wait for
+	# it, i.e. the length of the critical path starting with this job.
+	def priority(self):
+		return self.cost + max([d.priority() for d in self.dependents] + [0])
+
+
+# Parses the characterization invoked by a run.sh script. Returns a tuple of
+# the characterization name, the number of address lines, and the number of
+# bits, or None if the script invokes no characterization.
+def parse_runfile(runfile):
+	with open(runfile) as f:
+		for line in f:
+			try:
+				tokens = shlex.split(line)
+			except ValueError:
+				continue
+			if len(tokens) < 4 or tokens[0] != "potstill" or not tokens[1].startswith("char"):
+				continue
+			if tokens[1] == "char":
+				# potstill char NADDR NBITS --vdd VDD --temp TEMP CHAR ...
+				rest = list()
+				it = iter(tokens[2:])
+				for t in it:
+					if t in ("--vdd", "--temp"):
+						next(it, None)
+					else:
+						rest.append(t)
+				if len(rest) < 3:
+					return None
+				(naddr, nbits, char) = rest[0:3]
+			else:
+				# potstill char-CHAR NADDR NBITS VDD TEMP ...
+				(char, naddr, nbits) = (tokens[1][5:], tokens[2], tokens[3])
+			try:
+				return (char, int(naddr), int(nbits))
+			except ValueError:
+				return None
+	return None
+
+
+def read_duration(workdir):
+	try:
+		with open(os.path.join(workdir, "duration")) as f:
+			return float(f.read().strip())
+	except (OSError, ValueError):
+		return None
+
+
+# Creates the jobs for a list of run.sh scripts, and predicts their cost.
+def make_jobs(runfiles):
+	jobs = list()
+	estimates = list()
+	for runfile in runfiles:
+		parsed = parse_runfile(runfile)
+		(char, naddr, nbits) = parsed or (None, 0, 0)
+		estimate = CHAR_WEIGHTS.get(char, 1) * 2**naddr * nbits + 1
+		measured = read_duration(os.path.dirname(runfile) or ".")
+		if char == "tsuho":
+			setup = Job(runfile, ["--setup"], runfile+" --setup")
+			hold = Job(runfile, ["--hold"], runfile+" --hold")
+			hold.deps.append(setup)
+			setup.dependents.append(hold)
+			parts = [setup, hold]
+		else:
+			parts = [Job(runfile)]
+		for job in parts:
+			estimates.append((job, estimate/len(parts), measured/len(parts) if measured is not None else None))
+		jobs += parts
+
+	# Use the measured durations where available, and scale the estimates
+	# of the remaining jobs to match the measured ones.
+	known = [(e, m) for (_, e, m) in estimates if m is not None]
+	scale = sum(m for (_, m) in known) / sum(e for (e, _) in known) if len(known) > 0 else 1
+	for (job, estimate, measured) in estimates:
+		job.cost = measured if measured is not None else estimate*scale
+	return jobs
+
+
+# Returns the jobs in the order they are started if run one at a time.
+def schedule_order(jobs):
+	order = list()
+	done = set()
+	pending = list(jobs)
+	while len(pending) > 0:
+		ready = [j for j in pending if all(d in done for d in j.deps)]
+		job = max(ready, key=lambda j: j.priority())
+		pending.remove(job)
+		done.add(job)
+		order.append(job)
+	return order
+
+
+class Scheduler(object):
+	def __init__(self, jobs, num_procs=1, num_licenses=None, out=sys.stdout):
+		super(Scheduler, self).__init__()
+		self.jobs = jobs
+		self.num_procs = num_procs
+		self.num_licenses = num_licenses
+		self.out = out
+		self.finished = queue.Queue()
+
+	def log(self, msg):
+		self.out.write(msg+"\n")
+		self.out.flush()
+
+	# Executes a job, appending its output to run.out if it is not the first
+	# job of its run.
+	def execute(self, job):
+		start = time.time()
+		with open(os.path.join(job.workdir, "run.out"), "a" if len(job.deps) > 0 else "w") as f:
+			try:
+				job.status = subprocess.call([os.path.abspath(job.runfile)] + job.args, stdout=f, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+			except OSError as e:
+				f.write("%s\n" % e)
+				job.status = 127
+		job.duration = time.time() - start
+
+		# The run.sh scripts of older batches record an exit code after the
+		# setup job as well. Remove it until the hold job has finished.
+		if len(job.dependents) > 0:
+			try:
+				os.remove(os.path.join(job.workdir, "exitcode"))
+			except FileNotFoundError:
+				pass
+		self.finished.put(job)
+
+	# Records the exit code and duration of a run once its last job has
+	# finished, or a job has failed.
+	def record(self, job):
+		duration = job.duration + sum(d.duration for d in job.deps)
+		with open(os.path.join(job.workdir, "exitcode"), "w") as f:
+			f.write("%d\n" % job.status)
+		with open(os.path.join(job.workdir, "duration"), "w") as f:
+			f.write("%f\n" % duration)
+
+	# Executes all jobs. Returns the number of jobs that failed or were
+	# skipped because a job they depend on failed.
+	def run(self):
+		pending = list(self.jobs)
+		running = set()
+		licenses = 0
+		num_failed = 0
+		while len(pending) > 0 or len(running) > 0:
+			# Skip jobs whose dependencies failed.
+			for job in [j for j in pending if any(d.status not in (None, 0) for d in j.deps)]:
+				pending.remove(job)
+				num_failed += 1
+				self.log("Skipped %s" % job.name)
+
+			# Start the most expensive ready jobs as long as processes and
+			# licenses are available.
+			ready = sorted(
+				[j for j in pending if all(d.status == 0 for d in j.deps)],
+				key=lambda j: j.priority(), reverse=True
+			)
+			for job in ready:
+				if len(running) >= self.num_procs:
+					break
+				if self.num_licenses is not None and licenses + job.licenses > self.num_licenses:
+					continue
+				pending.remove(job)
+				running.add(job)
+				licenses += job.licenses
+				self.log("Starting %s" % job.name)
+				threading.Thread(target=self.execute, args=(job,), daemon=True).start()
+
+			if len(running) == 0:
+				break
+
+			# Wait for a job to finish.
+			job = self.finished.get()
+			running.remove(job)
+			licenses -= job.licenses
+			if job.status != 0:
+				num_failed += 1
+				self.log("Failed %s (after %.1f s)" % (job.name, job.duration))
+			else:
+				self.log("Finished %s (after %.1f s)" % (job.name, job.duration))
+			if job.status != 0 or len(job.dependents) == 0:
+				self.record(job)
+		return num_failed
@@ -0,0 +1,170 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements a spatial index over the instances and pins of a layout.
+# Rectangles are hashed into a uniform grid of buckets, such that region, point,
+# and nearest neighbour queries only need to inspect the buckets around the
+# query rather than every shape in the macro.
+
+import math
+
+
+# An entry in the spatial index. The kind is either "inst" or "pin". For
+# instances, obj is the Cell placed; for pins, it is the InstPin.
+class Shape(object):
+	__slots__ = ("kind", "name", "layer", "obj", "x0", "y0", "x1", "y1")
+
+	def __init__(self, kind, name, layer, obj, x0, y0, x1, y1):
+		self.kind = kind
+		self.name = name
+		self.layer = layer
+		self.obj = obj
+		self.x0 = min(x0, x1)
+		self.y0 = min(y0, y1)
+		self.x1 = max(x0, x1)
+		self.y1 = max(y0, y1)
+
+	def overlaps(self, x0, y0, x1, y1, strict=False):
+		if strict:
+			return self.x0 < x1 and x0 < self.x1 and self.y0 < y1 and y0 < self.y1
+		else:
+			return self.x0 <= x1 and x0 <= self.x1 and self.y0 <= y1 and y0 <= self.y1
+
+	def distance(self, x, y):
+		dx = max(self.x0 - x, 0, x - self.x1)
+		dy = max(self.y0 - y, 0, y - self.y1)
+		return math.hypot(dx, dy)
+
+	def __repr__(self):
+		return "Shape(%s %s%s [%g %g %g %g])" % (
+			self.kind, self.name,
+			(" on "+self.layer) if self.layer is not None else "",
+			self.x0, self.y0, self.x1, self.y1
+		)
+
+
+class GridIndex(object):
+	def __init__(self, bucket_size):
+		super(GridIndex, self).__init__()
+		assert(bucket_size > 0)
+		self.bucket_size = bucket_size
+		self.buckets = dict()
+		self.shapes = list()
+		self.bounds = None
+
+	def __len__(self):
+		return len(self.shapes)
+
+	def bucket_range(self, x0, y0, x1, y1):
+		s = self.bucket_size
+		return (
+			range(int(math.floor(x0/s)), int(math.floor(x1/s))+1),
+			range(int(math.floor(y0/s)), int(math.floor(y1/s))+1)
+		)
+
+	def insert(self, shape):
+		self.shapes.append(shape)
+		(xs, ys) = self.bucket_range(shape.x0, shape.y0, shape.x1, shape.y1)
+		for i in xs:
+			for j in ys:
+				self.buckets.setdefault((i,j), list()).append(shape)
+		if self.bounds is None:
+			self.bounds = [shape.x0, shape.y0, shape.x1, shape.y1]
+		else:
+			b = self.bounds
+			b[0] = min(b[0], shape.x0)
+			b[1] = min(b[1], shape.y0)
+			b[2] = max(b[2], shape.x1)
+			b[3] = max(b[3], shape.y1)
+
+	# Returns the shapes that overlap the given region. If strict is set,
+	# shapes that merely touch the region's boundary are excluded.
+	def region(self, x0, y0, x1, y1, strict=False, kind=None, layer=None):
+		(x0, x1) = (min(x0, x1), max(x0, x1))
+		(y0, y1) = (min(y0, y1), max(y0, y1))
+		(xs, ys) = self.bucket_range(x0, y0, x1, y1)
+		seen = set()
+		result = list()
+		for i in xs:
+			for j in ys:
+				for shape in self.buckets.get((i,j), ()):
+					if id(shape) in seen:
+						continue
+					seen.add(id(shape))
+					if kind is not None and shape.kind != kind:
+						continue
+					if layer is not None and shape.layer != layer:
+						continue
+					if shape.overlaps(x0, y0, x1, y1, strict):
+						result.append(shape)
+		return result
+
+	# Returns the shapes that contain the given point.
+	def point(self, x, y, kind=None, layer=None):
+		return self.region(x, y, x, y, kind=kind, layer=layer)
+
+	# Returns the shape closest to the given point, or None if the index holds
+	# no matching shapes. The search inspects rings of buckets of increasing
+	# radius around the point, and stops as soon as no unvisited bucket can
+	# contain a closer shape.
+	def nearest(self, x, y, kind=None, layer=None):
+		if self.bounds is None:
+			return None
+		s = self.bucket_size
+		ci = int(math.floor(x/s))
+		cj = int(math.floor(y/s))
+		(bx, by) = self.bucket_range(*self.bounds)
+		max_radius = max(
+			abs(ci - bx[0]), abs(ci - bx[-1]),
+			abs(cj - by[0]), abs(cj - by[-1])
+		)
+		best = None
+		best_dist = None
+		for r in range(max_radius+1):
+			# Any shape in ring r is at least (r-1)*s away from the point.
+			if best is not None and (r-1)*s > best_dist:
+				break
+			for (i,j) in ring(ci, cj, r):
+				for shape in self.buckets.get((i,j), ()):
+					if kind is not None and shape.kind != kind:
+						continue
+					if layer is not None and shape.layer != layer:
+						continue
+					d = shape.distance(x, y)
+					if best is None or d < best_dist:
+						best = shape
+						best_dist = d
+		return best
+
+
+# Generates the bucket coordinates at Chebyshev distance r around (ci,cj).
+def ring(ci, cj, r):
+	if r == 0:
+		yield (ci, cj)
+		return
+	for i in range(ci-r, ci+r+1):
+		yield (i, cj-r)
+		yield (i, cj+r)
+	for j in range(cj-r+1, cj+r):
+		yield (ci-r, j)
+		yield (ci+r, j)
+
+
+# Builds a spatial index over all cells placed in a layout, with stacks
+# expanded into individual rows, and all pin shapes.
+def index_layout(layout, bucket_size=None):
+	num_cells = layout.insts.num_placed()
+	if bucket_size is None:
+		area = layout.size.x * layout.size.y
+		bucket_size = max(layout.row_height, math.sqrt(area / max(num_cells, 1)) * 2)
+	idx = GridIndex(bucket_size)
+
+	cells = layout.insts.cells
+	for (_, name, cell, x0, y0, x1, y1) in layout.insts.boxes():
+		idx.insert(Shape("inst", name, None, cells[cell], x0, y0, x1, y1))
+
+	pt = layout.pin_table
+	for (i, pin) in enumerate(pt.pins):
+		for (x0, y0, x1, y1) in pt.rects(i):
+			idx.insert(Shape("pin", pin.name, pin.layer, pin, x0, y0, x1, y1))
+
+	return idx
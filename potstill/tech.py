@@ -0,0 +1,106 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file implements the technology database. The technology configuration
+# in config.yml is parsed and validated once, and the result is stored as a
+# binary snapshot next to the configuration file. Subsequent loads read the
+# snapshot as long as config.yml has not been modified, which avoids the costly
+# YAML parsing on every invocation. Within a process, all users of the same
+# technology directory share one Technology object.
+
+import sys, os, pickle
+import potstill.cache
+
+
+SNAPSHOT_NAME = ".config.yml.pickle"
+SNAPSHOT_VERSION = 1
+
+REQUIRED_KEYS = ["track", "row-height", "widths", "cells", "supply_layer_gds", "obstructed-channels"]
+REQUIRED_WIDTHS = ["bitarray", "addrdec", "rwckg", "rareg"]
+REQUIRED_CELLS = ["rwckg", "addrdec", "bitarray", "rareg", "raregwire", "welltap", "filler"]
+REQUIRED_WELLTAP_KEYS = ["width", "cadence", "wiring_a", "wiring_b", "pwr_inner", "pwr_outer"]
+
+
+class Technology(object):
+	def __init__(self, techdir, config, digest):
+		super(Technology, self).__init__()
+		self.techdir = techdir
+		self.config = config
+		self.digest = digest
+
+
+# Checks that the configuration contains everything the generator relies on.
+# Raises a ValueError describing the first problem found.
+def validate(config, path):
+	def require(d, keys, where):
+		if not isinstance(d, dict):
+			raise ValueError("%s: %s must be a mapping" % (path, where))
+		for k in keys:
+			if k not in d:
+				raise ValueError("%s: missing %s in %s" % (path, k, where))
+
+	require(config, REQUIRED_KEYS, "top level")
+	require(config["widths"], REQUIRED_WIDTHS, "widths")
+	require(config["cells"], REQUIRED_CELLS, "cells")
+	for (name, cell) in config["cells"].items():
+		if "gds_struct" not in cell:
+			raise ValueError("%s: cell %s has no gds_struct" % (path, name))
+	require(config["cells"]["welltap"], REQUIRED_WELLTAP_KEYS, "cells.welltap")
+	if not isinstance(config["widths"]["addrdec"], dict):
+		raise ValueError("%s: widths.addrdec must map word counts to widths" % path)
+
+
+# Parses and validates config.yml. YAML is only imported here, such that the
+# fast path through the snapshot does not pay for it.
+def parse(path):
+	import yaml
+	with open(path) as f:
+		config = yaml.safe_load(f)
+	validate(config, path)
+	return config
+
+
+def read_snapshot(path, stat):
+	try:
+		with open(path, "rb") as f:
+			(version, mtime, size, digest, config) = pickle.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		sys.stderr.write("Ignoring unreadable technology snapshot %s: %s\n" % (path, e))
+		return None
+	if version != SNAPSHOT_VERSION or mtime != stat.st_mtime_ns or size != stat.st_size:
+		return None
+	return (digest, config)
+
+
+def write_snapshot(path, stat, digest, config):
+	try:
+		potstill.cache.dump_atomic(path, (SNAPSHOT_VERSION, stat.st_mtime_ns, stat.st_size, digest, config))
+	except (OSError, pickle.PicklingError, RecursionError):
+		# The technology directory may well be read-only. The snapshot is
+		# merely an optimization, so carry on without it.
+		pass
+
+
+_technologies = dict()
+
+# Returns the Technology for the given technology directory.
+def load(techdir):
+	techdir = os.path.realpath(techdir)
+	if techdir in _technologies:
+		return _technologies[techdir]
+
+	source = techdir+"/config.yml"
+	snapshot = techdir+"/"+SNAPSHOT_NAME
+	stat = os.stat(source)
+	cached = read_snapshot(snapshot, stat)
+	if cached is not None:
+		(digest, config) = cached
+	else:
+		digest = potstill.cache.file_digest(source)
+		config = parse(source)
+		write_snapshot(snapshot, stat, digest, config)
+
+	tech = Technology(techdir, config, digest)
+	_technologies[techdir] = tech
+	return tech
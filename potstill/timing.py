@@ -2,7 +2,8 @@
 #
 # This file implements timing calculation for memory macros.
 
-import sys, os, yaml, csv
+import sys, os, csv
+import potstill.tech
 from bisect import bisect
 from collections import OrderedDict
 
@@ -124,8 +125,7 @@ class Timing(object):
 	def __init__(self, macro):
 		super(Timing, self).__init__()
 		self.macro = macro
-		with open(macro.techdir+"/config.yml") as f:
-			self.config = yaml.load(f)
+		self.config = potstill.tech.load(macro.techdir).config
 
 		self.suffix = ("%dV%dC" % (int(self.macro.vdd*100), int(self.macro.temp)))
 		self.name = self.macro.name + "_" + self.suffix
@@ -148,3 +148,33 @@ class Timing(object):
 					self.figures[opcond].values.update(figures)
 				else:
 					self.figures[opcond] = Figures(opcond, figures.copy())
+
+
+# Returns the worst-case propagation delay from CK to RD of the plain macro with
+# the given number of address lines, as characterized in the technology's
+# tables, at the operating conditions and number of bits of the given macro.
+def characterized_tpd(macro, num_addr):
+	path = "%s/tables/%d/tpd.csv" % (macro.techdir, 2**num_addr)
+	figures = Table(path, ["tslew", "cload"], macro.num_bits).values["vdd=%g,temp=%g" % (macro.vdd, macro.temp)]
+	return max(
+		float(v)
+		for name in ["Tpd_RD_rise", "Tpd_RD_fall"]
+		for v in figures[name].values()
+	)
+
+
+# Estimates the worst-case propagation delay from CK to RD of a banked or folded
+# macro. Its read path is the one of the plain macro with as many words as a
+# sub-array, followed by the read mux levels that combine the sub-arrays. Each
+# of these levels is assumed to add as much delay as the last level of the plain
+# macro's read mux tree. Returns None if the required tables do not exist.
+def estimate_tpd(macro):
+	levels = (macro.num_banks * macro.words_per_row).bit_length()-1
+	num_addr = macro.num_addr - levels
+	try:
+		tpd = characterized_tpd(macro, num_addr)
+		if levels > 0:
+			tpd += levels * (tpd - characterized_tpd(macro, num_addr-1))
+	except (OSError, KeyError):
+		return None
+	return tpd
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This script is a scripted fake of an OCEAN session, used to test the session
+# pool in potstill.char.ocean without a Cadence installation. It understands the
+# commands the pool sends over stdin. The scripts it loads consist of one
+# command per line:
+#
+#   write FILE TEXT  writes TEXT to FILE
+#   pid FILE         writes the process id of the session to FILE
+#   print TEXT       prints TEXT
+#   sleep SECONDS    sleeps
+#   fail             aborts the script with an error
+#   crash            exits the session
+#   crashonce        exits the session unless the file "crashed" exists, which
+#                    is created
+
+import sys, os, re, time
+
+
+def load(path):
+	with open(path) as f:
+		for line in f:
+			words = line.split()
+			if len(words) == 0:
+				continue
+			if words[0] == "write":
+				with open(words[1], "w") as out:
+					out.write(" ".join(words[2:])+"\n")
+			elif words[0] == "pid":
+				with open(words[1], "w") as out:
+					out.write("%d\n" % os.getpid())
+			elif words[0] == "print":
+				print(" ".join(words[1:]))
+			elif words[0] == "sleep":
+				sys.stdout.flush()
+				time.sleep(float(words[1]))
+			elif words[0] == "fail":
+				print("*Error* %s" % path)
+				return False
+			elif words[0] == "crash":
+				sys.exit(3)
+			elif words[0] == "crashonce" and not os.path.exists("crashed"):
+				open("crashed", "w").close()
+				sys.exit(4)
+	return True
+
+
+status = None
+for line in sys.stdin:
+	line = line.strip()
+	if line == "exit":
+		break
+	m = re.match(r'cd\("(.*)"\)$', line)
+	if m is not None:
+		os.chdir(m.group(1))
+		continue
+	m = re.match(r'_potstillStatus = errset\(load\("(.*)"\) t\)$', line)
+	if m is not None:
+		status = load(m.group(1))
+		continue
+	m = re.match(r'printf\("\\n(\S+) %d %s\\n" (\d+) if\(_potstillStatus "ok" "error"\)\)$', line)
+	if m is not None:
+		print("\n%s %s %s" % (m.group(1), m.group(2), "ok" if status else "error"))
+		sys.stdout.flush()
+		continue
+	print("*Error* unknown command: %s" % line)
+	sys.stdout.flush()
@@ -0,0 +1,106 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file tests the pool of OCEAN sessions against a scripted fake of OCEAN,
+# see fake_ocean.py. Run with "python3 -m unittest discover tests".
+
+import sys, os, shutil, tempfile, threading, unittest
+from potstill.char import ocean
+
+
+FAKE_OCEAN = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ocean.py")]
+
+
+class PoolTest(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	# Writes a script with the given lines to a new directory, and returns the
+	# name of the script and the directory.
+	def script(self, name, *lines):
+		cwd = os.path.join(self.dir, name)
+		os.mkdir(cwd)
+		with open(os.path.join(cwd, "analyze.ocn"), "w") as f:
+			f.write("".join(l+"\n" for l in lines))
+		return ("analyze.ocn", cwd)
+
+	def read(self, cwd, name):
+		with open(os.path.join(cwd, name)) as f:
+			return f.read().strip()
+
+	def test_sessions_are_reused(self):
+		with ocean.Pool(1, FAKE_OCEAN) as pool:
+			pids = list()
+			for i in range(3):
+				(script, cwd) = self.script("job%d" % i, "pid pid.txt", "write out.txt %d" % i)
+				self.assertTrue(pool.run(script, cwd)[0])
+				self.assertEqual(self.read(cwd, "out.txt"), str(i))
+				pids.append(self.read(cwd, "pid.txt"))
+			self.assertEqual(len(set(pids)), 1)
+
+	def test_output_and_errors(self):
+		with ocean.Pool(1, FAKE_OCEAN) as pool:
+			(ok, output) = pool.run(*self.script("a", "print hello"))
+			self.assertTrue(ok)
+			self.assertIn("hello", output)
+			(ok, output) = pool.run(*self.script("b", "fail"))
+			self.assertFalse(ok)
+			self.assertIn("*Error*", output)
+			(ok, output) = pool.run(*self.script("c", "print again"))
+			self.assertTrue(ok)
+			self.assertNotIn("hello", output)
+
+	def test_sessions_run_concurrently(self):
+		with ocean.Pool(3, FAKE_OCEAN) as pool:
+			jobs = [self.script("job%d" % i, "sleep 0.5", "pid pid.txt") for i in range(3)]
+			threads = [threading.Thread(target=pool.run, args=job) for job in jobs]
+			for t in threads:
+				t.start()
+			for t in threads:
+				t.join()
+			pids = set(self.read(cwd, "pid.txt") for (_, cwd) in jobs)
+			self.assertEqual(len(pids), 3)
+
+	def test_crashed_session_is_restarted(self):
+		with ocean.Pool(1, FAKE_OCEAN) as pool:
+			(script, cwd) = self.script("a", "crashonce", "write out.txt done")
+			self.assertTrue(pool.run(script, cwd)[0])
+			self.assertEqual(self.read(cwd, "out.txt"), "done")
+			with self.assertRaises(ocean.SessionError):
+				pool.run(*self.script("b", "crash"))
+			self.assertTrue(pool.run(*self.script("c", "print alive"))[0])
+
+	def test_hung_session_is_killed(self):
+		with ocean.Pool(1, FAKE_OCEAN, timeout=1) as pool:
+			(script, cwd) = self.script("a", "pid pid.txt", "sleep 60")
+			with self.assertRaises(ocean.SessionTimeout):
+				pool.run(script, cwd)
+			hung = self.read(cwd, "pid.txt")
+			(script, cwd) = self.script("b", "pid pid.txt")
+			self.assertTrue(pool.run(script, cwd)[0])
+			self.assertNotEqual(self.read(cwd, "pid.txt"), hung)
+
+	def test_server(self):
+		address = os.path.join(self.dir, "ocean.sock")
+		with ocean.Pool(2, FAKE_OCEAN) as pool:
+			server = ocean.Server(address, pool)
+			thread = threading.Thread(target=server.serve_forever, daemon=True)
+			thread.start()
+			try:
+				jobs = [self.script("job%d" % i, "write out.txt %d" % i) for i in range(4)]
+				ocean.submit_all(jobs, address=address)
+				for (i, (_, cwd)) in enumerate(jobs):
+					self.assertEqual(self.read(cwd, "out.txt"), str(i))
+				(script, cwd) = self.script("fail", "fail")
+				with self.assertRaises(ocean.OceanError):
+					ocean.submit(script, cwd, address=address)
+				self.assertIn("*Error*", self.read(cwd, "CDS.log"))
+			finally:
+				server.shutdown()
+				server.server_close()
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,102 @@
+# Copyright (c) 2016 Fabian Schuiki
+#
+# This file tests the spatial index in potstill.spatial against a brute-force
+# scan over all shapes, for random rectangles and, if the technology is
+# available, for the cells and pins of actual macro layouts. Run with
+# "python3 -m unittest discover tests".
+
+import os, random, unittest
+from potstill import spatial
+from potstill.macro import Macro
+from potstill.layout import Layout, Vec
+
+
+class Cell(object):
+	pass
+
+
+# A layout with the given boxes as placed cells and no pins, providing only
+# what index_layout uses.
+class FakeLayout(object):
+	def __init__(self, boxes):
+		self.insts = self
+		self.cells = [Cell()]
+		self.pin_table = self
+		self.pins = list()
+		self.size = Vec(100, 100)
+		self.row_height = 1
+		self.box_list = boxes
+
+	def num_placed(self):
+		return len(self.box_list)
+
+	def boxes(self):
+		return [(i, "X%d" % i, 0) + b for (i, b) in enumerate(self.box_list)]
+
+
+class GridIndexTest(unittest.TestCase):
+	def check_queries(self, idx, shapes, rng, span):
+		(lo, hi) = span
+		for i in range(200):
+			(x0, x1) = sorted(rng.uniform(lo, hi) for _ in range(2))
+			(y0, y1) = sorted(rng.uniform(lo, hi) for _ in range(2))
+			for strict in (False, True):
+				self.assertEqual(
+					set(id(s) for s in idx.region(x0, y0, x1, y1, strict)),
+					set(id(s) for s in shapes if s.overlaps(x0, y0, x1, y1, strict))
+				)
+			self.assertEqual(
+				set(id(s) for s in idx.point(x0, y0)),
+				set(id(s) for s in shapes if s.overlaps(x0, y0, x0, y0))
+			)
+			nearest = idx.nearest(x0, y0)
+			self.assertAlmostEqual(nearest.distance(x0, y0), min(s.distance(x0, y0) for s in shapes))
+
+	def test_random_shapes(self):
+		rng = random.Random(1)
+		for bucket_size in (0.5, 3, 40):
+			idx = spatial.GridIndex(bucket_size)
+			shapes = list()
+			for i in range(300):
+				(x, y) = (rng.uniform(-20, 80), rng.uniform(-20, 80))
+				shape = spatial.Shape("inst", "X%d" % i, None, None, x, y, x + rng.uniform(0, 10), y + rng.uniform(0, 10))
+				idx.insert(shape)
+				shapes.append(shape)
+			self.check_queries(idx, shapes, rng, (-40, 120))
+
+	def test_filters(self):
+		idx = spatial.GridIndex(1)
+		a = spatial.Shape("inst", "A", None, None, 0, 0, 2, 2)
+		b = spatial.Shape("pin", "B", "ME2", None, 1, 1, 3, 3)
+		c = spatial.Shape("pin", "C", "ME3", None, 10, 10, 11, 11)
+		for s in (a, b, c):
+			idx.insert(s)
+		self.assertEqual(idx.point(1.5, 1.5, kind="inst"), [a])
+		self.assertEqual(idx.point(1.5, 1.5, kind="pin"), [b])
+		self.assertEqual(idx.region(0, 0, 20, 20, layer="ME3"), [c])
+		self.assertIs(idx.nearest(9, 9, kind="pin", layer="ME2"), b)
+		self.assertIsNone(spatial.GridIndex(1).nearest(0, 0))
+
+	def test_index_layout(self):
+		rng = random.Random(2)
+		boxes = list()
+		for i in range(100):
+			(x, y) = (rng.uniform(0, 90), rng.uniform(0, 90))
+			boxes.append((x, y, x + rng.uniform(0, 10), y + rng.uniform(0, 10)))
+		idx = spatial.index_layout(FakeLayout(boxes))
+		self.assertEqual(sorted((s.x0, s.y0, s.x1, s.y1) for s in idx.shapes), sorted(boxes))
+		self.check_queries(idx, idx.shapes, rng, (-10, 110))
+
+	@unittest.skipUnless(os.path.isdir(Macro(2, 4).techdir), "technology not available")
+	def test_macro_layouts(self):
+		rng = random.Random(3)
+		for (num_addr, num_bits) in ((2, 4), (5, 16), (7, 32)):
+			layout = Layout(Macro(num_addr, num_bits))
+			idx = spatial.index_layout(layout)
+			insts = [s for s in idx.shapes if s.kind == "inst"]
+			self.assertEqual(len(insts), len(list(layout.insts.boxes())))
+			self.check_queries(idx, idx.shapes, rng, (-1e-6, max(layout.size.x, layout.size.y) + 1e-6))
+
+
+if __name__ == "__main__":
+	unittest.main()